@@ -1,23 +1,51 @@
-from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, WebSocket, WebSocketDisconnect, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
-from datetime import datetime, timedelta
-from passlib.context import CryptContext
+from pydantic import TypeAdapter
+from sqlalchemy import delete, select, tuple_, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import date, datetime, timedelta, timezone
 from jose import jwt
+import json
 import os
+import time
+from typing import Dict, List, Optional, Tuple
 
-from ..services.gamification import GamificationService
 from ..services.strava_service import StravaService
-from ..db.session import get_db
+from ..services.strava_backfill import backfill_service
+from ..services.strava_token_manager import token_manager
+from ..services.impact_rollups import PERIOD_TITLES, impact_rollups, period_bounds
+from ..services.leaderboard import leaderboard
+from ..services.tracker_sessions import TrackerSessionConflict, tracker_sessions
+from ..services import polyline
+from ..services.webhook_queue import webhook_queue, validate_event, InvalidWebhookEvent
+from ..db.session import AsyncSessionLocal, get_async_db
+from ..core.metrics import metrics
 from ..models.user import User
 from ..models.activity import Activity
-from ..auth.dependencies import get_current_user
+from ..models.backfill_job import BackfillJob
+from ..models.synced_activity import SyncedActivity
+from ..models.daily_rollup import DailyRollup
+from ..models.friendship import Friendship
+from ..models.route import Route
+from ..models.user_insight import UserInsight
+from ..auth.passwords import PasswordHasherBusy, password_hasher
+from ..auth.dependencies import get_current_user, get_current_user_snapshot, user_from_token
+from ..auth.user_cache import UserSnapshot, user_cache
+from .pagination import InvalidCursor, decode_cursor, encode_cursor
 from ..schemas.location import LocationUpdate
 from ..schemas.user import UserCreate, UserResponse
 
 router = APIRouter()
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+def _hasher_busy() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Too many logins in progress, try again shortly",
+        headers={"Retry-After": "1"},
+    )
 
 def create_access_token(data: dict):
     to_encode = data.copy()
@@ -27,43 +55,70 @@ def create_access_token(data: dict):
     return encoded_jwt
 
 @router.post("/register", response_model=dict)
-def register_user(user: UserCreate, db: Session = Depends(get_db)):
+async def register_user(user: UserCreate, db: AsyncSession = Depends(get_async_db)):
     """Register a new user."""
     # Check if user exists
-    if db.query(User).filter(User.email == user.email).first():
+    if await db.scalar(select(User).where(User.email == user.email)):
         raise HTTPException(status_code=400, detail="Email already registered")
+    # bcrypt is slow and runs on the password hasher's pool; don't hold a connection meanwhile
+    await db.rollback()
     
     # Create new user
-    hashed_password = pwd_context.hash(user.password)
+    try:
+        hashed_password = await password_hasher.hash(user.password)
+    except PasswordHasherBusy:
+        raise _hasher_busy()
     db_user = User(
         email=user.email,
         hashed_password=hashed_password,
         full_name=user.full_name
     )
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    try:
+        await db.commit()
+    except IntegrityError:
+        # Registered by a concurrent request while the password was hashed
+        await db.rollback()
+        raise HTTPException(status_code=400, detail="Email already registered")
     
     # Create access token
     access_token = create_access_token({"sub": db_user.email})
     return {"access_token": access_token, "token_type": "bearer"}
 
 @router.post("/token")
-def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_async_db)):
     """Login and get access token."""
-    user = db.query(User).filter(User.email == form_data.username).first()
-    if not user or not pwd_context.verify(form_data.password, user.hashed_password):
+    user = (await db.execute(
+        select(User.id, User.email, User.hashed_password).where(User.email == form_data.username)
+    )).first()
+    # Release the connection while bcrypt runs on the password hasher's pool
+    await db.rollback()
+    valid, new_hash = False, None
+    if user:
+        try:
+            valid, new_hash = await password_hasher.verify(form_data.password, user.hashed_password)
+        except PasswordHasherBusy:
+            raise _hasher_busy()
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
+    if new_hash:
+        # Stored with a different bcrypt cost; move it to the configured one unless it changed meanwhile
+        await db.execute(
+            update(User)
+            .where(User.id == user.id, User.hashed_password == user.hashed_password)
+            .values(hashed_password=new_hash)
+        )
+        await db.commit()
     
     access_token = create_access_token({"sub": user.email})
     return {"access_token": access_token, "token_type": "bearer"}
 
 @router.get("/user/stats", response_model=UserResponse)
-async def get_user_stats(current_user: User = Depends(get_current_user)):
+async def get_user_stats(current_user: UserSnapshot = Depends(get_current_user_snapshot)):
     """Get user's gamification stats."""
     return {
         "id": current_user.id,
@@ -76,7 +131,7 @@ async def get_user_stats(current_user: User = Depends(get_current_user)):
     }
 
 @router.get("/strava/auth")
-async def strava_auth(current_user: User = Depends(get_current_user)):
+async def strava_auth(current_user: UserSnapshot = Depends(get_current_user_snapshot)):
     """Get Strava authorization URL."""
     strava = StravaService()
     # Create a state token with the user's email
@@ -90,7 +145,7 @@ async def strava_auth(current_user: User = Depends(get_current_user)):
 async def strava_callback(
     code: str,
     state: str = "",
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Handle Strava OAuth callback."""
     # Get the token from the state if provided
@@ -111,19 +166,19 @@ async def strava_callback(
         
         # Get or create user based on Strava athlete ID
         athlete_id = str(token_response["athlete"]["id"])
-        user = db.query(User).filter(User.strava_athlete_id == athlete_id).first()
+        user = await db.scalar(select(User).where(User.strava_athlete_id == athlete_id))
         
         if not user:
             # Try to find by email
             athlete_email = token_response["athlete"].get("email")
             if athlete_email:
-                user = db.query(User).filter(User.email == athlete_email).first()
+                user = await db.scalar(select(User).where(User.email == athlete_email))
             
             if not user:
                 raise HTTPException(status_code=400, detail="Please register or login first")
     else:
         # Get user by email
-        user = db.query(User).filter(User.email == user_email).first()
+        user = await db.scalar(select(User).where(User.email == user_email))
         if not user:
             raise HTTPException(status_code=400, detail="User not found")
         
@@ -138,11 +193,13 @@ async def strava_callback(
     user.strava_refresh_token = token_response["refresh_token"]
     user.strava_token_expires_at = token_response["expires_at"]
     user.strava_athlete_id = str(token_response["athlete"]["id"])
+    token_manager.invalidate(user.id)
     
     # Store the connection timestamp to only sync activities after this point
     user.strava_connected_at = datetime.utcnow()
     
-    db.commit()
+    await db.commit()
+    user_cache.invalidate(user.id)
     
     # Don't sync historical activities, we'll only sync new ones
     # that happen after the connection timestamp
@@ -167,142 +224,449 @@ async def strava_webhook_verify(
 @router.post("/strava/webhook")
 async def strava_webhook(
     request: Request,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Handle Strava webhook events."""
-    event = await request.json()
+    """Acknowledge a Strava webhook event and queue it for processing."""
+    try:
+        event = validate_event(await request.json())
+    except (InvalidWebhookEvent, ValueError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
     print(f"Received Strava webhook event: {event}")
-    
-    # Get user by Strava athlete ID
-    user = db.query(User).filter(User.strava_athlete_id == str(event["owner_id"])).first()
-    if not user:
-        print(f"User not found for Strava athlete ID: {event['owner_id']}")
-        return {"message": "User not found"}
-    
-    # Only process activities that happened after Strava connection
-    if not user.strava_connected_at:
-        print(f"No connection timestamp found for user: {user.email}")
-        return {"message": "No connection timestamp found"}
-        
-    activity_start = datetime.fromtimestamp(event["object_id"])
-    if activity_start < user.strava_connected_at:
-        print(f"Activity {event['object_id']} is before Strava connection time")
-        return {"message": "Activity is before Strava connection"}
-    
-    strava = StravaService()
-    activity = await strava.get_activity(event["object_id"], user.strava_access_token)
-    if not activity:
-        print(f"Failed to fetch activity {event['object_id']} from Strava")
-        return {"message": "Activity not found"}
-    
-    print(f"Retrieved activity from Strava: {activity}")
-    
-    # Skip if already synced
-    if str(activity["id"]) in (user.synced_activities or []):
-        print(f"Activity {activity['id']} already synced")
-        return {"message": "Activity already synced"}
-    
-    # Convert Strava activity to our format
-    if activity["type"] == "Walk":
-        transport_mode = "WALKING"
-        co2_saved = activity["distance"] * 0.2  # 200g CO2 saved per km vs driving
-    elif activity["type"] == "Run":
-        transport_mode = "RUNNING"
-        co2_saved = activity["distance"] * 0.2  # 200g CO2 saved per km vs driving
-    elif activity["type"] == "Ride":
-        transport_mode = "CYCLING"
-        co2_saved = activity["distance"] * 0.2  # 200g CO2 saved per km vs driving
-    else:
-        print(f"Unsupported activity type: {activity['type']}")
-        return {"message": "Unsupported activity type"}
-    
-    print(f"Processing activity: type={transport_mode}, distance={activity['distance']}, co2_saved={co2_saved}")
-    
-    # Create activity
-    db_activity = Activity(
-        user_id=user.id,
-        activity_type=transport_mode,
-        distance=activity["distance"],
-        duration=activity["moving_time"],
-        carbon_impact=co2_saved,
-        start_time=datetime.strptime(activity["start_date"], "%Y-%m-%dT%H:%M:%SZ"),
-        end_time=datetime.strptime(activity["start_date"], "%Y-%m-%dT%H:%M:%SZ") + timedelta(seconds=activity["moving_time"])
+
+    # Only new activities are ingested; updates, deletes and athlete
+    # deauthorizations are acknowledged and dropped.
+    if event["object_type"] != "activity" or event["aspect_type"] != "create":
+        return {"message": "Event ignored"}
+
+    if not await webhook_queue.enqueue(db, event):
+        return {"message": "Event already queued"}
+    return {"message": "Event queued"}
+
+@router.post("/strava/backfill")
+async def start_strava_backfill(
+    after: Optional[int] = Query(None, description="Only import activities started after this Unix timestamp"),
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Import the user's Strava history in the background, resuming an interrupted run."""
+    if not current_user.strava_connected:
+        raise HTTPException(status_code=400, detail="Strava is not connected")
+    job = await backfill_service.get_or_create_job(
+        db, current_user, datetime.utcfromtimestamp(after) if after is not None else None
     )
-    db.add(db_activity)
-    
-    # Update user stats
-    user.total_distance = (user.total_distance or 0.0) + activity["distance"]
-    user.total_co2_saved = (user.total_co2_saved or 0.0) + co2_saved
-    if user.synced_activities is None:
-        user.synced_activities = []
-    user.synced_activities.append(str(activity["id"]))
-    
-    # Calculate and add points
-    gamification = GamificationService()
-    points = gamification.calculate_points(
-        distance=activity["distance"],
-        duration=activity["moving_time"],
-        transport_mode=transport_mode
+    backfill_service.start(current_user.id)
+    return {"job_id": job.id, "status": job.status, "next_page": job.next_page, "imported": job.imported}
+
+@router.get("/strava/backfill")
+async def get_strava_backfill(
+    current_user: UserSnapshot = Depends(get_current_user_snapshot),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Get the status of the user's latest Strava history import."""
+    job = await db.scalar(
+        select(BackfillJob).where(
+            BackfillJob.user_id == current_user.id
+        ).order_by(BackfillJob.id.desc())
     )
-    user.points = (user.points or 0) + points
-    
-    print(f"Updated user stats: distance={user.total_distance}, co2_saved={user.total_co2_saved}, points={user.points}")
-    
-    db.commit()
-    return {"message": "Activity processed successfully"}
+    if not job:
+        raise HTTPException(status_code=404, detail="No backfill found")
+    return {
+        "job_id": job.id,
+        "status": job.status,
+        "next_page": job.next_page,
+        "imported": job.imported,
+        "last_error": job.last_error,
+    }
 
 @router.post("/user/location")
 async def update_user_location(
     location: LocationUpdate,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Update user's location."""
+    """Update user's location and feed it to their trip tracker.
+
+    `trip` is the tracker's response to this fix: a completed trip, a trip
+    prediction, or null. `events` are the same ones /ws/locations sends,
+    including milestones reached by a completed trip.
+    """
     current_user.latitude = location.latitude
     current_user.longitude = location.longitude
     current_user.location_updated_at = datetime.utcnow()
     
-    db.commit()
-    return {"message": "Location updated successfully"}
+    await db.commit()
+
+    try:
+        results, events = await _ingest_locations(current_user.id, [location])
+    except TrackerSessionConflict as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e), headers={"Retry-After": "1"})
+    return {"message": "Location updated successfully", "trip": results[-1] if results else None, "events": events}
+
+# Fixes accepted in one /ws/locations message
+LOCATION_BATCH_LIMIT = 1000
+_location_batch = TypeAdapter(List[LocationUpdate])
+
+def _parse_location_message(message: str) -> Tuple[Optional[int], List[LocationUpdate]]:
+    """Read a JSON list of fixes, or {"seq": n, "locations": [...]}; raises ValueError."""
+    data = json.loads(message)
+    seq = None
+    if isinstance(data, dict):
+        seq = data.get("seq")
+        data = data.get("locations")
+    locations = _location_batch.validate_python(data)
+    if not locations:
+        raise ValueError("No locations in message")
+    if len(locations) > LOCATION_BATCH_LIMIT:
+        raise ValueError(f"At most {LOCATION_BATCH_LIMIT} locations per message")
+    return seq, locations
+
+async def _ingest_locations(user_id: int, locations: List[LocationUpdate]) -> Tuple[List[Dict], List[Dict]]:
+    """Run fixes through the user's tracker as one batch and update their stats
+    with completed trips; returns the tracker's results and the events to push back."""
+    now = datetime.now(timezone.utc)
+    timestamps = []
+    for location in locations:
+        timestamp = location.timestamp or now
+        if timestamp.tzinfo is None:
+            timestamp = timestamp.replace(tzinfo=timezone.utc)
+        timestamps.append(timestamp.timestamp())
+
+    async def feed(tracker) -> Tuple[List[Dict], List[Dict]]:
+        results = await tracker.process_location_batch(
+            [location.latitude for location in locations],
+            [location.longitude for location in locations],
+            timestamps,
+            [location.speed or 0 for location in locations],
+            [location.activity_type for location in locations]
+        )
+        events = []
+        for result in results:
+            if "prediction" in result:
+                events.append({"type": "trip_started", "prediction": result["prediction"]})
+                continue
+            events.append({"type": "trip_completed", "trip": result})
+            milestones = tracker.update_user_stats(user_id, result)
+            if milestones:
+                events.append({"type": "milestones", **milestones})
+        return results, events
+
+    return await tracker_sessions.run(user_id, feed)
+
+@router.websocket("/ws/locations")
+async def stream_locations(websocket: WebSocket, token: Optional[str] = None):
+    """Bulk location ingest over one authenticated connection.
+
+    Authenticate with `?token=` or an `Authorization: Bearer` header. Each
+    text message is a JSON list of LocationUpdate objects, or
+    {"seq": n, "locations": [...]}. The fixes go through the user's trip
+    tracker as one batch; the server replies with any trip_started,
+    trip_completed and milestones events, then {"type": "ack", "seq": n,
+    "received": count}. A bad message gets {"type": "error"} and the
+    connection stays open.
+    """
+    authorization = websocket.headers.get("authorization", "")
+    if token is None and authorization.lower().startswith("bearer "):
+        token = authorization[7:]
+    async with AsyncSessionLocal() as db:
+        user = await user_from_token(db, token) if token else None
+        user_id = user.id if user is not None else None
+    if user_id is None:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
+    await websocket.accept()
+    try:
+        while True:
+            message = await websocket.receive_text()
+            try:
+                seq, locations = _parse_location_message(message)
+            except ValueError as e:
+                await websocket.send_json({"type": "error", "detail": str(e)})
+                continue
+
+            started = time.perf_counter()
+            try:
+                _, events = await _ingest_locations(user_id, locations)
+            except TrackerSessionConflict as e:
+                await websocket.send_json({"type": "error", "seq": seq, "detail": str(e)})
+                continue
+            last = locations[-1]
+            async with AsyncSessionLocal() as db:
+                await db.execute(update(User).where(User.id == user_id).values(
+                    latitude=last.latitude,
+                    longitude=last.longitude,
+                    location_updated_at=datetime.utcnow()
+                ))
+                await db.commit()
+            metrics.observe("locations.batch", time.perf_counter() - started)
+            metrics.incr("locations.points", len(locations))
+
+            for event in events:
+                await websocket.send_json(jsonable_encoder(event))
+            await websocket.send_json({"type": "ack", "seq": seq, "received": len(locations)})
+    except WebSocketDisconnect:
+        pass
 
 @router.post("/user/reset-stats")
 async def reset_user_stats(
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Reset user's stats to start fresh."""
     current_user.total_distance = 0.0
     current_user.total_co2_saved = 0.0
     current_user.points = 0
-    current_user.synced_activities = []
     current_user.achievements = []
     current_user.strava_connected_at = datetime.utcnow()  # Reset connection time to now
     
-    # Delete all activities
-    db.query(Activity).filter(Activity.user_id == current_user.id).delete()
+    # Forget synced Strava IDs and delete all activities
+    await db.execute(delete(SyncedActivity).where(SyncedActivity.user_id == current_user.id))
+    await db.execute(delete(Route).where(
+        Route.activity_id.in_(select(Activity.id).where(Activity.user_id == current_user.id))
+    ))
+    await db.execute(delete(Activity).where(Activity.user_id == current_user.id))
+    await db.execute(delete(DailyRollup).where(DailyRollup.user_id == current_user.id))
+    await db.execute(delete(UserInsight).where(UserInsight.user_id == current_user.id))
     
-    db.commit()
+    await db.commit()
+    user_cache.invalidate(current_user.id)
+    await leaderboard.reset_user(current_user.id)
+    await tracker_sessions.drop(current_user.id)
     return {"message": "Stats reset successfully"}
 
+@router.get("/user/impact-report")
+async def get_impact_report(
+    period: str = Query("weekly", pattern="^(daily|weekly|monthly)$"),
+    start: Optional[date] = Query(None, description="Custom range start; overrides period"),
+    end: Optional[date] = Query(None, description="Custom range end, inclusive; defaults to today"),
+    current_user: UserSnapshot = Depends(get_current_user_snapshot),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Impact totals for a period or custom date range, read from the daily rollups."""
+    today = datetime.utcnow().date()
+    if start is not None:
+        end = end or today
+        if end < start:
+            raise HTTPException(status_code=400, detail="end must not be before start")
+        title = "Your Impact"
+        period = "custom"
+    else:
+        start, end = period_bounds(period, today)
+        title = PERIOD_TITLES[period]
+
+    report = await impact_rollups.report(db, current_user.id, start, end)
+    totals = report["totals"]
+    return {
+        "title": title,
+        "period": period,
+        **report,
+        "summary": f"You've saved {totals['carbon_impact']:.1f}kg of CO2 through {totals['trip_count']} green trips!",
+    }
+
+@router.get("/user/insights")
+async def get_user_insights(
+    current_user: UserSnapshot = Depends(get_current_user_snapshot),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """AI insights on the user's recent trips, precomputed by the nightly batch."""
+    insight = await db.get(UserInsight, current_user.id)
+    if insight is None:
+        raise HTTPException(status_code=404, detail="No insights yet; they are generated overnight")
+    return {
+        "generated_at": insight.generated_at,
+        "features": insight.features,
+        "insights": insight.insights,
+    }
+
+async def _with_names(db: AsyncSession, entries: list) -> list:
+    ids = [entry["user_id"] for entry in entries]
+    names = dict((await db.execute(select(User.id, User.full_name).where(User.id.in_(ids)))).all()) if ids else {}
+    return [{**entry, "name": names.get(entry["user_id"])} for entry in entries]
+
+@router.get("/leaderboard/{board}")
+async def get_leaderboard(
+    board: str,
+    metric: str = Query("points", pattern="^(points|co2|distance)$"),
+    offset: int = Query(0, ge=0),
+    limit: int = Query(50, ge=1, le=200),
+    current_user: UserSnapshot = Depends(get_current_user_snapshot),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Leaderboard page plus the caller's own position.
+
+    `board` is global, weekly (this ISO week), or friends (the caller and
+    the users they follow, ranked on all-time totals).
+    """
+    if board == "friends":
+        friend_ids = list(await db.scalars(select(Friendship.friend_id).where(Friendship.user_id == current_user.id)))
+        entries = await leaderboard.friends(metric, current_user.id, friend_ids)
+        me = next(entry for entry in entries if entry["user_id"] == current_user.id)
+        return {
+            "board": board,
+            "metric": metric,
+            "entries": await _with_names(db, entries[offset:offset + limit]),
+            "me": {"rank": me["rank"], "score": me["score"], "total": len(entries)},
+        }
+    if board not in ("global", "weekly"):
+        raise HTTPException(status_code=404, detail="Unknown leaderboard")
+    entries = await leaderboard.page(board, metric, offset, limit)
+    return {
+        "board": board,
+        "metric": metric,
+        "entries": await _with_names(db, entries),
+        "me": await leaderboard.rank(board, metric, current_user.id),
+    }
+
+@router.post("/user/friends/{friend_id}")
+async def add_friend(
+    friend_id: int,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Follow another user on the friends leaderboard."""
+    if friend_id == current_user.id or await db.get(User, friend_id) is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    if await db.get(Friendship, (current_user.id, friend_id)) is None:
+        db.add(Friendship(user_id=current_user.id, friend_id=friend_id))
+        await db.commit()
+    return {"message": "Friend added"}
+
+@router.delete("/user/friends/{friend_id}")
+async def remove_friend(
+    friend_id: int,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Stop following a user."""
+    await db.execute(delete(Friendship).where(
+        Friendship.user_id == current_user.id, Friendship.friend_id == friend_id
+    ))
+    await db.commit()
+    return {"message": "Friend removed"}
+
+ACTIVITY_COLUMNS = (
+    Activity.id,
+    Activity.activity_type,
+    Activity.distance,
+    Activity.duration,
+    Activity.carbon_impact,
+    Activity.start_time,
+)
+
+# Rows fetched per round trip when streaming from the server-side cursor
+ACTIVITY_STREAM_BATCH = 500
+
+def _activity_dict(row) -> dict:
+    return {
+        "id": row.id,
+        "activity_type": row.activity_type,
+        "description": f"{row.activity_type.title()} activity",
+        "distance": row.distance,
+        "duration": row.duration,
+        "carbon_impact": row.carbon_impact,
+        "timestamp": row.start_time.isoformat(),
+    }
+
+def _activities_query(user_id: int, cursor: Optional[str], limit: Optional[int]):
+    """Newest first, keyed on (start_time, id) so pages stay stable under inserts."""
+    query = select(*ACTIVITY_COLUMNS).where(
+        Activity.user_id == user_id
+    ).order_by(Activity.start_time.desc(), Activity.id.desc())
+    if cursor:
+        try:
+            start_time, activity_id = decode_cursor(cursor)
+        except InvalidCursor as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        query = query.where(tuple_(Activity.start_time, Activity.id) < tuple_(start_time, activity_id))
+    if limit is not None:
+        # One extra row tells us whether there is a next page
+        query = query.limit(limit + 1)
+    return query
+
+async def _stream_activities(query, limit: Optional[int], ndjson: bool):
+    # The request's session is closed before a streaming body is sent, so
+    # the stream opens its own
+    async with AsyncSessionLocal() as db:
+        result = await db.stream(query.execution_options(yield_per=ACTIVITY_STREAM_BATCH))
+        count = 0
+        last = None
+        if not ndjson:
+            yield "["
+        # One chunk per fetched batch keeps per-row overhead out of the stream
+        async for rows in result.partitions():
+            more = limit is not None and count + len(rows) > limit
+            if more:
+                rows = rows[:limit - count]
+            if rows:
+                last = rows[-1]
+            lines = [json.dumps(_activity_dict(row)) for row in rows]
+            if ndjson:
+                chunk = "".join(line + "\n" for line in lines)
+                if more:
+                    chunk += json.dumps({"next_cursor": encode_cursor(last.start_time, last.id)}) + "\n"
+                yield chunk
+            elif lines:
+                yield ("," if count else "") + ",".join(lines)
+            count += len(rows)
+            if more:
+                break
+        if not ndjson:
+            yield "]"
+
 @router.get("/activities")
 async def get_activities(
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    limit: Optional[int] = Query(None, ge=1, le=1000, description="Page size; omit to return everything"),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor value from the previous page"),
+    format: str = Query("json", pattern="^(json|ndjson)$"),
+    current_user: UserSnapshot = Depends(get_current_user_snapshot),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Get user's activities."""
-    activities = db.query(Activity).filter(
-        Activity.user_id == current_user.id
-    ).order_by(Activity.start_time.desc()).all()
-    
-    return [{
-        "id": activity.id,
-        "activity_type": activity.activity_type,
-        "description": f"{activity.activity_type.title()} activity",
-        "distance": activity.distance,
-        "duration": activity.duration,
-        "carbon_impact": activity.carbon_impact,
-        "timestamp": activity.start_time.isoformat(),
-    } for activity in activities]
+    """Get user's activities, newest first.
+
+    With `limit`, one page is returned and the cursor for the next page is
+    sent in the X-Next-Cursor header. `format=ndjson` streams one activity
+    per line; when a `limit` cuts the stream short, the last line is
+    {"next_cursor": ...}. Without `limit` the full history is streamed.
+    """
+    query = _activities_query(current_user.id, cursor, limit)
+    if format == "ndjson":
+        return StreamingResponse(_stream_activities(query, limit, ndjson=True), media_type="application/x-ndjson")
+    if limit is None:
+        return StreamingResponse(_stream_activities(query, None, ndjson=False), media_type="application/json")
+
+    rows = (await db.execute(query)).all()
+    headers = {}
+    if len(rows) > limit:
+        rows = rows[:limit]
+        headers["X-Next-Cursor"] = encode_cursor(rows[-1].start_time, rows[-1].id)
+    return JSONResponse([_activity_dict(row) for row in rows], headers=headers)
+
+@router.get("/activities/{activity_id}/route")
+async def get_activity_route(
+    activity_id: int,
+    decode: bool = Query(False, description="Also return the points as [lat, lng] pairs"),
+    current_user: UserSnapshot = Depends(get_current_user_snapshot),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Get the simplified route of one of the user's activities as an encoded polyline."""
+    route = await db.scalar(
+        select(Route)
+        .join(Activity, Activity.id == Route.activity_id)
+        .where(Route.activity_id == activity_id, Activity.user_id == current_user.id)
+    )
+    if route is None:
+        raise HTTPException(status_code=404, detail="Route not found")
+    result = {
+        "activity_id": route.activity_id,
+        "polyline": route.polyline,
+        "tolerance": route.tolerance,
+        "raw_points": route.raw_points,
+        "points": route.points,
+    }
+    if decode:
+        lats, lngs = polyline.decode(route.polyline)
+        result["coordinates"] = [[lat, lng] for lat, lng in zip(lats, lngs)]
+    return result
 
 @router.post("/strava/create-webhook")
 async def create_strava_webhook():
@@ -313,3 +677,8 @@ async def create_strava_webhook():
     if not result:
         raise HTTPException(status_code=500, detail="Failed to create webhook subscription")
     return {"message": "Webhook subscription created successfully", "result": result}
+
+@router.get("/metrics")
+async def get_metrics():
+    """Expose internal counters, latency timers and gauges."""
+    return await metrics.snapshot()
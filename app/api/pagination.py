@@ -0,0 +1,22 @@
+from typing import Tuple
+from datetime import datetime
+import base64
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(start_time: datetime, row_id: int) -> str:
+    """Opaque keyset cursor pointing just past (start_time, row_id)."""
+    raw = f"{start_time.isoformat()}|{row_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        start_time, row_id = raw.split("|")
+        return datetime.fromisoformat(start_time), int(row_id)
+    except (ValueError, UnicodeDecodeError):
+        raise InvalidCursor("Invalid cursor")
@@ -1,39 +1,64 @@
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from jose import JWTError, jwt
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime
-import os
+from typing import Optional
+import time
 
-from ..db.session import get_db
+from ..core.metrics import metrics
+from ..db.session import AsyncSessionLocal, get_async_db
 from ..models.user import User
+from .user_cache import UserSnapshot, user_cache
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
-SECRET_KEY = os.getenv("SECRET_KEY")
-ALGORITHM = os.getenv("ALGORITHM", "HS256")
+def _credentials_exception() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Could not validate credentials",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+async def user_from_token(db: AsyncSession, token: str) -> Optional[User]:
+    """The user a JWT access token belongs to, or None if it is invalid."""
+    email = user_cache.subject(token)
+    if email is None:
+        return None
+    user = await db.scalar(select(User).where(User.email == email))
+    if user is not None:
+        user_cache.put(user)
+    return user
 
 async def get_current_user(
     token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ) -> User:
     """Get the current authenticated user from the JWT token."""
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
-    
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
-            raise credentials_exception
-    except JWTError:
-        raise credentials_exception
-        
-    user = db.query(User).filter(User.email == email).first()
+    started = time.perf_counter()
+    user = await user_from_token(db, token)
+    metrics.observe("auth.user", time.perf_counter() - started)
     if user is None:
-        raise credentials_exception
+        raise _credentials_exception()
         
-    return user 
\ No newline at end of file
+    return user
+
+async def get_current_user_snapshot(token: str = Depends(oauth2_scheme)) -> UserSnapshot:
+    """Cached view of the current user for read-only endpoints.
+
+    Reads the database only on a cache miss; use get_current_user where the
+    endpoint changes the user.
+    """
+    started = time.perf_counter()
+    email = user_cache.subject(token)
+    if email is None:
+        raise _credentials_exception()
+    snapshot = user_cache.get(email)
+    if snapshot is None:
+        async with AsyncSessionLocal() as db:
+            user = await db.scalar(select(User).where(User.email == email))
+        if user is None:
+            raise _credentials_exception()
+        snapshot = user_cache.put(user)
+    metrics.observe("auth.snapshot", time.perf_counter() - started)
+    return snapshot
@@ -0,0 +1,92 @@
+from typing import Dict, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import time
+from passlib.context import CryptContext
+from app.core.config import get_settings
+from app.core.metrics import metrics
+
+settings = get_settings()
+
+
+class PasswordHasherBusy(Exception):
+    """Too many hashes are already queued; the caller should retry later."""
+
+
+class PasswordHasher:
+    """Bcrypt hashing and verification on a small dedicated thread pool.
+
+    bcrypt releases the GIL, so `workers` threads use up to that many cores
+    while the event loop and the default threadpool stay free for other
+    traffic. At most `max_queue` calls wait behind the running ones; past
+    that `hash` and `verify` raise PasswordHasherBusy straight away instead
+    of letting a login storm build an unbounded backlog.
+
+    Hashes use `rounds` as the bcrypt cost. `verify` also returns a new hash
+    when the stored one was made with a different cost, so passwords move to
+    the configured cost as users log in.
+    """
+
+    def __init__(self, rounds: int = settings.PASSWORD_BCRYPT_ROUNDS,
+                 workers: int = settings.PASSWORD_HASH_WORKERS,
+                 max_queue: int = settings.PASSWORD_HASH_MAX_QUEUE):
+        self.rounds = rounds
+        self.workers = workers
+        self.max_queue = max_queue
+        self.context = CryptContext(
+            schemes=["bcrypt"],
+            deprecated="auto",
+            bcrypt__rounds=rounds,
+            bcrypt__min_rounds=rounds,
+            bcrypt__max_rounds=rounds,
+        )
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._pending = 0
+        self._rejected = 0
+        self._rehashed = 0
+
+    async def _run(self, name: str, fn, *args):
+        if self._pending >= self.workers + self.max_queue:
+            self._rejected += 1
+            metrics.incr("passwords.rejected")
+            raise PasswordHasherBusy()
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix="bcrypt")
+        self._pending += 1
+        started = time.perf_counter()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+        finally:
+            self._pending -= 1
+            metrics.observe(f"passwords.{name}", time.perf_counter() - started)
+
+    async def hash(self, password: str) -> str:
+        return await self._run("hash", self.context.hash, password)
+
+    async def verify(self, password: str, hashed: Optional[str]) -> Tuple[bool, Optional[str]]:
+        """Check a password; returns (valid, new hash to store or None)."""
+        if not hashed:
+            return False, None
+        valid, new_hash = await self._run("verify", self.context.verify_and_update, password, hashed)
+        if valid and new_hash:
+            self._rehashed += 1
+        return valid, new_hash if valid else None
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self) -> Dict:
+        return {
+            "rounds": self.rounds,
+            "workers": self.workers,
+            "in_flight": min(self._pending, self.workers),
+            "queued": max(self._pending - self.workers, 0),
+            "rejected": self._rejected,
+            "rehashed": self._rehashed,
+        }
+
+
+password_hasher = PasswordHasher()
+metrics.gauge("passwords", password_hasher.stats)
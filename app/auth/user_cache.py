@@ -0,0 +1,122 @@
+from typing import Dict, Optional, Tuple
+from collections import OrderedDict
+from dataclasses import dataclass
+import os
+import time
+from jose import JWTError, jwt
+from app.core.config import get_settings
+from app.core.metrics import metrics
+from app.models.user import User
+
+settings = get_settings()
+
+SECRET_KEY = os.getenv("SECRET_KEY")
+ALGORITHM = os.getenv("ALGORITHM", "HS256")
+
+
+@dataclass(frozen=True)
+class UserSnapshot:
+    """The User fields read-only endpoints use, detached from any session."""
+    id: int
+    email: str
+    full_name: Optional[str]
+    total_distance: float
+    total_co2_saved: float
+    points: int
+    strava_connected: bool
+
+    @classmethod
+    def from_user(cls, user: User) -> "UserSnapshot":
+        return cls(
+            id=user.id,
+            email=user.email,
+            full_name=user.full_name,
+            total_distance=float(user.total_distance or 0.0),
+            total_co2_saved=float(user.total_co2_saved or 0.0),
+            points=int(user.points or 0),
+            strava_connected=bool(user.strava_connected or False),
+        )
+
+
+class UserCache:
+    """Bounded TTL caches of token subjects and user snapshots.
+
+    A token's subject is cached until `ttl` seconds pass or the token
+    expires, so repeat requests skip the JWT decode; snapshots are cached
+    for `ttl` seconds by email. Both are LRUs of at most `size` entries.
+    Writes that change a user call `invalidate`; other app processes see
+    the change once their entry expires.
+    """
+
+    def __init__(self, size: int = settings.AUTH_CACHE_SIZE, ttl: float = settings.AUTH_CACHE_TTL_SECONDS,
+                 clock=time.time):
+        self.size = size
+        self.ttl = ttl
+        self.clock = clock
+        self._subjects: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()  # token -> (email, expires)
+        self._users: "OrderedDict[str, Tuple[UserSnapshot, float]]" = OrderedDict()  # email -> (snapshot, expires)
+        self._emails: Dict[int, str] = {}  # user id -> email of cached snapshots
+        self._hits = 0
+        self._misses = 0
+
+    def _store(self, cache: OrderedDict, key, value):
+        cache[key] = value
+        cache.move_to_end(key)
+        while len(cache) > self.size:
+            _, (evicted, _) = cache.popitem(last=False)
+            if isinstance(evicted, UserSnapshot):
+                self._emails.pop(evicted.id, None)
+
+    def subject(self, token: str) -> Optional[str]:
+        """The email a valid access token was issued for, or None."""
+        now = self.clock()
+        cached = self._subjects.get(token) if self.ttl > 0 else None
+        if cached is not None and cached[1] > now:
+            self._subjects.move_to_end(token)
+            return cached[0]
+        try:
+            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        except JWTError:
+            return None
+        email = payload.get("sub")
+        if email is None:
+            return None
+        if self.ttl > 0:
+            self._store(self._subjects, token, (email, min(now + self.ttl, payload.get("exp", now + self.ttl))))
+        return email
+
+    def get(self, email: str) -> Optional[UserSnapshot]:
+        cached = self._users.get(email) if self.ttl > 0 else None
+        if cached is not None and cached[1] > self.clock():
+            self._users.move_to_end(email)
+            self._hits += 1
+            metrics.incr("auth_cache.hits")
+            return cached[0]
+        self._misses += 1
+        metrics.incr("auth_cache.misses")
+        return None
+
+    def put(self, user: User) -> UserSnapshot:
+        snapshot = UserSnapshot.from_user(user)
+        if self.ttl > 0:
+            self._store(self._users, snapshot.email, (snapshot, self.clock() + self.ttl))
+            self._emails[snapshot.id] = snapshot.email
+        return snapshot
+
+    def invalidate(self, user_id: int):
+        """Forget a user's snapshot after a write that changes it."""
+        email = self._emails.pop(user_id, None)
+        if email is not None:
+            self._users.pop(email, None)
+
+    def stats(self) -> Dict:
+        lookups = self._hits + self._misses
+        return {
+            "tokens": len(self._subjects),
+            "users": len(self._users),
+            "hit_ratio": self._hits / lookups if lookups else 0.0,
+        }
+
+
+user_cache = UserCache()
+metrics.gauge("auth_cache", user_cache.stats)
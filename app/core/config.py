@@ -13,15 +13,96 @@ class Settings(BaseSettings):
     SECRET_KEY: str
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+    # Authenticated-user cache: token subjects and user snapshots, per process
+    AUTH_CACHE_SIZE: int = 10000
+    AUTH_CACHE_TTL_SECONDS: float = 30.0  # 0 disables it
+    # Password hashing runs on its own thread pool; stored hashes with another cost are redone on login
+    PASSWORD_BCRYPT_ROUNDS: int = 12
+    PASSWORD_HASH_WORKERS: int = 2
+    PASSWORD_HASH_MAX_QUEUE: int = 32  # hashes waiting for a worker before logins get 503
     DATABASE_URL: str = "sqlite:////tmp/ecoprint.db" if os.environ.get("VERCEL") else "sqlite:///./ecoprint.db"
     OPENAI_API_KEY: Optional[str] = None
+
+    # AI insights: "openai" or "stub" (a local stand-in model)
+    AI_BACKEND: str = "openai"
+    AI_MODEL: str = "gpt-4"
+    AI_MAX_CONCURRENCY: int = 4  # model calls in flight per process
+    AI_TIMEOUT_SECONDS: float = 30.0  # including the wait for a free slot
+    AI_CACHE_SIZE: int = 1000  # answers kept in memory
+    AI_CACHE_TTL_SECONDS: float = 86400.0  # 0 disables the cache
+    # SQLite file shared by processes and restarts; empty keeps answers in memory only
+    AI_CACHE_PATH: Optional[str] = "/tmp/ai_cache.db" if os.environ.get("VERCEL") else "./ai_cache.db"
+    # Nightly insights batch (python -m app.db.generate_insights)
+    INSIGHTS_WEEKS: int = 12  # trips summarized per user
+    INSIGHTS_CONCURRENCY: int = 8  # users analyzed at once
+    INSIGHTS_CHUNK_SIZE: int = 500  # users per feature query and write
+
+    # Database engine tuning; pool settings apply to file and server databases
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 30.0  # seconds to wait for a free connection
+    DB_POOL_RECYCLE: int = 1800  # seconds before a connection is replaced
+    DB_POOL_PRE_PING: bool = True
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000
+    SQLITE_CACHE_SIZE_KB: int = 65536
+    SQLITE_MMAP_SIZE: int = 268435456  # 256 MB
     
     # Strava settings (optional)
     STRAVA_CLIENT_ID: Optional[str] = None
     STRAVA_CLIENT_SECRET: Optional[str] = None
     STRAVA_WEBHOOK_VERIFY_TOKEN: Optional[str] = None
     STRAVA_REDIRECT_URI: Optional[str] = None
-    
+    STRAVA_API_BASE_URL: str = "https://www.strava.com/api/v3"
+    STRAVA_OAUTH_BASE_URL: str = "https://www.strava.com/oauth"
+
+    # Strava app-wide quotas; refreshed from X-RateLimit-* response headers
+    STRAVA_RATE_LIMIT_15MIN: int = 200
+    STRAVA_RATE_LIMIT_DAILY: int = 2000
+    STRAVA_RATE_LIMIT_WEBHOOK_RESERVE: float = 0.05  # share of each window kept for interactive calls
+    STRAVA_RATE_LIMIT_BACKFILL_RESERVE: float = 0.3
+    STRAVA_THROTTLE_RETRIES: int = 3  # 429 responses to wait out before giving up
+    STRAVA_TOKEN_REFRESH_MARGIN_SECONDS: int = 300  # refresh access tokens this long before expiry
+
+    # Historical activity backfill
+    STRAVA_BACKFILL_PER_PAGE: int = 100  # Strava allows up to 200
+    STRAVA_BACKFILL_CONCURRENCY: int = 4  # pages fetched in parallel, one bulk insert per window
+
+    # Shared HTTP client used for all Strava calls
+    HTTP_POOL_LIMIT: int = 100  # total open connections
+    HTTP_POOL_LIMIT_PER_HOST: int = 20
+    HTTP_KEEPALIVE_TIMEOUT: float = 30.0  # seconds an idle connection stays pooled
+    HTTP_CONNECT_TIMEOUT: float = 5.0
+    HTTP_TOTAL_TIMEOUT: float = 30.0
+
+    # Stored routes keep only the fixes needed to stay within this many meters of the raw track
+    ROUTE_SIMPLIFY_TOLERANCE_M: float = 5.0
+
+    # Achievement definitions (JSON); defaults to app/data/achievements.json
+    ACHIEVEMENTS_FILE: Optional[str] = None
+
+    # Emission factors (JSON); defaults to app/data/emission_factors.json
+    EMISSION_FACTORS_FILE: Optional[str] = None
+    EMISSION_REGION: str = "global"  # regions missing from the file use its default_region
+
+    # Per-user trip tracking state: "memory" (this process), "sql" (app database) or "redis"
+    TRACKER_SESSION_BACKEND: str = "memory"
+    TRACKER_SESSION_CACHE_SIZE: int = 10000  # trackers kept in memory; least recently used are evicted
+    TRACKER_SESSION_MEMORY_STORE_SIZE: int = 100000  # evicted states the "memory" backend keeps; oldest are dropped
+    TRACKER_SESSION_FLUSH_SECONDS: float = 1.0  # batch changed states this often; 0 writes on every update
+    TRACKER_SESSION_REDIS_URL: str = "redis://localhost:6379/0"
+
+    # Leaderboards: "memory" keeps boards in this process, "redis" shares them
+    LEADERBOARD_BACKEND: str = "memory"
+    LEADERBOARD_REDIS_URL: str = "redis://localhost:6379/0"
+
+    # Webhook ingestion queue
+    WEBHOOK_WORKERS: int = 4
+    WEBHOOK_MAX_ATTEMPTS: int = 5
+    WEBHOOK_RETRY_BASE_SECONDS: float = 5.0
+    WEBHOOK_RETRY_MAX_SECONDS: float = 600.0
+    WEBHOOK_POLL_INTERVAL_SECONDS: float = 1.0
+    WEBHOOK_VISIBILITY_TIMEOUT_SECONDS: float = 300.0
+
     class Config:
         env_file = ".env"
         extra = "allow"  # Allow extra fields to be passed
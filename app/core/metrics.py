@@ -0,0 +1,69 @@
+from typing import Callable, Dict
+from collections import defaultdict
+import inspect
+import threading
+
+
+class _Timer:
+    __slots__ = ("count", "total", "max")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float):
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def snapshot(self) -> Dict:
+        return {
+            "count": self.count,
+            "avg_ms": (self.total / self.count * 1000) if self.count else 0.0,
+            "max_ms": self.max * 1000,
+        }
+
+
+class MetricsRegistry:
+    """Process-wide counters, latency timers and gauges."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, int] = defaultdict(int)
+        self._timers: Dict[str, _Timer] = defaultdict(_Timer)
+        self._gauges: Dict[str, Callable[[], object]] = {}
+
+    def incr(self, name: str, value: int = 1):
+        with self._lock:
+            self._counters[name] += value
+
+    def observe(self, name: str, seconds: float):
+        with self._lock:
+            self._timers[name].observe(seconds)
+
+    def gauge(self, name: str, func: Callable[[], object]):
+        """Register a callable, or coroutine function, evaluated each time a snapshot is taken."""
+        self._gauges[name] = func
+
+    def counter(self, name: str) -> int:
+        return self._counters.get(name, 0)
+
+    async def snapshot(self) -> Dict:
+        with self._lock:
+            counters = dict(self._counters)
+            timers = {name: timer.snapshot() for name, timer in self._timers.items()}
+        gauges = {}
+        for name, func in list(self._gauges.items()):
+            try:
+                value = func()
+                if inspect.isawaitable(value):
+                    value = await value
+                gauges[name] = value
+            except Exception as e:
+                gauges[name] = f"unavailable: {e}"
+        return {"counters": counters, "timers": timers, "gauges": gauges}
+
+
+metrics = MetricsRegistry()
@@ -2,3 +2,12 @@
 from .base_class import Base  # noqa
 from ..models.user import User  # noqa
 from ..models.activity import Activity  # noqa
+from ..models.webhook_event import WebhookEvent  # noqa
+from ..models.backfill_job import BackfillJob  # noqa
+from ..models.synced_activity import SyncedActivity  # noqa
+from ..models.daily_rollup import DailyRollup  # noqa
+from ..models.friendship import Friendship  # noqa
+from ..models.route import Route  # noqa
+from ..models.tracker_session import TrackerSession  # noqa
+from ..models.recompute_checkpoint import RecomputeCheckpoint  # noqa
+from ..models.user_insight import UserInsight  # noqa
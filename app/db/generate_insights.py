@@ -0,0 +1,49 @@
+"""Precompute AI insights for users whose activities changed since their last ones.
+
+Meant to run nightly, e.g. from cron; users without new or deleted
+activities are skipped, and failed users are retried on the next run:
+
+    python -m app.db.generate_insights [--weeks N] [--concurrency N] [--chunk-size USERS]
+"""
+import argparse
+import asyncio
+import sys
+import time
+from ..core.config import get_settings
+from ..services.nightly_insights import InsightsBatch
+
+settings = get_settings()
+
+
+async def _run(batch: InsightsBatch):
+    from .session import async_engine
+
+    try:
+        return await batch.run()
+    finally:
+        await async_engine.dispose()
+
+
+def main() -> int:
+    from .init_db import init_db
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--weeks", type=int, default=settings.INSIGHTS_WEEKS, help="weeks of trips summarized")
+    parser.add_argument("--concurrency", type=int, default=settings.INSIGHTS_CONCURRENCY,
+                        help="users analyzed at once")
+    parser.add_argument("--chunk-size", type=int, default=settings.INSIGHTS_CHUNK_SIZE,
+                        help="users per trips query and write")
+    args = parser.parse_args()
+
+    init_db().close()
+    batch = InsightsBatch(weeks=args.weeks, concurrency=args.concurrency, chunk_size=args.chunk_size)
+    started = time.perf_counter()
+    stats = asyncio.run(_run(batch))
+    seconds = time.perf_counter() - started
+    print(f"{stats['candidates']} users with changed activities in {seconds:.2f}s: {stats['analyzed']} analyzed, "
+          f"{stats['no_recent_trips']} without recent trips, {stats['failed']} failed")
+    return 1 if stats["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
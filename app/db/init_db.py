@@ -1,12 +1,10 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
 from .base import Base
-from .session import SQLALCHEMY_DATABASE_URL, connect_args
+from .session import engine, SessionLocal
+from .migrations import run_migrations
 
 def init_db():
     """Initialize the database with the correct schema."""
-    engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args=connect_args)
     Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
 
-    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-    return SessionLocal() 
\ No newline at end of file
+    return SessionLocal()
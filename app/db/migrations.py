@@ -0,0 +1,94 @@
+import json
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Engine
+
+
+def _add_column(engine: Engine, table: str, column: str, ddl_type: str):
+    columns = {c["name"] for c in inspect(engine).get_columns(table)}
+    if column not in columns:
+        with engine.begin() as conn:
+            conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl_type}"))
+
+
+def add_strava_connected_at(engine: Engine):
+    _add_column(engine, "users", "strava_connected_at", "DATETIME")
+
+
+def move_synced_activity_lists(engine: Engine):
+    """Copy the legacy User.synced_activities JSON lists into strava_synced_activities."""
+    with engine.begin() as conn:
+        rows = conn.execute(text(
+            "SELECT id, synced_activities FROM users "
+            "WHERE synced_activities IS NOT NULL "
+            "AND CAST(synced_activities AS TEXT) NOT IN ('[]', 'null')"
+        )).all()
+        for user_id, synced in rows:
+            if isinstance(synced, str):
+                synced = json.loads(synced)
+            strava_ids = {int(strava_id) for strava_id in synced or []}
+            existing = set(conn.execute(
+                text("SELECT strava_activity_id FROM strava_synced_activities WHERE user_id = :user_id"),
+                {"user_id": user_id}
+            ).scalars())
+            missing = strava_ids - existing
+            if missing:
+                conn.execute(
+                    text("INSERT INTO strava_synced_activities (user_id, strava_activity_id) VALUES (:user_id, :strava_id)"),
+                    [{"user_id": user_id, "strava_id": strava_id} for strava_id in missing]
+                )
+            conn.execute(text("UPDATE users SET synced_activities = '[]' WHERE id = :user_id"), {"user_id": user_id})
+
+
+def create_missing_indexes(engine: Engine):
+    """create_all skips indexes on tables that already exist; add them here."""
+    from .base import Base
+
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+
+
+def add_daily_rollup_points(engine: Engine):
+    _add_column(engine, "daily_rollups", "points", "FLOAT NOT NULL DEFAULT 0")
+
+
+def populate_daily_rollups(engine: Engine):
+    """Build rollups for activities stored before daily_rollups existed."""
+    from ..services.impact_rollups import rebuild_statements
+
+    with engine.begin() as conn:
+        if conn.execute(text("SELECT 1 FROM daily_rollups LIMIT 1")).first() is not None:
+            return
+        if conn.execute(text("SELECT 1 FROM activities LIMIT 1")).first() is None:
+            return
+        for statement in rebuild_statements():
+            conn.execute(statement)
+
+
+def add_user_location(engine: Engine):
+    _add_column(engine, "users", "latitude", "FLOAT")
+    _add_column(engine, "users", "longitude", "FLOAT")
+    _add_column(engine, "users", "location_updated_at", "DATETIME")
+
+
+def add_activity_emission_factors_version(engine: Engine):
+    # Left NULL on existing rows; the next score recompute tags them
+    _add_column(engine, "activities", "emission_factors_version", "VARCHAR")
+
+
+# Applied in order after create_all; every step must be idempotent.
+MIGRATIONS = [
+    add_strava_connected_at,
+    move_synced_activity_lists,
+    create_missing_indexes,
+    add_daily_rollup_points,
+    populate_daily_rollups,
+    add_user_location,
+    add_activity_emission_factors_version,
+]
+
+
+def run_migrations(engine: Engine):
+    """Bring tables created by older versions up to the current schema."""
+    for migration in MIGRATIONS:
+        migration(engine)
@@ -0,0 +1,38 @@
+"""Regenerate the daily impact rollups from the activities table.
+
+Run it after bulk edits to activities, or to repair drift:
+
+    python -m app.db.rebuild_rollups [--user-id ID]
+"""
+import argparse
+import sys
+import time
+from sqlalchemy import func, select
+from ..models.daily_rollup import DailyRollup
+from ..services.impact_rollups import rebuild_statements
+
+
+def main() -> int:
+    from .init_db import init_db
+    from .session import engine
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--user-id", type=int, help="only rebuild this user's rollups")
+    args = parser.parse_args()
+
+    init_db().close()
+    started = time.perf_counter()
+    clear, fill = rebuild_statements(args.user_id)
+    with engine.begin() as conn:
+        conn.execute(clear)
+        conn.execute(fill)
+        count = select(func.count()).select_from(DailyRollup)
+        if args.user_id is not None:
+            count = count.where(DailyRollup.user_id == args.user_id)
+        rows = conn.scalar(count)
+    print(f"Rebuilt {rows} rollup rows in {time.perf_counter() - started:.2f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
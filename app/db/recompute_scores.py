@@ -0,0 +1,65 @@
+"""Recompute activity CO2, user totals and rollups with the current scoring rules.
+
+Run it after changing how points or CO2 savings are calculated. Progress is
+checkpointed per shard; running the same command again resumes it. Once every
+shard has finished, the shared (Redis) leaderboards are rebuilt from the new
+totals; in-memory boards are rebuilt when the app restarts. On SQLite, which
+has one writer at a time, a single shard is fastest:
+
+    python -m app.db.recompute_scores [--shards N] [--chunk-size ROWS] [--run NAME] [--restart]
+"""
+import argparse
+import asyncio
+import sys
+import time
+from ..core.config import get_settings
+from ..services.score_recompute import DEFAULT_CHUNK_SIZE, ScoreRecompute
+
+settings = get_settings()
+
+
+async def _rebuild_leaderboards():
+    from ..services.leaderboard import leaderboard
+    from .session import async_engine
+
+    try:
+        await leaderboard.rebuild()
+    finally:
+        await async_engine.dispose()
+
+
+def main() -> int:
+    from .init_db import init_db
+    from .session import engine
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--shards", type=int, default=1,
+                        help="users are split by id into this many parallel shards; keep 1 on SQLite")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="activities per transaction")
+    parser.add_argument("--run", default="default", help="checkpoint name; reuse it to resume")
+    parser.add_argument("--restart", action="store_true", help="discard this run's checkpoints first")
+    args = parser.parse_args()
+
+    init_db().close()
+    recompute = ScoreRecompute(engine, args.run, args.shards, args.chunk_size)
+    if args.restart:
+        recompute.restart()
+    started = time.perf_counter()
+    try:
+        checkpoints = recompute.run_all()
+    except ValueError as error:
+        print(error)
+        return 1
+    seconds = time.perf_counter() - started
+    activities = sum(checkpoint["activities"] for checkpoint in checkpoints)
+    updated = sum(checkpoint["updated"] for checkpoint in checkpoints)
+    print(f"Recomputed {activities} activities ({updated} changed) in {seconds:.2f}s "
+          f"across {args.shards} shard(s)")
+    if settings.LEADERBOARD_BACKEND != "memory":
+        asyncio.run(_rebuild_leaderboards())
+        print("Rebuilt leaderboards")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,23 +1,126 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
-import os
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+import time
+from ..core.config import get_settings
+from ..core.metrics import metrics
 
-# For Vercel serverless environment, use /tmp directory
-if os.environ.get("VERCEL"):
-    SQLALCHEMY_DATABASE_URL = "sqlite:////tmp/ecoprint.db"
-else:
-    # Local development
-    SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./ecoprint.db")
+settings = get_settings()
 
-# Create engine with SQLite configuration
-connect_args = {"check_same_thread": False} if SQLALCHEMY_DATABASE_URL.startswith("sqlite") else {}
-engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args=connect_args)
+# For Vercel serverless environment this defaults to the /tmp directory
+SQLALCHEMY_DATABASE_URL = settings.DATABASE_URL
+
+# Async drivers for the same database: aiosqlite for SQLite, asyncpg for Postgres
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+    "postgres": "postgresql+asyncpg",
+}
+
+def to_async_url(url: str) -> str:
+    scheme, rest = url.split("://", 1)
+    return f"{ASYNC_DRIVERS.get(scheme, scheme)}://{rest}"
+
+def _is_sqlite(url: str) -> bool:
+    return url.startswith("sqlite")
+
+def _is_sqlite_memory(url: str) -> bool:
+    return _is_sqlite(url) and (url.endswith(":memory:") or url.rstrip("/").endswith("sqlite:"))
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that records how long callers wait for a connection."""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            metrics.observe("db.pool_checkout_wait.sync", time.perf_counter() - started)
+
+class TimedAsyncQueuePool(AsyncAdaptedQueuePool):
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            metrics.observe("db.pool_checkout_wait.async", time.perf_counter() - started)
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    # WAL lets readers proceed while a writer commits; NORMAL is durable
+    # across application crashes and only loses the last commits on power loss
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA busy_timeout={settings.SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.execute(f"PRAGMA cache_size=-{settings.SQLITE_CACHE_SIZE_KB}")
+    cursor.execute(f"PRAGMA mmap_size={settings.SQLITE_MMAP_SIZE}")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.close()
+
+def _engine_options(url: str, asynchronous: bool) -> dict:
+    options = {}
+    if _is_sqlite(url):
+        options["connect_args"] = {"check_same_thread": False}
+    if not _is_sqlite_memory(url):
+        options.update(
+            poolclass=TimedAsyncQueuePool if asynchronous else TimedQueuePool,
+            pool_size=settings.DB_POOL_SIZE,
+            max_overflow=settings.DB_MAX_OVERFLOW,
+            pool_timeout=settings.DB_POOL_TIMEOUT,
+            pool_recycle=settings.DB_POOL_RECYCLE,
+            pool_pre_ping=settings.DB_POOL_PRE_PING,
+        )
+    return options
+
+def create_db_engine(url: str = SQLALCHEMY_DATABASE_URL) -> Engine:
+    """Build a sync engine with the pool and SQLite settings from Settings."""
+    db_engine = create_engine(url, **_engine_options(url, asynchronous=False))
+    if _is_sqlite(url):
+        event.listen(db_engine, "connect", _set_sqlite_pragmas)
+    return db_engine
+
+def create_async_db_engine(url: str = SQLALCHEMY_DATABASE_URL) -> AsyncEngine:
+    """Async counterpart of create_db_engine for the same database."""
+    db_engine = create_async_engine(to_async_url(url), **_engine_options(url, asynchronous=True))
+    if _is_sqlite(url):
+        event.listen(db_engine.sync_engine, "connect", _set_sqlite_pragmas)
+    return db_engine
+
+# Kept for callers that build their own engines
+connect_args = {"check_same_thread": False} if _is_sqlite(SQLALCHEMY_DATABASE_URL) else {}
+
+engine = create_db_engine()
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Async engine used by the API and background workers so queries do not
+# block the event loop
+async_engine = create_async_db_engine()
+
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+def pool_stats() -> dict:
+    stats = {}
+    for name, pool in (("sync", engine.pool), ("async", async_engine.sync_engine.pool)):
+        if isinstance(pool, QueuePool):
+            stats[name] = {
+                "size": pool.size(),
+                "checked_out": pool.checkedout(),
+                "overflow": pool.overflow(),
+            }
+    return stats
+
+metrics.gauge("db_pool", pool_stats)
+
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
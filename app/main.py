@@ -2,7 +2,13 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import RedirectResponse
 from .api import endpoints
+from .auth.passwords import password_hasher
 from .db.init_db import init_db
+from .db.session import async_engine
+from .services.http_client import http_client
+from .services.leaderboard import leaderboard
+from .services.tracker_sessions import tracker_sessions
+from .services.webhook_queue import webhook_queue
 
 app = FastAPI(
     title="EcoPrint API",
@@ -22,6 +28,23 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.on_event("startup")
+async def startup():
+    """Open long-lived resources shared across requests."""
+    await http_client.startup()
+    await leaderboard.startup()
+    await tracker_sessions.start()
+    await webhook_queue.start()
+
+@app.on_event("shutdown")
+async def shutdown():
+    """Release long-lived resources."""
+    await webhook_queue.stop()
+    await tracker_sessions.stop()
+    await http_client.shutdown()
+    password_hasher.shutdown()
+    await async_engine.dispose()
+
 @app.get("/")
 async def root():
     """Redirect to API documentation."""
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from ..db.base_class import Base
 
@@ -10,9 +10,15 @@ class Activity(Base):
     activity_type = Column(String)  # WALKING, RUNNING, CYCLING, etc.
     distance = Column(Float)  # in meters
     duration = Column(Integer)  # in seconds
-    carbon_impact = Column(Float)  # in kg CO2
+    carbon_impact = Column(Float)  # g CO2 saved vs driving
+    emission_factors_version = Column(String)  # emission_factors.json version carbon_impact was computed with
     start_time = Column(DateTime)
     end_time = Column(DateTime)
     
     # Relationships
     user = relationship("User", back_populates="activities")
+
+    __table_args__ = (
+        # Serves GET /activities (filter by user, newest first) and per-user deletes
+        Index("ix_activities_user_id_start_time", "user_id", "start_time"),
+    )
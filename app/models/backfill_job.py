@@ -0,0 +1,21 @@
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey
+from datetime import datetime
+from ..db.base_class import Base
+
+class BackfillJob(Base):
+    """Progress of a Strava history import; `next_page` is the resume cursor."""
+    __tablename__ = "backfill_jobs"
+
+    RUNNING = "running"
+    DONE = "done"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), index=True, nullable=False)
+    status = Column(String, nullable=False, default=RUNNING)
+    after = Column(DateTime, nullable=True)  # only import activities that started after this
+    per_page = Column(Integer, nullable=False)
+    next_page = Column(Integer, nullable=False, default=1)
+    imported = Column(Integer, nullable=False, default=0)
+    last_error = Column(String, nullable=True)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    updated_at = Column(DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -0,0 +1,20 @@
+from sqlalchemy import Column, Integer, String, Float, Date, ForeignKey
+from ..db.base_class import Base
+
+class DailyRollup(Base):
+    """Per-user, per-day, per-mode activity totals kept in step with Activity.
+
+    Reports sum these rows instead of scanning activities, so a date range
+    costs one row per active day and mode. The primary key (user_id, day,
+    activity_type) serves those range reads and the ingest upserts.
+    """
+    __tablename__ = "daily_rollups"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    day = Column(Date, primary_key=True)
+    activity_type = Column(String, primary_key=True)
+    distance = Column(Float, nullable=False, default=0.0)  # in meters
+    duration = Column(Integer, nullable=False, default=0)  # in seconds
+    carbon_impact = Column(Float, nullable=False, default=0.0)  # in g CO2, like Activity.carbon_impact
+    trip_count = Column(Integer, nullable=False, default=0)
+    points = Column(Float, nullable=False, default=0.0)
@@ -0,0 +1,11 @@
+from sqlalchemy import Column, Integer, DateTime, ForeignKey
+from datetime import datetime
+from ..db.base_class import Base
+
+class Friendship(Base):
+    """One direction of a friend link; the friends leaderboard reads a user's rows by primary key."""
+    __tablename__ = "friendships"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    friend_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
@@ -0,0 +1,25 @@
+from sqlalchemy import Column, Integer, String, Float, Boolean, DateTime
+from datetime import datetime
+from ..db.base_class import Base
+
+class RecomputeCheckpoint(Base):
+    """Resume point of one shard of a points and CO2 recompute.
+
+    The shard has processed activities up to (last_user_id, last_activity_id)
+    in that order; the user_* columns hold the partial totals of
+    last_user_id, whose activities may continue in the next chunk.
+    """
+    __tablename__ = "recompute_checkpoints"
+
+    run = Column(String, primary_key=True)
+    shard = Column(Integer, primary_key=True)
+    shards = Column(Integer, nullable=False)
+    last_user_id = Column(Integer, nullable=False, default=0)
+    last_activity_id = Column(Integer, nullable=False, default=0)
+    user_distance = Column(Float, nullable=False, default=0.0)
+    user_co2_saved = Column(Float, nullable=False, default=0.0)
+    user_points = Column(Float, nullable=False, default=0.0)
+    activities = Column(Integer, nullable=False, default=0)  # processed so far
+    updated = Column(Integer, nullable=False, default=0)  # activities whose carbon_impact changed
+    finished = Column(Boolean, nullable=False, default=False)
+    updated_at = Column(DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -0,0 +1,12 @@
+from sqlalchemy import Column, Integer, Float, Text, ForeignKey
+from ..db.base_class import Base
+
+class Route(Base):
+    """Simplified route of an activity as a Google encoded polyline."""
+    __tablename__ = "routes"
+
+    activity_id = Column(Integer, ForeignKey("activities.id"), primary_key=True)
+    polyline = Column(Text, nullable=False)
+    tolerance = Column(Float, nullable=False)  # in meters
+    raw_points = Column(Integer, nullable=False)  # fixes before simplification
+    points = Column(Integer, nullable=False)
@@ -0,0 +1,14 @@
+from sqlalchemy import Column, Integer, BigInteger, ForeignKey
+from ..db.base_class import Base
+
+class SyncedActivity(Base):
+    """Strava activities already imported for a user.
+
+    The composite primary key makes dedup an indexed lookup and lets the
+    database reject a second import of the same activity.
+    """
+    __tablename__ = "strava_synced_activities"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    strava_activity_id = Column(BigInteger, primary_key=True)
+    activity_id = Column(Integer, ForeignKey("activities.id"), nullable=True)
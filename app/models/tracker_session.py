@@ -0,0 +1,17 @@
+from sqlalchemy import Column, Integer, LargeBinary, DateTime, ForeignKey
+from datetime import datetime
+from ..db.base_class import Base
+
+class TrackerSession(Base):
+    """Serialized ActivityTracker state of one user.
+
+    `version` goes up by one on every save; writers only update the row
+    version they loaded, so app processes sharing the table cannot
+    overwrite each other's newer state.
+    """
+    __tablename__ = "tracker_sessions"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    version = Column(Integer, nullable=False, default=1)
+    state = Column(LargeBinary, nullable=False)
+    updated_at = Column(DateTime, nullable=False, default=datetime.utcnow)
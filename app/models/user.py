@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, Boolean, JSON
+from sqlalchemy import Column, Integer, String, Float, Boolean, DateTime, JSON
 from sqlalchemy.orm import relationship
 from ..db.base_class import Base
 
@@ -14,14 +14,21 @@ class User(Base):
     current_streak = Column(Integer, default=0)
     points = Column(Integer, default=0)
     achievements = Column(JSON, default=list)
+    # Legacy list of synced Strava IDs, moved into SyncedActivity by migrations
     synced_activities = Column(JSON, default=list)
+
+    # Last reported location
+    latitude = Column(Float, nullable=True)
+    longitude = Column(Float, nullable=True)
+    location_updated_at = Column(DateTime, nullable=True)
     
     # Strava integration
     strava_connected = Column(Boolean, default=False)
     strava_access_token = Column(String, nullable=True)
     strava_refresh_token = Column(String, nullable=True)
     strava_token_expires_at = Column(Integer, nullable=True)
-    strava_athlete_id = Column(String, nullable=True)
+    strava_athlete_id = Column(String, nullable=True, index=True)
+    strava_connected_at = Column(DateTime, nullable=True)
     
     # Relationships
     activities = relationship("Activity", back_populates="user")
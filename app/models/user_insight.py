@@ -0,0 +1,19 @@
+from sqlalchemy import Column, Integer, DateTime, ForeignKey, JSON
+from datetime import datetime
+from ..db.base_class import Base
+
+class UserInsight(Base):
+    """Latest precomputed AI insights of one user, written by the nightly batch.
+
+    activity_count and last_activity_id describe the activities the
+    insights were generated from; the batch regenerates them only once
+    either changes.
+    """
+    __tablename__ = "user_insights"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    activity_count = Column(Integer, nullable=False)
+    last_activity_id = Column(Integer, nullable=False)
+    features = Column(JSON, nullable=False)  # the summary the model was given
+    insights = Column(JSON, nullable=True)  # None when there were no recent trips to analyze
+    generated_at = Column(DateTime, nullable=False, default=datetime.utcnow)
@@ -0,0 +1,28 @@
+from sqlalchemy import Column, Integer, String, DateTime, JSON, Index
+from datetime import datetime
+from ..db.base_class import Base
+
+class WebhookEvent(Base):
+    """Strava webhook event waiting to be (or already) processed."""
+    __tablename__ = "webhook_events"
+
+    PENDING = "pending"
+    PROCESSING = "processing"
+    DONE = "done"
+    DEAD = "dead"
+
+    id = Column(Integer, primary_key=True, index=True)
+    # object_type:object_id:aspect_type:event_time, so Strava redeliveries are dropped
+    event_key = Column(String, unique=True, nullable=False)
+    payload = Column(JSON, nullable=False)
+    status = Column(String, nullable=False, default=PENDING)
+    attempts = Column(Integer, nullable=False, default=0)
+    last_error = Column(String, nullable=True)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    next_attempt_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    locked_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        Index("ix_webhook_events_status_next_attempt", "status", "next_attempt_at"),
+    )
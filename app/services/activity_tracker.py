@@ -1,31 +1,31 @@
-from typing import Dict, List, Optional
-from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Sequence
+from datetime import date, datetime, time, timedelta, timezone
+from math import radians, sin, cos, sqrt, atan2
 import json
+import numpy as np
 from app.services.carbon_calculator import CarbonCalculator
+from app.services.gamification import AchievementProgress, achievement_engine
+from app.services.impact_rollups import PERIOD_TITLES, period_bounds
+from app.services import polyline
+from app.services.route_index import RouteIndex
+from app.services.route_simplifier import RouteSimplifier
+from app.services.trip_points import TripPoints, from_micros, to_micros
 import aiohttp
 import asyncio
 from dataclasses import dataclass
 from enum import Enum
 
-# Add milestone definitions
-MILESTONES = {
-    "carbon_saved": [
-        {"amount": 1, "title": "Carbon Saver Rookie", "message": "Saved your first kg of CO2!"},
-        {"amount": 5, "title": "Earth Guardian", "message": "Saved 5kg of CO2!"},
-        {"amount": 10, "title": "Climate Champion", "message": "Saved 10kg of CO2!"},
-        {"amount": 50, "title": "Planet Protector", "message": "Saved 50kg of CO2!"},
-        {"amount": 100, "title": "Carbon Warrior", "message": "Saved 100kg of CO2!"},
-    ],
-    "green_trips": [
-        {"amount": 1, "title": "First Green Trip", "message": "Completed your first eco-friendly trip!"},
-        {"amount": 10, "title": "Green Explorer", "message": "10 eco-friendly trips completed!"},
-        {"amount": 50, "title": "Sustainable Voyager", "message": "50 eco-friendly trips - you're on a roll!"},
-    ],
-    "streaks": [
-        {"amount": 3, "title": "Green Streak", "message": "3 days in a row of eco-friendly travel!"},
-        {"amount": 7, "title": "Weekly Warrior", "message": "A full week of green trips!"},
-        {"amount": 30, "title": "Monthly Master", "message": "30 days of sustainable choices!"},
-    ]
+GREEN_MODES = ("walk", "bike", "run")
+
+EARTH_RADIUS_M = 6371000
+
+# Upper speed bound in km/h for each mode; faster than TRAIN is a flight
+SPEED_THRESHOLDS = {
+    "WALKING": 7,
+    "RUNNING": 15,
+    "BIKING": 30,
+    "TRAIN": 150,
+    "FLIGHT": 250
 }
 
 class TransportMode(Enum):
@@ -38,18 +38,38 @@ class TransportMode(Enum):
     CAR = "car"
     FLIGHT = "flight"
 
+# Integer codes for transport modes in batch processing: MODE_CODES[code]
+MODE_CODES = list(TransportMode)
+STILL_CODE = MODE_CODES.index(TransportMode.STILL)
+# Scalar updates feed the route simplifier once this many fixes are pending
+ROUTE_UPDATE_EVERY = 64
+
+def haversine_distances(lat1: np.ndarray, lon1: np.ndarray, lat2: np.ndarray, lon2: np.ndarray) -> np.ndarray:
+    """Element-wise Haversine distance in meters; the array form of _calculate_distance."""
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return EARTH_RADIUS_M * 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
 @dataclass
 class Trip:
     start_time: datetime
     start_location: Dict
     transport_mode: TransportMode
-    locations: List[Dict]
+    locations: TripPoints
     distance: float = 0
     carbon_impact: float = 0
     is_active: bool = True
     route_details: Dict = None
     predicted_impact: float = 0
     eco_alternatives: List[Dict] = None
+    route: RouteSimplifier = None
+
+    def __post_init__(self):
+        # Callers may still pass a list of location dicts
+        if not isinstance(self.locations, TripPoints):
+            self.locations = TripPoints(self.locations or [])
+        if self.route is None:
+            self.route = RouteSimplifier()
 
 @dataclass
 class UserStats:
@@ -58,10 +78,24 @@ class UserStats:
     current_streak: int = 0
     longest_streak: int = 0
     last_activity_date: Optional[datetime] = None
-    achieved_milestones: List[Dict] = None
+    achievements: AchievementProgress = None
+    achieved_at: Dict[int, datetime] = None  # achievement bit -> when it was earned
     
     def __post_init__(self):
-        self.achieved_milestones = []
+        self.achievements = AchievementProgress()
+        self.achieved_at = {}
+
+    def __setstate__(self, state):
+        # Sessions saved before the achievement engine kept a list of milestone dicts
+        legacy = state.pop("achieved_milestones", None)
+        self.__dict__.update(state)
+        if legacy is not None:
+            self.__post_init__()
+            for milestone in legacy:
+                achievement = achievement_engine.find(milestone["type"], milestone["amount"])
+                if achievement is not None:
+                    self.achievements.earned |= 1 << achievement.bit
+                    self.achieved_at[achievement.bit] = self.last_activity_date or datetime.now()
 
 class ActivityTracker:
     def __init__(self):
@@ -70,9 +104,23 @@ class ActivityTracker:
         self.trips: List[Trip] = []
         self.TRIP_END_THRESHOLD = timedelta(minutes=5)
         self.last_update = None
-        self.common_routes = {}
+        self.common_routes = RouteIndex()
         self.user_stats: Dict[int, UserStats] = {}  # user_id -> UserStats
-        
+        # user_id -> day -> mode -> [distance, duration, carbon_saved, trips]
+        self.daily_totals: Dict[int, Dict[date, Dict[str, List[float]]]] = {}
+        
+    def __getstate__(self):
+        # Saved by TrackerSessionService. Completed trips were already returned
+        # to the caller, so only the state needed to continue tracking is kept.
+        state = self.__dict__.copy()
+        del state["carbon_calculator"]
+        state["trips"] = []
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.carbon_calculator = CarbonCalculator()
+
     def get_user_stats(self, user_id: int) -> UserStats:
         if user_id not in self.user_stats:
             self.user_stats[user_id] = UserStats()
@@ -94,6 +142,7 @@ class ActivityTracker:
             )
         
         stats.total_carbon_saved += carbon_saved
+        self._record_daily_totals(user_id, trip_data)
         
         # Update streak
         if stats.last_activity_date:
@@ -109,30 +158,13 @@ class ActivityTracker:
         
         # Check for new milestones
         new_milestones = []
-        
-        # Carbon saved milestones
-        for milestone in MILESTONES["carbon_saved"]:
-            if (milestone["amount"] <= stats.total_carbon_saved and 
-                milestone not in stats.achieved_milestones):
-                new_milestone = {**milestone, "type": "carbon_saved"}
-                stats.achieved_milestones.append(new_milestone)
-                new_milestones.append(new_milestone)
-        
-        # Green trips milestones
-        for milestone in MILESTONES["green_trips"]:
-            if (milestone["amount"] <= stats.green_trips_count and 
-                milestone not in stats.achieved_milestones):
-                new_milestone = {**milestone, "type": "green_trips"}
-                stats.achieved_milestones.append(new_milestone)
-                new_milestones.append(new_milestone)
-        
-        # Streak milestones
-        for milestone in MILESTONES["streaks"]:
-            if (milestone["amount"] <= stats.current_streak and 
-                milestone not in stats.achieved_milestones):
-                new_milestone = {**milestone, "type": "streaks"}
-                stats.achieved_milestones.append(new_milestone)
-                new_milestones.append(new_milestone)
+        for achievement in achievement_engine.evaluate(stats.achievements, {
+            "carbon_saved": stats.total_carbon_saved,
+            "green_trips": stats.green_trips_count,
+            "streaks": stats.current_streak,
+        }):
+            stats.achieved_at[achievement.bit] = stats.last_activity_date
+            new_milestones.append(achievement.milestone())
         
         if new_milestones:
             return {
@@ -146,43 +178,61 @@ class ActivityTracker:
             }
         return None
         
-    def get_impact_report(self, user_id: int, period: str = "weekly") -> Dict:
-        """Generate impact report for different time periods."""
+    def _record_daily_totals(self, user_id: int, trip_data: Dict):
+        """Add a completed trip to the user's per-day, per-mode totals."""
+        start_time = datetime.fromisoformat(trip_data["start_time"])
+        end_time = datetime.fromisoformat(trip_data["end_time"]) if trip_data.get("end_time") else start_time
+        mode = trip_data["transport_mode"]
+        # Reports count the CO2 a green trip avoided compared to driving it
+        carbon_saved = self.carbon_calculator.calculate_transport_impact(
+            trip_data["distance"] / 1000,
+            "car"
+        ) if mode in GREEN_MODES else 0.0
+
+        days = self.daily_totals.setdefault(user_id, {})
+        totals = days.setdefault(start_time.date(), {}).setdefault(mode, [0.0, 0.0, 0.0, 0])
+        totals[0] += trip_data["distance"]
+        totals[1] += (end_time - start_time).total_seconds()
+        totals[2] += carbon_saved
+        totals[3] += 1
+
+    def get_impact_report(self, user_id: int, period: str = "weekly",
+                          start: Optional[date] = None, end: Optional[date] = None) -> Dict:
+        """Generate impact report for a period, or a custom start..end range.
+
+        Reads the user's daily totals, so the cost grows with the number of
+        days in the range rather than the number of trips.
+        """
         stats = self.get_user_stats(user_id)
         now = datetime.now()
-        
-        # Filter trips for the specified period
-        if period == "daily":
-            start_date = now.replace(hour=0, minute=0, second=0, microsecond=0)
-            title = "Today's Impact"
-        elif period == "weekly":
-            start_date = now - timedelta(days=now.weekday())
-            start_date = start_date.replace(hour=0, minute=0, second=0, microsecond=0)
-            title = "This Week's Impact"
-        else:  # monthly
-            start_date = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-            title = "This Month's Impact"
-            
-        period_trips = [
-            trip for trip in self.trips 
-            if trip.start_time >= start_date and 
-            trip.transport_mode.value in ["walk", "bike", "run"]
-        ]
-        
-        # Calculate impact
-        total_distance = sum(trip.distance for trip in period_trips)
-        carbon_saved = sum(
-            self.carbon_calculator.calculate_transport_impact(
-                trip.distance / 1000,
-                "car"  # Compare to if they had driven
-            )
-            for trip in period_trips
-        )
+
+        if start is not None:
+            end = end or now.date()
+            title = "Your Impact"
+            period = "custom"
+        else:
+            start, end = period_bounds(period if period in PERIOD_TITLES else "monthly", now.date())
+            title = PERIOD_TITLES.get(period, PERIOD_TITLES["monthly"])
+        start_date = datetime.combine(start, time.min)
+
+        total_distance = 0.0
+        carbon_saved = 0.0
+        green_trips = 0
+        days = self.daily_totals.get(user_id, {})
+        day = start
+        while day <= end:
+            for mode, (distance, _, saved, trips) in days.get(day, {}).items():
+                if mode in GREEN_MODES:
+                    total_distance += distance
+                    carbon_saved += saved
+                    green_trips += trips
+            day += timedelta(days=1)
         
         # Get achievements for the period
         period_achievements = [
-            m for m in stats.achieved_milestones
-            if datetime.fromisoformat(m.get("achieved_at", now.isoformat())) >= start_date
+            {**achievement_engine.by_bit[bit].milestone(), "achieved_at": achieved_at.isoformat()}
+            for bit, achieved_at in stats.achieved_at.items()
+            if achieved_at >= start_date and bit in achievement_engine.by_bit
         ]
         
         return {
@@ -191,10 +241,10 @@ class ActivityTracker:
             "stats": {
                 "total_distance": total_distance,
                 "carbon_saved": carbon_saved,
-                "green_trips": len(period_trips),
+                "green_trips": green_trips,
                 "achievements": period_achievements
             },
-            "summary": f"You've saved {carbon_saved:.1f}kg of CO2 through {len(period_trips)} green trips!",
+            "summary": f"You've saved {carbon_saved:.1f}kg of CO2 through {green_trips} green trips!",
             "streak": {
                 "current": stats.current_streak,
                 "longest": stats.longest_streak
@@ -219,15 +269,7 @@ class ActivityTracker:
         if not self.current_trip and transport_mode != TransportMode.STILL:
             predicted_data = self._predict_trip_impact(location_data)
             if predicted_data:
-                return {
-                    "message": "Trip started",
-                    "prediction": {
-                        "likely_destination": predicted_data["destination"],
-                        "estimated_distance": predicted_data["distance"],
-                        "estimated_carbon": predicted_data["carbon_impact"],
-                        "eco_alternatives": predicted_data["alternatives"]
-                    }
-                }
+                return self._trip_started_message(predicted_data)
         
         # Handle trip start/end/update
         activity = await self._handle_trip_state(location_data, transport_mode, current_time)
@@ -235,17 +277,194 @@ class ActivityTracker:
         self.last_update = current_time
         return activity
     
+    def _trip_started_message(self, predicted_data: Dict) -> Dict:
+        return {
+            "message": "Trip started",
+            "prediction": {
+                "likely_destination": predicted_data["destination"],
+                "estimated_distance": predicted_data["distance"],
+                "estimated_carbon": predicted_data["carbon_impact"],
+                "eco_alternatives": predicted_data["alternatives"]
+            }
+        }
+
+    async def process_location_batch(
+        self,
+        latitudes: Sequence[float],
+        longitudes: Sequence[float],
+        timestamps: Sequence[float],
+        speeds: Sequence[float],
+        activity_types: Optional[Sequence[str]] = None,
+        altitudes: Optional[Sequence[float]] = None,
+    ) -> List[Dict]:
+        """Process a buffered batch of GPS fixes with NumPy.
+
+        Arrays are aligned per fix; timestamps are epoch seconds and speeds
+        m/s. Distances, speeds, modes and trip boundaries are computed for
+        the whole batch at once. Returns what process_location_update would
+        have returned for each fix in order, without the Nones, and leaves
+        the tracker in the same state.
+        """
+        lat = np.asarray(latitudes, dtype=np.float64)
+        lng = np.asarray(longitudes, dtype=np.float64)
+        # Whole microseconds, like datetime, so gap checks match the scalar path exactly
+        micros = np.round(np.asarray(timestamps, dtype=np.float64) * 1e6).astype(np.int64)
+        speed = np.asarray(speeds, dtype=np.float64)
+        altitude = np.zeros(len(lat)) if altitudes is None else np.asarray(altitudes, dtype=np.float64)
+        modes = self._classify_modes(speed * 3.6, altitude, activity_types)
+
+        batch = (lat, lng, micros, speed, altitude, modes, activity_types)
+        results: List[Dict] = []
+        start = 0
+        while start < len(lat):
+            start = await self._process_batch_span(batch, start, results)
+        return results
+
+    def _classify_modes(self, speed_kmh: np.ndarray, altitude: np.ndarray,
+                        activity_types: Optional[Sequence[str]]) -> np.ndarray:
+        """Array form of _detect_transport_mode, as MODE_CODES indexes."""
+        still = speed_kmh < 1
+        if activity_types is not None:
+            still |= np.asarray(activity_types, dtype=object) == "STILL"
+        code = MODE_CODES.index
+        return np.select(
+            [
+                still,
+                (altitude > 1000) | (speed_kmh > SPEED_THRESHOLDS["FLIGHT"]),
+                speed_kmh > SPEED_THRESHOLDS["TRAIN"],
+                speed_kmh <= SPEED_THRESHOLDS["WALKING"],
+                speed_kmh <= SPEED_THRESHOLDS["RUNNING"],
+                speed_kmh <= SPEED_THRESHOLDS["BIKING"],
+            ],
+            [
+                STILL_CODE,
+                code(TransportMode.FLIGHT),
+                code(TransportMode.TRAIN),
+                code(TransportMode.WALKING),
+                code(TransportMode.RUNNING),
+                code(TransportMode.BIKING),
+            ],
+            default=code(TransportMode.CAR)
+        )
+
+    async def _process_batch_span(self, batch: tuple, lo: int, results: List[Dict]) -> int:
+        """Apply fixes lo.. of a batch; return where to continue.
+
+        Stops early, like process_location_update, at a trip start that
+        yields a prediction, since that fix is not applied to trip state.
+        """
+        lat, lng, micros, speed, altitude, modes, activity_types = batch
+        hi = len(lat)
+        threshold = self.TRIP_END_THRESHOLD // timedelta(microseconds=1)
+
+        # A stationary fix ends an open trip after a long enough silence
+        previous = np.empty(hi - lo, dtype=np.int64)
+        previous[1:] = micros[lo:hi - 1]
+        previous[0] = to_micros(self.last_update) if self.last_update else micros[lo]
+        gap_ends = lo + np.flatnonzero((modes[lo:hi] == STILL_CODE) & (micros[lo:hi] - previous > threshold))
+        ends_seen = np.searchsorted(gap_ends, np.arange(lo, hi), side="right")
+
+        moving = lo + np.flatnonzero(modes[lo:hi] != STILL_CODE)
+        steps = haversine_distances(lat[moving[:-1]], lng[moving[:-1]], lat[moving[1:]], lng[moving[1:]])
+        # A moving fix starts a trip after a gap end, or continues/changes the open one
+        from_idle = np.empty(len(moving), dtype=bool)
+        new_trip = np.empty(len(moving), dtype=bool)
+        if len(moving):
+            from_idle[0] = self.current_trip is None or ends_seen[moving[0] - lo] > 0
+            new_trip[0] = from_idle[0] or MODE_CODES[modes[moving[0]]] != self.current_trip.transport_mode
+            from_idle[1:] = ends_seen[moving[1:] - lo] != ends_seen[moving[:-1] - lo]
+            new_trip[1:] = from_idle[1:] | (modes[moving[1:]] != modes[moving[:-1]])
+
+        # Runs of moving fixes that belong to one trip; a first run without a
+        # start carries on the trip that was open before this span
+        bounds = np.flatnonzero(new_trip).tolist()
+        if len(moving) and not new_trip[0]:
+            bounds.insert(0, 0)
+        bounds.append(len(moving))
+
+        last_applied = lo - 1  # latest moving fix applied to a trip
+        for a, b in zip(bounds, bounds[1:]):
+            first = int(moving[a])
+            if new_trip[a]:
+                if from_idle[a] and self.current_trip is not None:
+                    await self._end_trip_at_gap(gap_ends, last_applied, micros, results)
+                if from_idle[a]:
+                    prediction = self._predict_trip_impact(self._batch_location_data(batch, first))
+                    if prediction:
+                        results.append(self._trip_started_message(prediction))
+                        self._set_last_update(micros, first - 1, lo)
+                        return first + 1
+                if self.current_trip is not None:
+                    # Mode changed: the open trip ends where the new one starts
+                    results.append(await self._end_current_trip(from_micros(micros[first])))
+                location = self._batch_location(batch, first)
+                self.current_trip = Trip(
+                    start_time=location["timestamp"],
+                    start_location=location,
+                    transport_mode=MODE_CODES[modes[first]],
+                    locations=[location]
+                )
+                a += 1
+            if a < b:
+                self._extend_trip(batch, moving[a:b], steps, a)
+            last_applied = int(moving[b - 1])
+
+        if self.current_trip is not None:
+            await self._end_trip_at_gap(gap_ends, last_applied, micros, results)
+        self._set_last_update(micros, hi - 1, lo)
+        return hi
+
+    def _extend_trip(self, batch: tuple, indexes: np.ndarray, steps: np.ndarray, a: int):
+        """Append moving fixes to the open trip, adding their step distances."""
+        trip = self.current_trip
+        lat, lng = batch[0], batch[1]
+        points = trip.locations
+        first_step = self._calculate_distance(points.lat[-1], points.lng[-1], lat[indexes[0]], lng[indexes[0]])
+        # The first step joins the trip's current last fix; the rest are
+        # between consecutive moving fixes of this run
+        increments = np.concatenate(([trip.distance, first_step], steps[a:a + len(indexes) - 1]))
+        trip.distance = float(np.add.accumulate(increments)[-1])
+        points.extend_columns(lat[indexes], lng[indexes], batch[2][indexes], batch[3][indexes], batch[4][indexes])
+        trip.route.update(points.lat, points.lng)
+        trip.carbon_impact = self.carbon_calculator.calculate_transport_impact(
+            trip.distance / 1000,
+            trip.transport_mode.value
+        )
+
+    async def _end_trip_at_gap(self, gap_ends: np.ndarray, after: int, micros: np.ndarray, results: List[Dict]):
+        """End the open trip at the first stationary gap after fix `after`, if any."""
+        i = np.searchsorted(gap_ends, after, side="right")
+        if i < len(gap_ends):
+            results.append(await self._end_current_trip(from_micros(micros[gap_ends[i]])))
+
+    def _set_last_update(self, micros: np.ndarray, index: int, lo: int):
+        if index >= lo:
+            self.last_update = from_micros(micros[index])
+
+    def _batch_location(self, batch: tuple, i: int) -> Dict:
+        lat, lng, micros, speed, altitude = batch[:5]
+        return {
+            "lat": float(lat[i]),
+            "lng": float(lng[i]),
+            "timestamp": from_micros(micros[i]),
+            "speed": float(speed[i]),
+            "altitude": float(altitude[i])
+        }
+
+    def _batch_location_data(self, batch: tuple, i: int) -> Dict:
+        """A fix in the shape process_location_update receives it."""
+        lat, lng, micros, speed, altitude, _, activity_types = batch
+        return {
+            "latitude": float(lat[i]),
+            "longitude": float(lng[i]),
+            "timestamp": from_micros(micros[i]).isoformat(),
+            "speed": float(speed[i]),
+            "altitude": float(altitude[i]),
+            "activity_type": activity_types[i] if activity_types is not None else None
+        }
+
     async def _detect_transport_mode(self, activity_type: str, speed_kmh: float, location: Dict) -> TransportMode:
         """Enhanced transport mode detection using multiple data points."""
-        # Speed thresholds in km/h
-        SPEED_THRESHOLDS = {
-            "WALKING": 7,
-            "RUNNING": 15,
-            "BIKING": 30,
-            "TRAIN": 150,
-            "FLIGHT": 250
-        }
-        
         if activity_type == "STILL" or speed_kmh < 1:
             return TransportMode.STILL
             
@@ -309,15 +528,18 @@ class ActivityTracker:
             return completed_trip
             
         # Update current trip
+        points = self.current_trip.locations
         distance = self._calculate_distance(
-            self.current_trip.locations[-1]["lat"],
-            self.current_trip.locations[-1]["lng"],
+            points.lat[-1],
+            points.lng[-1],
             location["lat"],
             location["lng"]
         )
         
         self.current_trip.distance += distance
         self.current_trip.locations.append(location)
+        if len(points) - self.current_trip.route.cursor >= ROUTE_UPDATE_EVERY:
+            self.current_trip.route.update(points.lat, points.lng)
         
         # Update carbon impact
         self.current_trip.carbon_impact = self.carbon_calculator.calculate_transport_impact(
@@ -350,6 +572,11 @@ class ActivityTracker:
             self.current_trip.transport_mode
         )
         
+        # Keep only the fixes needed to stay within the simplification tolerance
+        points = self.current_trip.locations
+        self.current_trip.route.update(points.lat, points.lng)
+        kept = self.current_trip.route.indexes(len(points))
+
         trip_data = {
             "activity_type": "transport",
             "transport_mode": self.current_trip.transport_mode.value,
@@ -360,9 +587,12 @@ class ActivityTracker:
             "start_location": self.current_trip.start_location,
             "end_location": self.current_trip.locations[-1],
             "route_details": route_details,
-            "waypoints": self.current_trip.locations
+            "waypoints": [points[i] for i in kept],
+            "polyline": polyline.encode([points.lat[i] for i in kept], [points.lng[i] for i in kept]),
+            "raw_points": len(points)
         }
         
+        self._update_common_routes(self.current_trip)
         self.trips.append(self.current_trip)
         self.current_trip = None
         return trip_data
@@ -378,9 +608,7 @@ class ActivityTracker:
     
     def _calculate_distance(self, lat1: float, lon1: float, lat2: float, lon2: float) -> float:
         """Calculate distance between two points in meters using Haversine formula."""
-        from math import radians, sin, cos, sqrt, atan2
-        
-        R = 6371000  # Earth's radius in meters
+        R = EARTH_RADIUS_M
         
         lat1, lon1, lat2, lon2 = map(radians, [lat1, lon1, lat2, lon2])
         dlat = lat2 - lat1
@@ -427,17 +655,15 @@ class ActivityTracker:
         similar_trips = []
         current_hour = datetime.fromisoformat(start_location["timestamp"].replace('Z', '+00:00')).hour
         
-        for route, data in self.common_routes.items():
-            start_lat, start_lng = map(float, route.split('|')[0].split(','))
-            if self._is_nearby(start_lat, start_lng, start_location["lat"], start_location["lng"]):
-                # Check if this is a common time for this route
-                if current_hour in data["common_hours"]:
-                    similar_trips.append({
-                        "end_location": data["end_location"],
-                        "distance": data["avg_distance"],
-                        "transport_mode": data["common_mode"],
-                        "frequency": data["frequency"]
-                    })
+        for route in self.common_routes.nearby(start_location["latitude"], start_location["longitude"]):
+            # Check if this is a common time for this route
+            if current_hour in route.common_hours:
+                similar_trips.append({
+                    "end_location": route.end_location,
+                    "distance": route.avg_distance,
+                    "transport_mode": route.common_mode,
+                    "frequency": route.frequency
+                })
         
         return similar_trips
     
@@ -484,27 +710,16 @@ class ActivityTracker:
     
     def _update_common_routes(self, trip: Trip):
         """Update common routes database with completed trip."""
-        start_key = f"{trip.start_location['lat']},{trip.start_location['lng']}"
-        end_key = f"{trip.locations[-1]['lat']},{trip.locations[-1]['lng']}"
-        route_key = f"{start_key}|{end_key}"
-        
-        if route_key not in self.common_routes:
-            self.common_routes[route_key] = {
-                "end_location": trip.locations[-1],
-                "avg_distance": trip.distance,
-                "common_mode": trip.transport_mode.value,
-                "frequency": 1,
-                "common_hours": set([trip.start_time.hour])
-            }
-        else:
-            data = self.common_routes[route_key]
-            data["frequency"] += 1
-            data["avg_distance"] = (data["avg_distance"] * (data["frequency"] - 1) + trip.distance) / data["frequency"]
-            data["common_hours"].add(trip.start_time.hour)
-            
-            # Update most common transport mode
-            if trip.transport_mode.value != data["common_mode"]:
-                # TODO: Implement mode frequency tracking
-                pass
+        points = trip.locations
+        self.common_routes.add_trip(
+            trip.start_location["lat"],
+            trip.start_location["lng"],
+            points.lat[-1],
+            points.lng[-1],
+            points[-1],
+            trip.distance,
+            trip.transport_mode.value,
+            trip.start_time.hour
+        )
 
     # ... (keep existing methods) ... 
\ No newline at end of file
@@ -1,37 +1,325 @@
-import openai
-from typing import List, Dict
-from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+from collections import OrderedDict
+import asyncio
+import hashlib
+import json
+import random
+import sqlite3
+import threading
+import time
 from app.core.config import get_settings
+from app.core.metrics import metrics
 
 settings = get_settings()
-openai.api_key = settings.OPENAI_API_KEY
+
+# Part of every cache key; bump it when the prompts change so old answers are not reused
+PROMPT_VERSION = 1
+
+ANALYSIS_SYSTEM = "You are an expert environmental analyst specializing in carbon footprint analysis."
+SUGGESTIONS_SYSTEM = (
+    "You are a helpful environmental advisor providing practical suggestions for reducing carbon footprint."
+)
+
+
+class AIRequestError(Exception):
+    """The model did not answer in time or the request failed."""
+
+
+class OpenAIBackend:
+    """Chat completions from the OpenAI API."""
+
+    def __init__(self, api_key: Optional[str] = settings.OPENAI_API_KEY):
+        import openai
+
+        openai.api_key = api_key
+        self.openai = openai
+
+    async def complete(self, model: str, system: str, prompt: str, temperature: float, max_tokens: int) -> str:
+        response = await self.openai.ChatCompletion.acreate(
+            model=model,
+            messages=[{
+                "role": "system",
+                "content": system
+            }, {
+                "role": "user",
+                "content": prompt
+            }],
+            temperature=temperature,
+            max_tokens=max_tokens
+        )
+        return response.choices[0].message.content
+
+
+class StubBackend:
+    """A local stand-in model for development, tests and benchmarks.
+
+    Answers after `latency` seconds with JSON in the shape the prompts ask
+    for, derived from the prompt so equal prompts get equal answers.
+    """
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.calls = 0
+
+    async def complete(self, model: str, system: str, prompt: str, temperature: float, max_tokens: int) -> str:
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        rng = random.Random(hashlib.sha256(prompt.encode()).digest())
+        suggestions = [f"Suggestion {rng.randint(1, 1000)}" for _ in range(3)]
+        if system == SUGGESTIONS_SYSTEM:
+            return json.dumps(suggestions)
+        return json.dumps({
+            "main_sources": ["car"],
+            "patterns": [f"Pattern {rng.randint(1, 1000)}"],
+            "suggestions": suggestions,
+            "comparison": "Below average",
+            "projection": round(rng.uniform(100, 2000), 1),
+        })
+
+
+def create_backend(backend: str = settings.AI_BACKEND):
+    if backend == "openai":
+        return OpenAIBackend()
+    if backend == "stub":
+        return StubBackend()
+    raise ValueError(f"Unknown AI backend: {backend}")
+
+
+class InsightCache:
+    """Model answers by request key, for `ttl` seconds.
+
+    An LRU of at most `size` answers in memory in front of a SQLite file
+    at `path` (None keeps answers in memory only), which other processes
+    and restarts share. Disk reads and writes run on a worker thread; a
+    failing disk tier only costs cache hits.
+    """
+
+    def __init__(self, size: int = settings.AI_CACHE_SIZE, ttl: float = settings.AI_CACHE_TTL_SECONDS,
+                 path: Optional[str] = settings.AI_CACHE_PATH, clock=time.time):
+        self.size = size
+        self.ttl = ttl
+        self.path = path
+        self.clock = clock
+        self._memory: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()  # key -> (answer, expires)
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+        self._hits = 0
+        self._disk_hits = 0
+        self._misses = 0
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._db is None:
+            db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS ai_responses "
+                "(key TEXT PRIMARY KEY, answer TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            db.execute("DELETE FROM ai_responses WHERE expires_at <= ?", (self.clock(),))
+            self._db = db
+        return self._db
+
+    def _disk_get(self, key: str) -> Optional[Tuple[str, float]]:
+        with self._db_lock:
+            return self._connection().execute(
+                "SELECT answer, expires_at FROM ai_responses WHERE key = ? AND expires_at > ?", (key, self.clock())
+            ).fetchone()
+
+    def _disk_put(self, key: str, answer: str, expires: float):
+        with self._db_lock:
+            self._connection().execute(
+                "INSERT OR REPLACE INTO ai_responses (key, answer, expires_at) VALUES (?, ?, ?)",
+                (key, answer, expires),
+            )
+
+    def _remember(self, key: str, answer: str, expires: float):
+        self._memory[key] = (answer, expires)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.size:
+            self._memory.popitem(last=False)
+
+    def get(self, key: str) -> Optional[str]:
+        """The answer from memory, if there."""
+        cached = self._memory.get(key) if self.ttl > 0 else None
+        if cached is not None and cached[1] > self.clock():
+            self._memory.move_to_end(key)
+            self._hits += 1
+            metrics.incr("ai.cache_hits")
+            return cached[0]
+        return None
+
+    async def load(self, key: str) -> Optional[str]:
+        """The answer from disk after a miss in memory."""
+        if self.ttl > 0 and self.path:
+            try:
+                stored = await asyncio.to_thread(self._disk_get, key)
+            except sqlite3.Error:
+                metrics.incr("ai.disk_errors")
+                stored = None
+            if stored is not None:
+                self._remember(key, *stored)
+                self._disk_hits += 1
+                metrics.incr("ai.disk_hits")
+                return stored[0]
+        self._misses += 1
+        metrics.incr("ai.cache_misses")
+        return None
+
+    async def put(self, key: str, answer: str):
+        if self.ttl <= 0:
+            return
+        expires = self.clock() + self.ttl
+        self._remember(key, answer, expires)
+        if self.path:
+            try:
+                await asyncio.to_thread(self._disk_put, key, answer, expires)
+            except sqlite3.Error:
+                # The answer is still served from memory
+                metrics.incr("ai.disk_errors")
+
+    def close(self):
+        with self._db_lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def stats(self) -> Dict:
+        lookups = self._hits + self._disk_hits + self._misses
+        return {
+            "memory": len(self._memory),
+            "hit_ratio": (self._hits + self._disk_hits) / lookups if lookups else 0.0,
+            "disk_hit_ratio": self._disk_hits / lookups if lookups else 0.0,
+        }
+
+
+def _normalize_text(value: Any) -> str:
+    return " ".join(str(value or "").split())
+
+
+def activities_summary(activities: List[Dict]) -> List[Tuple[str, str, float]]:
+    """What the analysis prompt depends on, in a canonical order and precision."""
+    return sorted(
+        (_normalize_text(a["activity_type"]), _normalize_text(a.get("description")), round(a["carbon_impact"] or 0.0, 2))
+        for a in activities
+    )
+
+
+def suggestions_summary(activities: List[Dict]) -> Tuple[float, List[str]]:
+    total_impact = round(sum(a["carbon_impact"] or 0.0 for a in activities), 1)
+    return total_impact, sorted({_normalize_text(a["activity_type"]) for a in activities})
+
 
 class AIAnalyzer:
-    def __init__(self):
-        self.model = "gpt-4"  # or "gpt-3.5-turbo" for faster/cheaper analysis
-        
+    """Carbon insights from a language model.
+
+    Each request is keyed on a hash of its normalized summary, so requests
+    for equal summaries share one answer: from the cache, or while it is
+    being generated, from the same in-flight call. At most
+    `max_concurrency` calls reach the model at once, and a call that gets
+    no answer within `timeout` seconds (including the wait for a slot)
+    fails. Failed calls are not cached.
+    """
+
+    def __init__(self, backend=None, cache: Optional[InsightCache] = None, model: str = settings.AI_MODEL,
+                 max_concurrency: int = settings.AI_MAX_CONCURRENCY, timeout: float = settings.AI_TIMEOUT_SECONDS):
+        self.model = model
+        self.cache = cache or InsightCache()
+        self.timeout = timeout
+        self._backend = backend
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._requests = 0
+        self._timeouts = 0
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            self._backend = create_backend()
+        return self._backend
+
+    def request_key(self, kind: str, summary: Any) -> str:
+        payload = json.dumps([PROMPT_VERSION, kind, self.model, summary], separators=(",", ":"))
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    async def _complete(self, system: str, prompt: str, temperature: float, max_tokens: int) -> str:
+        async with self._slots:
+            self._requests += 1
+            metrics.incr("ai.requests")
+            started = time.perf_counter()
+            try:
+                return await self.backend.complete(self.model, system, prompt, temperature, max_tokens)
+            finally:
+                metrics.observe("ai.request", time.perf_counter() - started)
+
+    async def _answer(self, key: str, system: str, prompt: str, temperature: float, max_tokens: int) -> str:
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+
+        inflight = self._inflight.get(key)
+        while inflight is not None:
+            metrics.incr("ai.coalesced")
+            try:
+                return await asyncio.shield(inflight)
+            except asyncio.CancelledError:
+                if not inflight.cancelled():
+                    raise
+            # Only the request that was making the call was cancelled; take it over
+            inflight = self._inflight.get(key)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            # Reading the disk tier here makes one read per key, however many requests wait on it
+            answer = await self.cache.load(key)
+            if answer is None:
+                try:
+                    answer = await asyncio.wait_for(
+                        self._complete(system, prompt, temperature, max_tokens), self.timeout
+                    )
+                except asyncio.TimeoutError:
+                    self._timeouts += 1
+                    metrics.incr("ai.timeouts")
+                    raise AIRequestError(f"No answer within {self.timeout}s") from None
+                await self.cache.put(key, answer)
+        except Exception as e:
+            future.set_exception(e)
+            # Mark retrieved so an unawaited failure does not log a warning
+            future.exception()
+            raise
+        else:
+            future.set_result(answer)
+            return answer
+        finally:
+            self._inflight.pop(key, None)
+            # The caller was cancelled; the requests waiting on it are too
+            if not future.done():
+                future.cancel()
+
     async def analyze_activities(self, activities: List[Dict]) -> Dict:
         """Analyze user activities and provide insights using ChatGPT."""
-        
+        summary = activities_summary(activities)
+
         # Format activities for the prompt
         activities_text = "\n".join([
-            f"- {activity['activity_type']}: {activity['description']}, "
-            f"Carbon Impact: {activity['carbon_impact']}kg CO2"
-            for activity in activities
+            f"- {activity_type}: {description}, "
+            f"Carbon Impact: {carbon_impact}kg CO2"
+            for activity_type, description, carbon_impact in summary
         ])
-        
+
         prompt = f"""
         Analyze these user activities and their carbon impact:
-        
+
         {activities_text}
-        
+
         Provide:
         1. Main sources of carbon emissions
         2. Patterns in user behavior
         3. Specific suggestions for reducing carbon footprint
         4. Comparison to average carbon footprint
         5. Projected annual impact if behavior continues
-        
+
         Format the response as JSON with these keys:
         - main_sources
         - patterns
@@ -39,23 +327,12 @@ class AIAnalyzer:
         - comparison
         - projection
         """
-        
+
         try:
-            response = await openai.ChatCompletion.acreate(
-                model=self.model,
-                messages=[{
-                    "role": "system",
-                    "content": "You are an expert environmental analyst specializing in carbon footprint analysis."
-                }, {
-                    "role": "user",
-                    "content": prompt
-                }],
-                temperature=0.7,
-                max_tokens=1000
+            return await self._answer(
+                self.request_key("analysis", summary), ANALYSIS_SYSTEM, prompt, temperature=0.7, max_tokens=1000
             )
-            
-            return response.choices[0].message.content
-            
+
         except Exception as e:
             return {
                 "error": f"AI analysis failed: {str(e)}",
@@ -65,38 +342,77 @@ class AIAnalyzer:
                 "comparison": "Analysis unavailable",
                 "projection": None
             }
-    
+
     async def get_smart_suggestions(self, user_data: Dict) -> List[str]:
         """Generate personalized suggestions based on user's activity patterns."""
-        
-        total_impact = sum(a['carbon_impact'] for a in user_data['activities'])
-        activity_types = set(a['activity_type'] for a in user_data['activities'])
-        
+        summary = suggestions_summary(user_data['activities'])
+        total_impact, activity_types = summary
+
         prompt = f"""
         Based on this user's data:
         - Total carbon impact: {total_impact}kg CO2
         - Activity types: {', '.join(activity_types)}
-        
+
         Provide 3-5 specific, actionable suggestions to reduce their carbon footprint.
         Focus on their most impactful activities and consider realistic lifestyle changes.
         Format each suggestion as a separate string in a JSON array.
         """
-        
+
         try:
-            response = await openai.ChatCompletion.acreate(
-                model=self.model,
-                messages=[{
-                    "role": "system",
-                    "content": "You are a helpful environmental advisor providing practical suggestions for reducing carbon footprint."
-                }, {
-                    "role": "user",
-                    "content": prompt
-                }],
-                temperature=0.8,
-                max_tokens=500
+            return await self._answer(
+                self.request_key("suggestions", summary), SUGGESTIONS_SYSTEM, prompt, temperature=0.8, max_tokens=500
             )
-            
-            return response.choices[0].message.content
-            
+
         except Exception as e:
-            return ["Unable to generate suggestions at this time"] 
\ No newline at end of file
+            return ["Unable to generate suggestions at this time"]
+
+    async def analyze_features(self, features: Dict) -> str:
+        """Insights from a precomputed trip summary (see nightly_insights.trip_features).
+
+        Unlike the methods above, failures raise rather than return a
+        fallback, so batch callers can retry the user later.
+        """
+        modes_text = "\n".join(
+            f"        - {mode}: {mix['trips']} trips, {mix['km']} km, {mix['co2_kg']} kg CO2 saved"
+            for mode, mix in sorted(features["modes"].items())
+        )
+        prompt = f"""
+        Analyze the last {features['weeks']} weeks of this user's green trips and the CO2
+        they saved compared to driving.
+
+        Trips by mode:
+{modes_text}
+
+        CO2 saved per week, oldest first (kg): {features['weekly_co2_kg']}
+        Trend: {features['trend_kg_per_week']} kg per week
+        Projected CO2 saved over a year at this rate: {features['projected_annual_co2_kg']} kg
+
+        Provide:
+        1. Main sources of carbon savings
+        2. Patterns in user behavior
+        3. Specific suggestions for saving more
+        4. Comparison to an average commuter
+        5. Projected annual impact if behavior continues
+
+        Format the response as JSON with these keys:
+        - main_sources
+        - patterns
+        - suggestions
+        - comparison
+        - projection
+        """
+        return await self._answer(
+            self.request_key("features", features), ANALYSIS_SYSTEM, prompt, temperature=0.7, max_tokens=1000
+        )
+
+    def stats(self) -> Dict:
+        return {
+            **self.cache.stats(),
+            "requests": self._requests,
+            "inflight": len(self._inflight),
+            "timeouts": self._timeouts,
+        }
+
+
+ai_analyzer = AIAnalyzer()
+metrics.gauge("ai", ai_analyzer.stats)
@@ -1,22 +1,156 @@
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+from enum import IntEnum
+from pathlib import Path
+import json
+import numpy as np
+from app.core.config import get_settings
+
+settings = get_settings()
+
+EMISSION_FACTORS_FILE = Path(__file__).resolve().parent.parent / "data" / "emission_factors.json"
+
+DEFAULT_CLASS = "default"
+
+
+class EmissionMode(IntEnum):
+    """Index of each transport mode in the compiled factor tables."""
+    WALK = 0
+    RUN = 1
+    BIKE = 2
+    BUS = 3
+    TRAIN = 4
+    CAR = 5
+    FLIGHT = 6
+    STILL = 7
+
+
+# Mode names used across the app: tracker TransportMode values and Strava activity modes
+MODE_INDEX: Dict[str, int] = {mode.name.lower(): int(mode) for mode in EmissionMode}
+MODE_INDEX.update({"WALKING": EmissionMode.WALK.value, "RUNNING": EmissionMode.RUN.value, "CYCLING": EmissionMode.BIKE.value})
+
+
+class EmissionFactorRegistry:
+    """Versioned emission factors per region, mode and vehicle class.
+
+    Transport factors are kg CO2 per km; a mode's factor is either a number
+    or {vehicle class: number} with a "default" class. Each (region, class)
+    pair is compiled once into an array indexed by EmissionMode, falling back
+    to the default region, then the default class, and for modes without a
+    factor, to driving. Home energy factors are kg CO2 per kWh.
+    """
+
+    def __init__(self, data: Dict):
+        self.version = str(data["version"])
+        self.default_region = data.get("default_region", "global")
+        transport = data["transport"]
+        if self.default_region not in transport:
+            raise ValueError(f"No transport factors for the default region {self.default_region!r}")
+        classes = {DEFAULT_CLASS}
+        for modes in transport.values():
+            for factor in modes.values():
+                if isinstance(factor, dict):
+                    classes.update(factor)
+        self._tables: Dict[Tuple[str, str], np.ndarray] = {
+            (region, vehicle_class): self._compile(transport, region, vehicle_class)
+            for region in transport for vehicle_class in classes
+        }
+        # Plain lists for scalar lookups, which are faster than indexing an array
+        self._lists = {key: table.tolist() for key, table in self._tables.items()}
+        energy = data.get("home_energy", {})
+        self._energy = {
+            region: {**energy.get(self.default_region, {}), **factors} for region, factors in energy.items()
+        }
+
+    @classmethod
+    def load(cls, path=EMISSION_FACTORS_FILE) -> "EmissionFactorRegistry":
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def _compile(self, transport: Dict, region: str, vehicle_class: str) -> np.ndarray:
+        def lookup(mode: str) -> Optional[float]:
+            for source in (transport[region], transport[self.default_region]):
+                factor = source.get(mode)
+                if isinstance(factor, dict):
+                    factor = factor.get(vehicle_class, factor.get(DEFAULT_CLASS))
+                if factor is not None:
+                    return float(factor)
+            return None
+
+        car = lookup("car")
+        if car is None:
+            raise ValueError(f"No car factor for region {region!r}")
+        table = np.empty(len(EmissionMode))
+        for mode in EmissionMode:
+            factor = lookup(mode.name.lower())
+            table[mode] = car if factor is None else factor
+        return table
+
+    def _key(self, region: Optional[str], vehicle_class: Optional[str]) -> Tuple[str, str]:
+        key = (region or settings.EMISSION_REGION, vehicle_class or DEFAULT_CLASS)
+        if key in self._tables:
+            return key
+        return (key[0] if (key[0], DEFAULT_CLASS) in self._tables else self.default_region,
+                key[1] if (self.default_region, key[1]) in self._tables else DEFAULT_CLASS)
+
+    def table(self, region: Optional[str] = None, vehicle_class: Optional[str] = None) -> np.ndarray:
+        """kg CO2 per km for each EmissionMode."""
+        return self._tables[self._key(region, vehicle_class)]
+
+    def factors(self, region: Optional[str] = None, vehicle_class: Optional[str] = None) -> List[float]:
+        """table() as a list, for scalar lookups."""
+        return self._lists[self._key(region, vehicle_class)]
+
+    def factor(self, mode: str, region: Optional[str] = None, vehicle_class: Optional[str] = None) -> float:
+        return self.factors(region, vehicle_class)[MODE_INDEX.get(mode, EmissionMode.CAR)]
+
+    def mode_codes(self, modes: Sequence[str]) -> np.ndarray:
+        """EmissionMode indexes for mode names; unknown modes count as driving."""
+        # Resolve each distinct name once, then map the rest without Python-level calls
+        codes = {mode: MODE_INDEX.get(mode, EmissionMode.CAR) for mode in dict.fromkeys(modes)}
+        return np.fromiter(map(codes.__getitem__, modes), np.intp, len(modes))
+
+    def calculate_many(self, distances: np.ndarray, modes: Union[Sequence[str], np.ndarray],
+                       region: Optional[str] = None, vehicle_class: Optional[str] = None) -> np.ndarray:
+        """Emissions for arrays of distances and modes (names or EmissionMode codes)."""
+        codes = modes if isinstance(modes, np.ndarray) and modes.dtype.kind in "iu" else self.mode_codes(modes)
+        return np.asarray(distances, dtype=float) * self.table(region, vehicle_class)[codes]
+
+    def savings(self, distance: float, mode: str, region: Optional[str] = None) -> float:
+        """Emissions avoided by covering `distance` in `mode` instead of driving."""
+        factors = self.factors(region)
+        return distance * (factors[EmissionMode.CAR] - factors[MODE_INDEX.get(mode, EmissionMode.CAR)])
+
+    def savings_many(self, distances: np.ndarray, modes: Union[Sequence[str], np.ndarray],
+                     region: Optional[str] = None) -> np.ndarray:
+        table = self.table(region)
+        codes = modes if isinstance(modes, np.ndarray) and modes.dtype.kind in "iu" else self.mode_codes(modes)
+        return np.asarray(distances, dtype=float) * (table[EmissionMode.CAR] - table[codes])
+
+    def energy_factor(self, energy_type: str, region: Optional[str] = None) -> float:
+        """kg CO2 per kWh; unknown energy types count as grid electricity."""
+        factors = self._energy.get(region or settings.EMISSION_REGION) or self._energy.get(self.default_region, {})
+        return factors.get(energy_type, factors.get("electricity", 0.0))
+
+
+emission_factors = EmissionFactorRegistry.load(settings.EMISSION_FACTORS_FILE or EMISSION_FACTORS_FILE)
+
+
 class CarbonCalculator:
-    @staticmethod
-    def calculate_transport_impact(distance: float, mode: str) -> float:
+    def __init__(self, registry: Optional[EmissionFactorRegistry] = None, region: Optional[str] = None,
+                 vehicle_class: Optional[str] = None):
+        self.registry = registry or emission_factors
+        self.region = region
+        self.vehicle_class = vehicle_class
+        self._factors = self.registry.factors(region, vehicle_class)
+
+    def calculate_transport_impact(self, distance: float, mode: str) -> float:
         """Calculate carbon impact for different transport modes."""
-        impact_factors = {
-            "car": 0.2,  # kg CO2 per km
-            "bus": 0.08,
-            "train": 0.04,
-            "bike": 0,
-            "walk": 0
-        }
-        return distance * impact_factors.get(mode, 0.2)
+        return distance * self._factors[MODE_INDEX.get(mode, EmissionMode.CAR)]
 
-    @staticmethod
-    def calculate_home_energy_impact(energy_kwh: float, energy_type: str) -> float:
+    def calculate_many(self, distances: np.ndarray, modes: Union[Sequence[str], np.ndarray]) -> np.ndarray:
+        """calculate_transport_impact over arrays, for batch paths."""
+        return self.registry.calculate_many(distances, modes, self.region, self.vehicle_class)
+
+    def calculate_home_energy_impact(self, energy_kwh: float, energy_type: str) -> float:
         """Calculate carbon impact for home energy use."""
-        impact_factors = {
-            "electricity": 0.5,  # kg CO2 per kWh
-            "natural_gas": 0.2,
-            "renewable": 0
-        }
-        return energy_kwh * impact_factors.get(energy_type, 0.5)
+        return energy_kwh * self.registry.energy_factor(energy_type, self.region)
@@ -1,5 +1,18 @@
-from typing import Dict, List, Any
-from dataclasses import dataclass
+from typing import Dict, Iterable, List, Any, Optional, Sequence
+from dataclasses import dataclass, field
+from pathlib import Path
+import json
+import numpy as np
+from sqlalchemy import Integer, case, cast, func
+from app.core.config import get_settings
+from app.services.carbon_calculator import emission_factors
+
+settings = get_settings()
+
+ACHIEVEMENTS_FILE = Path(__file__).resolve().parent.parent / "data" / "achievements.json"
+
+# Bonus points for eco-friendly transport; other modes score the base points
+POINT_MULTIPLIERS = {"WALKING": 2, "RUNNING": 2, "CYCLING": 1.5}
 
 @dataclass
 class Achievement:
@@ -8,6 +21,19 @@ class Achievement:
     description: str
     points: int
     icon: str
+    metric: str = ""
+    threshold: float = 0
+    bit: int = 0  # position in the earned bitset; never reuse one
+
+    def milestone(self) -> Dict:
+        """The milestone event update_user_stats returns for this achievement."""
+        return {
+            "id": self.id,
+            "amount": self.threshold,
+            "title": self.name,
+            "message": self.description,
+            "type": self.metric,
+        }
 
 @dataclass
 class OpportunityCost:
@@ -15,51 +41,134 @@ class OpportunityCost:
     trees_equivalent: float
     car_trips_avoided: float
 
-class GamificationService:
-    def __init__(self):
-        self.achievements = {
-            "distance_1": Achievement(
-                id="distance_1",
-                name="First Mile",
-                description="Travel your first mile with green transport",
-                points=100,
-                icon="🌱"
-            ),
-            "distance_10": Achievement(
-                id="distance_10",
-                name="Green Explorer",
-                description="Travel 10 miles with green transport",
-                points=500,
-                icon="🚲"
-            ),
-            "co2_saved_10": Achievement(
-                id="co2_saved_10",
-                name="Climate Champion",
-                description="Save 10kg of CO2 emissions",
-                points=1000,
-                icon="🌍"
-            )
+@dataclass
+class AchievementProgress:
+    """A user's earned achievements as a bitset.
+
+    `next` caches, per metric, the index of the lowest threshold not yet
+    earned; it is rebuilt from the bitset after unpickling so it never
+    outlives a change to the definitions.
+    """
+    earned: int = 0
+    next: Dict[str, int] = field(default_factory=dict)
+
+    def has(self, bit: int) -> bool:
+        return bool(self.earned >> bit & 1)
+
+    def bits(self) -> List[int]:
+        """Earned bits in ascending order, the form stored in User.achievements."""
+        bits = []
+        earned = self.earned
+        while earned:
+            lowest = earned & -earned
+            bits.append(lowest.bit_length() - 1)
+            earned ^= lowest
+        return bits
+
+    def __getstate__(self):
+        return {"earned": self.earned}
+
+    def __setstate__(self, state):
+        self.earned = state["earned"]
+        self.next = {}
+
+class AchievementEngine:
+    """Threshold achievements per metric, checked in sorted order.
+
+    Each metric's thresholds are sorted once. A user's progress remembers
+    the next unmet threshold per metric, so an update compares against one
+    threshold unless it crosses some, however many definitions there are.
+    """
+
+    def __init__(self, achievements: Iterable[Achievement]):
+        self.achievements: Dict[str, Achievement] = {}
+        self.by_bit: Dict[int, Achievement] = {}
+        for achievement in achievements:
+            if achievement.id in self.achievements or achievement.bit in self.by_bit:
+                raise ValueError(f"Duplicate achievement id or bit: {achievement.id} ({achievement.bit})")
+            self.achievements[achievement.id] = achievement
+            self.by_bit[achievement.bit] = achievement
+        self._ordered: Dict[str, List[Achievement]] = {}
+        for achievement in sorted(self.achievements.values(), key=lambda a: (a.threshold, a.bit)):
+            self._ordered.setdefault(achievement.metric, []).append(achievement)
+        self._thresholds = {
+            metric: [a.threshold for a in ordered] for metric, ordered in self._ordered.items()
         }
 
+    @classmethod
+    def load(cls, path=ACHIEVEMENTS_FILE) -> "AchievementEngine":
+        with open(path, encoding="utf-8") as f:
+            return cls(Achievement(**entry) for entry in json.load(f)["achievements"])
+
+    def progress(self, bits: Iterable[int] = ()) -> AchievementProgress:
+        """Progress from stored bits, e.g. User.achievements."""
+        return AchievementProgress(sum(1 << bit for bit in set(bits or ())))
+
+    def find(self, metric: str, threshold: float) -> Optional[Achievement]:
+        return next((a for a in self._ordered.get(metric, ()) if a.threshold == threshold), None)
+
+    def evaluate(self, progress: AchievementProgress, values: Dict[str, float]) -> List[Achievement]:
+        """Mark achievements whose thresholds `values` reach as earned; returns the new ones."""
+        new = []
+        earned = progress.earned
+        for metric, value in values.items():
+            thresholds = self._thresholds.get(metric)
+            if thresholds is None:
+                continue
+            ordered = self._ordered[metric]
+            i = progress.next.get(metric)
+            if i is None:
+                i = 0
+                while i < len(ordered) and earned >> ordered[i].bit & 1:
+                    i += 1
+            while i < len(thresholds) and thresholds[i] <= value:
+                bit = ordered[i].bit
+                # Definitions added later may sit below ones already earned
+                if not earned >> bit & 1:
+                    earned |= 1 << bit
+                    new.append(ordered[i])
+                i += 1
+            progress.next[metric] = i
+        progress.earned = earned
+        return new
+
+achievement_engine = AchievementEngine.load(settings.ACHIEVEMENTS_FILE or ACHIEVEMENTS_FILE)
+
+class GamificationService:
+    def __init__(self, engine: Optional[AchievementEngine] = None):
+        self.engine = engine or achievement_engine
+        self.achievements = self.engine.achievements
+
     def calculate_points(self, distance: float, duration: int, transport_mode: str) -> int:
         """Calculate points for an activity."""
         base_points = int(distance * 10)  # 10 points per meter
         
         # Bonus points for eco-friendly transport
-        if transport_mode in ["WALKING", "RUNNING"]:
-            base_points *= 2
-        elif transport_mode == "CYCLING":
-            base_points *= 1.5
+        multiplier = POINT_MULTIPLIERS.get(transport_mode)
+        if multiplier is not None:
+            base_points *= multiplier
             
         return base_points
 
+    def calculate_points_many(self, distances: np.ndarray, transport_modes: Sequence[str]) -> np.ndarray:
+        """calculate_points over arrays of activities, for recomputes."""
+        multipliers = np.fromiter(
+            (POINT_MULTIPLIERS.get(mode, 1) for mode in transport_modes), float, len(transport_modes)
+        )
+        return np.trunc(np.asarray(distances, dtype=float) * 10) * multipliers
+
+    def points_expression(self, distance, transport_mode):
+        """calculate_points as a SQL expression over activity columns, for rebuilds."""
+        base_points = cast(func.floor(func.coalesce(distance, 0) * 10), Integer)
+        return case(
+            *((transport_mode == mode, base_points * multiplier) for mode, multiplier in POINT_MULTIPLIERS.items()),
+            else_=base_points
+        )
+
     def calculate_opportunity_cost(self, distance: float, transport_mode: str) -> OpportunityCost:
         """Calculate environmental impact savings."""
-        # Average car CO2 emissions: 200g/km
-        car_emissions_per_km = 0.2
-        
         if transport_mode in ["WALKING", "RUNNING", "CYCLING"]:
-            co2_saved = distance * car_emissions_per_km
+            co2_saved = emission_factors.savings(distance, transport_mode)
         else:
             co2_saved = 0
             
@@ -69,20 +178,33 @@ class GamificationService:
             car_trips_avoided=distance / 5  # Average car trip is 5km
         )
 
-    def check_achievements(self, stats: Dict[str, float]) -> List[Achievement]:
-        """Check for new achievements based on user stats."""
-        new_achievements = []
-        
-        if stats["total_distance"] >= 1.6:  # 1 mile
-            new_achievements.append(self.achievements["distance_1"])
-            
-        if stats["total_distance"] >= 16:  # 10 miles
-            new_achievements.append(self.achievements["distance_10"])
-            
-        if stats["total_co2_saved"] >= 10:  # 10kg CO2
-            new_achievements.append(self.achievements["co2_saved_10"])
-            
-        return new_achievements
+    def check_achievements(self, stats: Dict[str, float],
+                           progress: Optional[AchievementProgress] = None) -> List[Achievement]:
+        """New achievements for total_distance (km) and total_co2_saved (kg).
+
+        Achievements already in `progress` are not returned again; it is
+        updated with the new ones.
+        """
+        return self.engine.evaluate(progress if progress is not None else AchievementProgress(), {
+            "total_distance_km": stats["total_distance"],
+            "total_co2_saved_kg": stats["total_co2_saved"],
+        })
+
+    def award_achievements(self, user, totals: Optional[Dict] = None) -> List[Achievement]:
+        """Record the achievements the user's totals have newly reached in User.achievements.
+
+        `totals` (total_distance, total_co2_saved) defaults to the values on `user`.
+        """
+        if totals is None:
+            totals = {"total_distance": user.total_distance, "total_co2_saved": user.total_co2_saved}
+        progress = self.engine.progress(user.achievements)
+        new = self.check_achievements({
+            "total_distance": (totals["total_distance"] or 0.0) / 1000,
+            "total_co2_saved": (totals["total_co2_saved"] or 0.0) / 1000,  # stored in grams
+        }, progress)
+        if new:
+            user.achievements = progress.bits()
+        return new
 
     def get_motivational_message(self, impact: OpportunityCost) -> str:
         """Generate a motivational message based on impact."""
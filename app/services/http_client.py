@@ -0,0 +1,90 @@
+from typing import Optional
+import asyncio
+import ssl
+import certifi
+import aiohttp
+from app.core.config import get_settings
+from app.core.metrics import metrics
+
+settings = get_settings()
+
+# Parsing the CA bundle is expensive, so it is done once per process
+ssl_context = ssl.create_default_context(cafile=certifi.where())
+
+
+async def _on_connection_create_end(session, ctx, params):
+    metrics.incr("http.connections_created")
+
+
+async def _on_connection_reuseconn(session, ctx, params):
+    metrics.incr("http.pool_hits")
+
+
+async def _on_request_start(session, ctx, params):
+    metrics.incr("http.requests")
+
+
+class HTTPClient:
+    """App-lifetime aiohttp session with keep-alive connection pooling.
+
+    `startup()` and `shutdown()` are wired into the FastAPI lifecycle in
+    `app.main`. The session is also created lazily on first use so that
+    scripts and serverless invocations without startup hooks still work.
+    """
+
+    def __init__(self):
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._lock = asyncio.Lock()
+
+    async def startup(self):
+        await self.get_session()
+
+    async def get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            async with self._lock:
+                if self._session is None or self._session.closed:
+                    self._session = self._create_session()
+        return self._session
+
+    def _create_session(self) -> aiohttp.ClientSession:
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_connection_create_end.append(_on_connection_create_end)
+        trace_config.on_connection_reuseconn.append(_on_connection_reuseconn)
+        trace_config.on_request_start.append(_on_request_start)
+
+        connector = aiohttp.TCPConnector(
+            ssl=ssl_context,
+            limit=settings.HTTP_POOL_LIMIT,
+            limit_per_host=settings.HTTP_POOL_LIMIT_PER_HOST,
+            keepalive_timeout=settings.HTTP_KEEPALIVE_TIMEOUT,
+            ttl_dns_cache=300,
+        )
+        timeout = aiohttp.ClientTimeout(
+            total=settings.HTTP_TOTAL_TIMEOUT,
+            sock_connect=settings.HTTP_CONNECT_TIMEOUT,
+        )
+        return aiohttp.ClientSession(
+            connector=connector,
+            timeout=timeout,
+            trace_configs=[trace_config],
+        )
+
+    async def shutdown(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    def stats(self) -> dict:
+        created = metrics.counter("http.connections_created")
+        reused = metrics.counter("http.pool_hits")
+        total = created + reused
+        return {
+            "requests": metrics.counter("http.requests"),
+            "connections_created": created,
+            "pool_hits": reused,
+            "reuse_ratio": (reused / total) if total else 0.0,
+        }
+
+
+http_client = HTTPClient()
+metrics.gauge("http", http_client.stats)
@@ -0,0 +1,157 @@
+from typing import Dict, Iterable, Optional, Sequence, Tuple
+from collections import defaultdict
+from datetime import date, timedelta
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.metrics import metrics
+from app.models.activity import Activity
+from app.models.daily_rollup import DailyRollup
+from app.services.gamification import GamificationService
+
+TOTAL_FIELDS = ("distance", "duration", "carbon_impact", "trip_count", "points")
+
+PERIOD_TITLES = {
+    "daily": "Today's Impact",
+    "weekly": "This Week's Impact",
+    "monthly": "This Month's Impact",
+}
+
+
+def period_bounds(period: str, today: date) -> Tuple[date, date]:
+    """First and last day (inclusive) of the daily, weekly or monthly period containing today."""
+    if period == "daily":
+        return today, today
+    if period == "weekly":
+        return today - timedelta(days=today.weekday()), today
+    if period == "monthly":
+        return today.replace(day=1), today
+    raise ValueError(f"Unknown period: {period}")
+
+
+def rebuild_statements(user_id: Optional[int] = None, user_ids: Optional[Sequence[int]] = None):
+    """DELETE and INSERT ... SELECT that regenerate rollups from Activity,
+    for everyone or only the given user(s)."""
+    day = func.date(Activity.start_time)
+    source = select(
+        Activity.user_id,
+        day,
+        Activity.activity_type,
+        func.coalesce(func.sum(Activity.distance), 0.0),
+        func.coalesce(func.sum(Activity.duration), 0),
+        func.coalesce(func.sum(Activity.carbon_impact), 0.0),
+        func.count(),
+        func.coalesce(func.sum(
+            GamificationService().points_expression(Activity.distance, Activity.activity_type)
+        ), 0.0),
+    ).where(Activity.start_time.is_not(None)).group_by(Activity.user_id, day, Activity.activity_type)
+    clear = delete(DailyRollup)
+    if user_id is not None:
+        source = source.where(Activity.user_id == user_id)
+        clear = clear.where(DailyRollup.user_id == user_id)
+    if user_ids is not None:
+        source = source.where(Activity.user_id.in_(user_ids))
+        clear = clear.where(DailyRollup.user_id.in_(user_ids))
+    fill = insert(DailyRollup).from_select(
+        ["user_id", "day", "activity_type", *TOTAL_FIELDS], source
+    )
+    return clear, fill
+
+
+def _upsert(dialect: str):
+    """INSERT that adds onto an existing row, or None if the dialect has no upsert."""
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    else:
+        return None
+    statement = dialect_insert(DailyRollup)
+    return statement.on_conflict_do_update(
+        index_elements=[DailyRollup.user_id, DailyRollup.day, DailyRollup.activity_type],
+        set_={
+            field: getattr(DailyRollup, field) + getattr(statement.excluded, field)
+            for field in TOTAL_FIELDS
+        },
+    )
+
+
+class ImpactRollupService:
+    """Maintains DailyRollup rows and answers impact reports from them."""
+
+    async def record(self, db: AsyncSession, activities: Iterable[Dict]):
+        """Add activities, given as Activity column values plus their awarded
+        "points", to their daily rollups.
+
+        Runs in the caller's transaction so rollups commit or roll back
+        together with the activities themselves.
+        """
+        totals: Dict[tuple, Dict] = {}
+        for activity in activities:
+            key = (activity["user_id"], activity["start_time"].date(), activity["activity_type"])
+            row = totals.get(key)
+            if row is None:
+                row = totals[key] = dict.fromkeys(TOTAL_FIELDS, 0)
+            row["distance"] += activity["distance"] or 0.0
+            row["duration"] += activity["duration"] or 0
+            row["carbon_impact"] += activity["carbon_impact"] or 0.0
+            row["trip_count"] += 1
+            row["points"] += activity.get("points", 0)
+        if not totals:
+            return
+
+        upsert = _upsert(db.bind.dialect.name)
+        if upsert is not None:
+            await db.execute(upsert, [
+                {"user_id": user_id, "day": day, "activity_type": mode, **row}
+                for (user_id, day, mode), row in totals.items()
+            ])
+        else:
+            for key, row in totals.items():
+                rollup = await db.get(DailyRollup, key)
+                if rollup is None:
+                    db.add(DailyRollup(user_id=key[0], day=key[1], activity_type=key[2], **row))
+                else:
+                    for field in TOTAL_FIELDS:
+                        setattr(rollup, field, getattr(rollup, field) + row[field])
+        metrics.incr("rollups.recorded", sum(row["trip_count"] for row in totals.values()))
+
+    async def report(self, db: AsyncSession, user_id: int, start: date, end: date) -> Dict:
+        """Totals, per-mode totals and per-day totals for start..end inclusive.
+
+        carbon_impact is reported in kg; rollups store it in grams like Activity.
+        """
+        rows = await db.execute(
+            select(DailyRollup).where(
+                DailyRollup.user_id == user_id,
+                DailyRollup.day >= start,
+                DailyRollup.day <= end
+            ).order_by(DailyRollup.day)
+        )
+        totals = dict.fromkeys(TOTAL_FIELDS, 0)
+        by_mode = defaultdict(lambda: dict.fromkeys(TOTAL_FIELDS, 0))
+        by_day = defaultdict(lambda: dict.fromkeys(TOTAL_FIELDS, 0))
+        for rollup in rows.scalars():
+            for field in TOTAL_FIELDS:
+                value = getattr(rollup, field)
+                totals[field] += value
+                by_mode[rollup.activity_type][field] += value
+                by_day[rollup.day.isoformat()][field] += value
+        for values in (totals, *by_mode.values(), *by_day.values()):
+            values["carbon_impact"] /= 1000
+        return {
+            "start": start.isoformat(),
+            "end": end.isoformat(),
+            "totals": totals,
+            "by_mode": dict(by_mode),
+            "days": [{"day": day, **values} for day, values in by_day.items()],
+        }
+
+    async def rebuild(self, db: AsyncSession, user_id: Optional[int] = None):
+        """Regenerate rollups from Activity for one user, or everyone."""
+        clear, fill = rebuild_statements(user_id)
+        await db.execute(clear)
+        await db.execute(fill)
+        await db.commit()
+
+
+impact_rollups = ImpactRollupService()
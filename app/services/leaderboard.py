@@ -0,0 +1,305 @@
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from datetime import date, datetime, timedelta
+import time
+from sortedcontainers import SortedList
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import get_settings
+from app.core.metrics import metrics
+from app.db.session import AsyncSessionLocal
+from app.models.daily_rollup import DailyRollup
+from app.models.user import User
+
+settings = get_settings()
+
+# Leaderboard metric -> (User total column, DailyRollup column)
+METRICS = {
+    "points": (User.points, DailyRollup.points),
+    "co2": (User.total_co2_saved, DailyRollup.carbon_impact),
+    "distance": (User.total_distance, DailyRollup.distance),
+}
+
+LOAD_BATCH = 10000
+
+
+def week_key(day: date) -> str:
+    year, week, _ = day.isocalendar()
+    return f"{year}-W{week:02d}"
+
+
+class MemoryLeaderboardStore:
+    """Sorted in-process boards; O(log n) updates, rank lookups and page seeks.
+
+    Each board keeps member -> score plus a SortedList of integer keys that
+    order members by score descending, then member id ascending. Scores are
+    compared at SCALE precision, which keeps keys to one int per member.
+    Boards live in this process only; run one app process or use the Redis
+    store when scaling out.
+    """
+
+    SCALE = 1000
+    MEMBER_BITS = 32
+
+    def __init__(self):
+        self._scores: Dict[str, Dict[int, float]] = {}
+        self._index: Dict[str, SortedList] = {}
+
+    def _key(self, member: int, score: float) -> int:
+        return (-round(score * self.SCALE) << self.MEMBER_BITS) + member
+
+    def _member(self, key: int) -> int:
+        return key & ((1 << self.MEMBER_BITS) - 1)
+
+    def _board(self, board: str) -> Tuple[Dict[int, float], SortedList]:
+        if board not in self._scores:
+            self._scores[board] = {}
+            self._index[board] = SortedList()
+        return self._scores[board], self._index[board]
+
+    async def load(self, board: str, items: Iterable[Tuple[int, float]]):
+        """Set many scores at once; much faster than one update per member."""
+        scores, index = self._board(board)
+        scores.update(items)
+        self._index[board] = SortedList(self._key(member, score) for member, score in scores.items())
+
+    async def incr(self, board: str, member: int, delta: float) -> float:
+        scores, index = self._board(board)
+        old = scores.get(member)
+        if old is not None:
+            index.remove(self._key(member, old))
+        score = (old or 0.0) + delta
+        scores[member] = score
+        index.add(self._key(member, score))
+        return score
+
+    async def remove(self, board: str, member: int):
+        scores, index = self._board(board)
+        old = scores.pop(member, None)
+        if old is not None:
+            index.remove(self._key(member, old))
+
+    async def rank(self, board: str, member: int) -> Optional[Tuple[int, float]]:
+        """(0-based rank, score), or None if the member is not on the board."""
+        scores, index = self._board(board)
+        score = scores.get(member)
+        if score is None:
+            return None
+        return index.index(self._key(member, score)), score
+
+    async def top(self, board: str, offset: int, limit: int) -> List[Tuple[int, float]]:
+        scores, index = self._board(board)
+        return [
+            (member, scores[member])
+            for member in map(self._member, index.islice(offset, offset + limit))
+        ]
+
+    async def scores(self, board: str, members: List[int]) -> Dict[int, float]:
+        scores, _ = self._board(board)
+        return {member: scores[member] for member in members if member in scores}
+
+    async def count(self, board: str) -> int:
+        return len(self._board(board)[0])
+
+    async def drop(self, board: str):
+        self._scores.pop(board, None)
+        self._index.pop(board, None)
+
+
+class RedisLeaderboardStore:
+    """The same boards as sorted sets in Redis, shared by every app process.
+
+    Works with any server speaking the Redis protocol (Redis, Valkey,
+    KeyDB, a local redis-server for development).
+    """
+
+    def __init__(self, url: str = settings.LEADERBOARD_REDIS_URL, prefix: str = "leaderboard:"):
+        import redis.asyncio as redis
+
+        self.redis = redis.from_url(url)
+        self.prefix = prefix
+
+    async def load(self, board: str, items: Iterable[Tuple[int, float]]):
+        mapping = {}
+        for member, score in items:
+            mapping[member] = score
+            if len(mapping) >= LOAD_BATCH:
+                await self.redis.zadd(self.prefix + board, mapping)
+                mapping = {}
+        if mapping:
+            await self.redis.zadd(self.prefix + board, mapping)
+
+    async def incr(self, board: str, member: int, delta: float) -> float:
+        return await self.redis.zincrby(self.prefix + board, delta, member)
+
+    async def remove(self, board: str, member: int):
+        await self.redis.zrem(self.prefix + board, member)
+
+    async def rank(self, board: str, member: int) -> Optional[Tuple[int, float]]:
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.zrevrank(self.prefix + board, member)
+            pipe.zscore(self.prefix + board, member)
+            rank, score = await pipe.execute()
+        return None if rank is None else (rank, score)
+
+    async def top(self, board: str, offset: int, limit: int) -> List[Tuple[int, float]]:
+        rows = await self.redis.zrevrange(self.prefix + board, offset, offset + limit - 1, withscores=True)
+        return [(int(member), score) for member, score in rows]
+
+    async def scores(self, board: str, members: List[int]) -> Dict[int, float]:
+        if not members:
+            return {}
+        values = await self.redis.zmscore(self.prefix + board, members)
+        return {member: score for member, score in zip(members, values) if score is not None}
+
+    async def count(self, board: str) -> int:
+        return await self.redis.zcard(self.prefix + board)
+
+    async def drop(self, board: str):
+        await self.redis.delete(self.prefix + board)
+
+
+def create_store(backend: str = settings.LEADERBOARD_BACKEND):
+    if backend == "redis":
+        return RedisLeaderboardStore()
+    if backend == "memory":
+        return MemoryLeaderboardStore()
+    raise ValueError(f"Unknown leaderboard backend: {backend}")
+
+
+class LeaderboardService:
+    """Global, weekly and friends leaderboards on points, CO2 saved and distance.
+
+    Boards are loaded once at startup from User totals and this week's
+    DailyRollup rows, then kept current by `record` whenever ingest awards
+    points, so requests never sort the users table.
+    """
+
+    def __init__(
+        self,
+        store=None,
+        session_factory: Callable[[], AsyncSession] = AsyncSessionLocal,
+        clock: Callable[[], datetime] = datetime.utcnow,
+    ):
+        self.store = store or create_store()
+        self.session_factory = session_factory
+        self.clock = clock
+        self._week: Optional[str] = None
+
+    def _board(self, scope: str, metric: str) -> str:
+        if scope == "weekly":
+            return f"weekly:{self._current_week()}:{metric}"
+        return f"global:{metric}"
+
+    def _current_week(self) -> str:
+        return week_key(self.clock().date())
+
+    async def _roll_week(self):
+        """Drop last week's boards once the week changes."""
+        week = self._current_week()
+        if self._week is not None and self._week != week:
+            for metric in METRICS:
+                await self.store.drop(f"weekly:{self._week}:{metric}")
+        self._week = week
+
+    async def startup(self):
+        # A shared store that already holds a board is kept as is
+        await self._load_boards(replace=False)
+
+    async def rebuild(self):
+        """Reload every board from the database, e.g. after a score recompute rewrote the totals."""
+        await self._load_boards(replace=True)
+
+    async def _load_boards(self, replace: bool):
+        await self._roll_week()
+        started = time.perf_counter()
+        monday = self.clock().date() - timedelta(days=self.clock().date().weekday())
+        async with self.session_factory() as db:
+            for metric, (user_column, rollup_column) in METRICS.items():
+                await self._load(db, self._board("global", metric), replace,
+                                 select(User.id, user_column).where(user_column > 0))
+                await self._load(db, self._board("weekly", metric), replace, select(
+                    DailyRollup.user_id, func.sum(rollup_column)
+                ).where(DailyRollup.day >= monday).group_by(DailyRollup.user_id))
+        metrics.observe("leaderboard.load", time.perf_counter() - started)
+
+    async def _load(self, db: AsyncSession, board: str, replace: bool, query):
+        if replace:
+            await self.store.drop(board)
+        elif await self.store.count(board):
+            return
+        result = await db.stream(query.execution_options(yield_per=LOAD_BATCH))
+        items = []
+        async for member, score in result:
+            if score:
+                items.append((member, float(score)))
+        await self.store.load(board, items)
+
+    async def record(self, user_id: int, activities: Iterable[Dict]):
+        """Apply newly awarded activities, given as Activity column values plus "points"."""
+        await self._roll_week()
+        week = self._week
+        totals = {metric: 0.0 for metric in METRICS}
+        weekly = {metric: 0.0 for metric in METRICS}
+        for activity in activities:
+            values = {
+                "points": activity.get("points", 0),
+                "co2": activity["carbon_impact"] or 0.0,
+                "distance": activity["distance"] or 0.0,
+            }
+            in_week = week_key(activity["start_time"].date()) == week
+            for metric, value in values.items():
+                totals[metric] += value
+                if in_week:
+                    weekly[metric] += value
+        for metric in METRICS:
+            if totals[metric]:
+                await self.store.incr(self._board("global", metric), user_id, totals[metric])
+            if weekly[metric]:
+                await self.store.incr(self._board("weekly", metric), user_id, weekly[metric])
+        metrics.incr("leaderboard.updates")
+
+    async def reset_user(self, user_id: int):
+        await self._roll_week()
+        for metric in METRICS:
+            await self.store.remove(self._board("global", metric), user_id)
+            await self.store.remove(self._board("weekly", metric), user_id)
+
+    async def page(self, scope: str, metric: str, offset: int = 0, limit: int = 50) -> List[Dict]:
+        await self._roll_week()
+        entries = await self.store.top(self._board(scope, metric), offset, limit)
+        return [
+            {"rank": offset + i + 1, "user_id": member, "score": score}
+            for i, (member, score) in enumerate(entries)
+        ]
+
+    async def rank(self, scope: str, metric: str, user_id: int) -> Dict:
+        """The user's 1-based rank and score, with rank None when they have no score yet."""
+        await self._roll_week()
+        board = self._board(scope, metric)
+        found = await self.store.rank(board, user_id)
+        return {
+            "rank": found[0] + 1 if found else None,
+            "score": found[1] if found else 0.0,
+            "total": await self.store.count(board),
+        }
+
+    async def friends(self, metric: str, user_id: int, friend_ids: List[int], scope: str = "global") -> List[Dict]:
+        """Rank the user among their friends by looking up each score."""
+        await self._roll_week()
+        members = [user_id, *friend_ids]
+        scores = await self.store.scores(self._board(scope, metric), members)
+        ordered = sorted(members, key=lambda member: (-scores.get(member, 0.0), member))
+        return [
+            {"rank": i + 1, "user_id": member, "score": scores.get(member, 0.0)}
+            for i, member in enumerate(ordered)
+        ]
+
+    async def stats(self) -> Dict:
+        return {
+            board: await self.store.count(board)
+            for board in (self._board(scope, "points") for scope in ("global", "weekly"))
+        }
+
+
+leaderboard = LeaderboardService()
+metrics.gauge("leaderboard", leaderboard.stats)
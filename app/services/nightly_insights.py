@@ -0,0 +1,158 @@
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from datetime import datetime, timedelta
+import asyncio
+import json
+import time
+import numpy as np
+from sqlalchemy import delete, func, insert, or_, select
+from app.core.config import get_settings
+from app.core.metrics import metrics
+from app.db.session import AsyncSessionLocal
+from app.models.activity import Activity
+from app.models.user_insight import UserInsight
+from app.services.ai_analyzer import AIAnalyzer, ai_analyzer
+
+settings = get_settings()
+
+WEEK = timedelta(weeks=1)
+
+
+def candidates_query():
+    """Users whose activities changed since their stored insights, with their activity count and last id."""
+    activity = select(
+        Activity.user_id,
+        func.count().label("activity_count"),
+        func.max(Activity.id).label("last_activity_id"),
+    ).where(Activity.user_id.is_not(None)).group_by(Activity.user_id).subquery()
+    return select(activity).outerjoin(UserInsight, UserInsight.user_id == activity.c.user_id).where(or_(
+        UserInsight.user_id.is_(None),
+        UserInsight.activity_count != activity.c.activity_count,
+        UserInsight.last_activity_id != activity.c.last_activity_id,
+    )).order_by(activity.c.user_id)
+
+
+def trips_query(user_ids: Sequence[int], since: datetime):
+    return select(
+        Activity.user_id, Activity.activity_type, Activity.start_time, Activity.distance, Activity.carbon_impact
+    ).where(Activity.user_id.in_(user_ids), Activity.start_time >= since)
+
+
+def trip_features(trips: Sequence[Tuple[str, datetime, float, float]], now: datetime, weeks: int) -> Dict:
+    """Compact summary of one user's trips in the `weeks` weeks before `now`.
+
+    `trips` are (activity_type, start_time, distance in m, carbon_impact)
+    rows. Weekly series run oldest first; the trend is the least-squares
+    slope of CO2 saved per week, and the projection is the weekly mean
+    over a year.
+    """
+    modes: Dict[str, List[float]] = {}  # mode -> [trips, km, kg CO2 saved]
+    weekly_km = np.zeros(weeks)
+    weekly_co2 = np.zeros(weeks)
+    for mode, start_time, distance, co2 in trips:
+        week = weeks - 1 - int((now - start_time) / WEEK)
+        if not 0 <= week < weeks:
+            continue
+        km = (distance or 0.0) / 1000
+        kg = (co2 or 0.0) / 1000
+        mix = modes.setdefault(mode or "UNKNOWN", [0, 0.0, 0.0])
+        mix[0] += 1
+        mix[1] += km
+        mix[2] += kg
+        weekly_km[week] += km
+        weekly_co2[week] += kg
+    trend = np.polyfit(np.arange(weeks), weekly_co2, 1)[0] if weeks > 1 else 0.0
+    return {
+        "weeks": weeks,
+        "modes": {
+            mode: {"trips": trips, "km": round(km, 1), "co2_kg": round(kg, 2)}
+            for mode, (trips, km, kg) in modes.items()
+        },
+        "weekly_km": [round(km, 1) for km in weekly_km.tolist()],
+        "weekly_co2_kg": [round(kg, 2) for kg in weekly_co2.tolist()],
+        "trend_kg_per_week": round(float(trend), 2),
+        "projected_annual_co2_kg": round(float(weekly_co2.mean()) * 52, 1),
+    }
+
+
+def parse_insights(answer: str) -> Any:
+    """The model's JSON answer, or the raw text under "text" if it is not JSON."""
+    try:
+        return json.loads(answer)
+    except ValueError:
+        return {"text": answer}
+
+
+class InsightsBatch:
+    """Precomputes AI insights for the users whose activities changed.
+
+    One grouped query compares every user's activity count and last
+    activity id with those their stored insights were built from; other
+    users are skipped without reading their trips. Candidates are taken
+    `chunk_size` at a time: one query loads the chunk's recent trips, at
+    most `concurrency` users are analyzed at once, and the chunk's results
+    replace the old rows in one transaction. A user whose analysis fails
+    keeps the previous insights and is retried on the next run.
+    """
+
+    def __init__(self, analyzer: Optional[AIAnalyzer] = None, session_factory=AsyncSessionLocal,
+                 weeks: int = settings.INSIGHTS_WEEKS, concurrency: int = settings.INSIGHTS_CONCURRENCY,
+                 chunk_size: int = settings.INSIGHTS_CHUNK_SIZE, clock=datetime.utcnow):
+        self.analyzer = analyzer or ai_analyzer
+        self.session_factory = session_factory
+        self.weeks = weeks
+        self.concurrency = concurrency
+        self.chunk_size = chunk_size
+        self.clock = clock
+
+    async def run(self) -> Dict[str, int]:
+        """Process every candidate; returns counts of what happened to them."""
+        now = self.clock()
+        async with self.session_factory() as db:
+            candidates = (await db.execute(candidates_query())).all()
+        stats = {"candidates": len(candidates), "analyzed": 0, "no_recent_trips": 0, "failed": 0}
+        slots = asyncio.Semaphore(self.concurrency)
+        for offset in range(0, len(candidates), self.chunk_size):
+            await self._run_chunk(candidates[offset:offset + self.chunk_size], now, slots, stats)
+        return stats
+
+    async def _run_chunk(self, chunk: List, now: datetime, slots: asyncio.Semaphore, stats: Dict[str, int]):
+        async with self.session_factory() as db:
+            rows = (await db.execute(trips_query([c.user_id for c in chunk], now - self.weeks * WEEK))).all()
+        trips: Dict[int, List[Tuple]] = {}
+        for user_id, *trip in rows:
+            trips.setdefault(user_id, []).append(trip)
+
+        async def analyze(candidate) -> Optional[Dict]:
+            features = trip_features(trips.get(candidate.user_id, []), now, self.weeks)
+            insights = None
+            if not features["modes"]:
+                stats["no_recent_trips"] += 1
+            else:
+                async with slots:
+                    started = time.perf_counter()
+                    try:
+                        insights = parse_insights(await self.analyzer.analyze_features(features))
+                    except Exception as e:
+                        stats["failed"] += 1
+                        metrics.incr("insights.failed")
+                        print(f"Insights for user {candidate.user_id} failed: {e}")
+                        return None
+                    finally:
+                        metrics.observe("insights.analyze", time.perf_counter() - started)
+                stats["analyzed"] += 1
+            return {
+                "user_id": candidate.user_id,
+                "activity_count": candidate.activity_count,
+                "last_activity_id": candidate.last_activity_id,
+                "features": features,
+                "insights": insights,
+                "generated_at": now,
+            }
+
+        results = [result for result in await asyncio.gather(*map(analyze, chunk)) if result is not None]
+        if not results:
+            return
+        async with self.session_factory() as db:
+            await db.execute(delete(UserInsight).where(UserInsight.user_id.in_([r["user_id"] for r in results])))
+            await db.execute(insert(UserInsight), results)
+            await db.commit()
@@ -0,0 +1,60 @@
+"""Google encoded polyline format.
+
+Coordinates are rounded to `precision` decimal places (5, about 1 m, is
+what Google and Strava use), delta-encoded and written as printable ASCII,
+typically 4-6 bytes per point instead of 16 for two doubles.
+"""
+from typing import List, Sequence, Tuple
+import math
+
+
+def _round(value: float) -> int:
+    # Half away from zero, as the reference implementation does
+    return int(math.floor(abs(value) + 0.5)) * (1 if value >= 0 else -1)
+
+
+def _encode_value(value: int, out: List[str]):
+    value = ~(value << 1) if value < 0 else value << 1
+    while value >= 0x20:
+        out.append(chr((0x20 | (value & 0x1f)) + 63))
+        value >>= 5
+    out.append(chr(value + 63))
+
+
+def encode(lats: Sequence[float], lngs: Sequence[float], precision: int = 5) -> str:
+    factor = 10 ** precision
+    out: List[str] = []
+    prev_lat = prev_lng = 0
+    for lat, lng in zip(lats, lngs):
+        lat, lng = _round(lat * factor), _round(lng * factor)
+        _encode_value(lat - prev_lat, out)
+        _encode_value(lng - prev_lng, out)
+        prev_lat, prev_lng = lat, lng
+    return "".join(out)
+
+
+def decode(encoded: str, precision: int = 5) -> Tuple[List[float], List[float]]:
+    """Return (lats, lngs)."""
+    factor = 10 ** precision
+    lats: List[float] = []
+    lngs: List[float] = []
+    index = lat = lng = 0
+    length = len(encoded)
+    while index < length:
+        for is_lng in (False, True):
+            shift = result = 0
+            while True:
+                byte = ord(encoded[index]) - 63
+                index += 1
+                result |= (byte & 0x1f) << shift
+                shift += 5
+                if byte < 0x20:
+                    break
+            delta = ~(result >> 1) if result & 1 else result >> 1
+            if is_lng:
+                lng += delta
+                lngs.append(lng / factor)
+            else:
+                lat += delta
+                lats.append(lat / factor)
+    return lats, lngs
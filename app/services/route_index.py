@@ -0,0 +1,121 @@
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from dataclasses import dataclass, field
+import math
+
+METERS_PER_DEGREE = 6371000 * math.pi / 180
+# Trips starting and ending within this many meters share a route
+MATCH_RADIUS_M = 100
+
+
+@dataclass
+class RouteCluster:
+    """Trips that start and end near the same points, anchored at the first one."""
+    start_lat: float
+    start_lng: float
+    end_lat: float
+    end_lng: float
+    end_location: Dict
+    avg_distance: float
+    frequency: int = 0
+    mode_counts: Dict[str, int] = field(default_factory=dict)
+    common_hours: Set[int] = field(default_factory=set)
+
+    @property
+    def common_mode(self) -> str:
+        return max(self.mode_counts, key=self.mode_counts.get)
+
+    def add(self, distance: float, mode: str, hour: int):
+        self.frequency += 1
+        self.avg_distance += (distance - self.avg_distance) / self.frequency
+        self.mode_counts[mode] = self.mode_counts.get(mode, 0) + 1
+        self.common_hours.add(hour)
+
+
+def distance_m(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    """Equirectangular distance; within a few mm of Haversine at these radii."""
+    # Shortest way round, also across the antimeridian
+    x = ((lng2 - lng1 + 180) % 360 - 180) * math.cos(math.radians((lat1 + lat2) / 2))
+    return METERS_PER_DEGREE * math.hypot(x, lat2 - lat1)
+
+
+class RouteIndex:
+    """Route clusters indexed by a grid of start-point cells.
+
+    Rows are `radius` meters tall and cells in a row `radius` meters wide at
+    the row's latitude, keyed by (row, column); columns count east from
+    -180 degrees and wrap around at the antimeridian. A start point within
+    `radius` of a query lies in one of the three rows around it, so a
+    lookup reads a handful of cells instead of every route.
+    """
+
+    def __init__(self, radius: float = MATCH_RADIUS_M):
+        self.radius = radius
+        self._lat_step = radius / METERS_PER_DEGREE
+        self._cells: Dict[Tuple[int, int], List[RouteCluster]] = {}
+        self._count = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _row(self, lat: float) -> int:
+        return math.floor((lat + 90) / self._lat_step)
+
+    def _lng_step(self, row: int) -> float:
+        lat = (row + 0.5) * self._lat_step - 90
+        return self._lat_step / max(math.cos(math.radians(lat)), 1e-6)
+
+    @staticmethod
+    def _cols(step: float, west: float, east: float) -> Iterable[int]:
+        """Columns of a row with cells `step` degrees wide covering west..east,
+        given in degrees east of -180 and possibly past either end."""
+        last_col = math.ceil(360 / step) - 1
+        if east - west >= 360:
+            return range(last_col + 1)
+        if west < 0:
+            spans = [(west + 360, 360), (0, east)]
+        elif east >= 360:
+            spans = [(west, 360), (0, east - 360)]
+        else:
+            spans = [(west, east)]
+        cols = set()
+        for low, high in spans:
+            cols.update(range(math.floor(low / step), min(math.floor(high / step), last_col) + 1))
+        return cols
+
+    def _col(self, row: int, lng: float) -> int:
+        step = self._lng_step(row)
+        return min(math.floor(((lng + 180) % 360) / step), math.ceil(360 / step) - 1)
+
+    def nearby(self, lat: float, lng: float) -> List[RouteCluster]:
+        """Clusters whose start point is within `radius` of (lat, lng)."""
+        row = self._row(lat)
+        # Widest longitude span of the circle, at its edge nearest a pole
+        edge = min(abs(lat) + self._lat_step, 90)
+        lng_span = self._lat_step / max(math.cos(math.radians(edge)), 1e-6)
+        found = []
+        for r in (row - 1, row, row + 1):
+            for col in self._cols(self._lng_step(r), lng - lng_span + 180, lng + lng_span + 180):
+                for cluster in self._cells.get((r, col), ()):
+                    if distance_m(lat, lng, cluster.start_lat, cluster.start_lng) <= self.radius:
+                        found.append(cluster)
+        return found
+
+    def add_trip(self, start_lat: float, start_lng: float, end_lat: float, end_lng: float,
+                 end_location: Dict, distance: float, mode: str, hour: int) -> RouteCluster:
+        """Count a trip towards the nearest matching cluster, creating one if none matches."""
+        best: Optional[RouteCluster] = None
+        best_distance = math.inf
+        for cluster in self.nearby(start_lat, start_lng):
+            end_distance = distance_m(end_lat, end_lng, cluster.end_lat, cluster.end_lng)
+            if end_distance > self.radius:
+                continue
+            total = distance_m(start_lat, start_lng, cluster.start_lat, cluster.start_lng) + end_distance
+            if total < best_distance:
+                best, best_distance = cluster, total
+        if best is None:
+            best = RouteCluster(start_lat, start_lng, end_lat, end_lng, end_location, distance)
+            row = self._row(start_lat)
+            self._cells.setdefault((row, self._col(row, start_lng)), []).append(best)
+            self._count += 1
+        best.add(distance, mode, hour)
+        return best
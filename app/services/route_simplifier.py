@@ -0,0 +1,110 @@
+from typing import List
+import math
+import numpy as np
+from app.core.config import get_settings
+
+settings = get_settings()
+
+METERS_PER_DEGREE = 6371000 * math.pi / 180
+# Fixes examined per vectorized step: windows start small after each kept
+# point and double while the segment continues
+MIN_CHUNK = 8
+CHUNK = 256
+
+
+class RouteSimplifier:
+    """Streaming line simplification with a tolerance in meters.
+
+    Uses the cone-intersection (sleeve) method: from the last kept point,
+    every fix farther than `radius` narrows the range of directions a
+    segment may take while passing within `radius` of it. A fix outside
+    that range, back inside the radius, or doubling back by more than
+    `radius` ends the segment and its predecessor is kept. With `radius`
+    at tolerance / sqrt(2), sideways and overshoot errors together keep
+    every dropped fix within `tolerance` of its segment. Each fix is
+    examined once, so routes simplify as fixes arrive instead of after
+    the trip ends.
+
+    Call `update` with the growing lat/lng columns; only fixes added since
+    the previous call are read, in vectorized chunks.
+    """
+
+    def __init__(self, tolerance: float = settings.ROUTE_SIMPLIFY_TOLERANCE_M):
+        self.tolerance = tolerance
+        self.radius = tolerance / math.sqrt(2)
+        self.kept: List[int] = [0]
+        self.cursor = 1  # next fix to examine
+        self._chunk = MIN_CHUNK
+        self._reset()
+
+    def _reset(self):
+        self._ref = None  # direction of the first fix outside the radius
+        self._lower = -math.inf
+        self._upper = math.inf
+        self._max_distance = 0.0
+
+    def update(self, lats, lngs):
+        """Examine fixes from the cursor to the end of lats/lngs."""
+        lats = np.asarray(lats, dtype=np.float64)
+        lngs = np.asarray(lngs, dtype=np.float64)
+        end = len(lats)
+        radius = self.radius
+        while self.cursor < end:
+            anchor = self.kept[-1]
+            window = slice(self.cursor, min(end, self.cursor + self._chunk))
+            ky = METERS_PER_DEGREE
+            kx = METERS_PER_DEGREE * math.cos(math.radians(lats[anchor]))
+            x = (lngs[window] - lngs[anchor]) * kx
+            y = (lats[window] - lats[anchor]) * ky
+            distance = np.hypot(x, y)
+            angle = np.arctan2(y, x)
+            outside = distance > radius
+
+            left_before = self._ref is not None
+            if self._ref is None:
+                first = np.flatnonzero(outside)
+                if not len(first):
+                    self._max_distance = max(self._max_distance, float(distance.max()))
+                    self.cursor = window.stop
+                    self._chunk = min(self._chunk * 2, CHUNK)
+                    continue
+                self._ref = float(angle[first[0]])
+            relative = (angle - self._ref + math.pi) % (2 * math.pi) - math.pi
+            half = np.arcsin(np.minimum(radius / np.maximum(distance, radius), 1.0))
+            lower = np.where(outside, relative - half, -math.inf)
+            upper = np.where(outside, relative + half, math.inf)
+
+            # Bounds from the fixes before each one
+            lower_before = np.maximum.accumulate(np.concatenate(([self._lower], lower)))
+            upper_before = np.minimum.accumulate(np.concatenate(([self._upper], upper)))
+            farthest_before = np.maximum.accumulate(np.concatenate(([self._max_distance], distance)))
+            left_radius_before = np.logical_or.accumulate(np.concatenate(([left_before], outside)))
+            breaks = np.flatnonzero(
+                (outside & ((relative < lower_before[:-1]) | (relative > upper_before[:-1])))
+                | (~outside & left_radius_before[:-1])
+                | (distance < farthest_before[:-1] - radius)
+            )
+            if not len(breaks):
+                self._lower = float(lower_before[-1])
+                self._upper = float(upper_before[-1])
+                self._max_distance = float(farthest_before[-1])
+                self.cursor = window.stop
+                self._chunk = min(self._chunk * 2, CHUNK)
+                continue
+            self.kept.append(window.start + int(breaks[0]) - 1)
+            self.cursor = self.kept[-1] + 1
+            self._chunk = MIN_CHUNK
+            self._reset()
+
+    def indexes(self, count: int) -> List[int]:
+        """Kept fix indexes for a route of `count` fixes, always ending at the last fix."""
+        if count == 0:
+            return []
+        return self.kept + [count - 1] if self.kept[-1] != count - 1 else list(self.kept)
+
+
+def simplify(lats, lngs, tolerance: float = settings.ROUTE_SIMPLIFY_TOLERANCE_M) -> List[int]:
+    """Indexes of the fixes kept when simplifying a whole route at once."""
+    simplifier = RouteSimplifier(tolerance)
+    simplifier.update(lats, lngs)
+    return simplifier.indexes(len(lats))
@@ -0,0 +1,227 @@
+from typing import Dict, List, Optional, Sequence, Tuple
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+import time
+import numpy as np
+from sqlalchemy import bindparam, delete, select, tuple_, update
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import OperationalError
+from app.models.activity import Activity
+from app.models.recompute_checkpoint import RecomputeCheckpoint
+from app.models.user import User
+from app.services.carbon_calculator import emission_factors
+from app.services.gamification import GamificationService
+from app.services.impact_rollups import rebuild_statements
+
+DEFAULT_CHUNK_SIZE = 20000
+# SQLite has one writer at a time; a chunk that waited out busy_timeout behind
+# other shards is retried this many times before the shard gives up
+WRITE_ATTEMPTS = 5
+
+_activity_table = Activity.__table__
+_user_table = User.__table__
+
+# executemany statements; bind names must differ from the column names
+_UPDATE_ACTIVITY = update(_activity_table).where(
+    _activity_table.c.id == bindparam("activity_id")
+).values(carbon_impact=bindparam("co2_saved"), emission_factors_version=bindparam("factors_version"))
+_UPDATE_USER = update(_user_table).where(_user_table.c.id == bindparam("user_id")).values(
+    total_distance=bindparam("distance"),
+    total_co2_saved=bindparam("co2_saved"),
+    points=bindparam("user_points"),
+)
+
+
+def _executemany(conn, statement, rows: List[Dict]):
+    """Run `statement` once per row through the driver's executemany.
+
+    Skips SQLAlchemy's per-row parameter processing, which costs more than
+    the UPDATEs themselves at recompute volumes.
+    """
+    compiled = statement.compile(dialect=conn.dialect)
+    if compiled.positional:
+        rows = [tuple(row[name] for name in compiled.positiontup) for row in rows]
+    conn.exec_driver_sql(str(compiled), rows)
+
+
+class ScoreRecompute:
+    """Reapplies the current points and CO2 rules to every stored activity.
+
+    Each shard takes the users with user_id % shards == shard and streams
+    their activities in (user_id, id) order, `chunk_size` rows at a time.
+    A chunk is scored with array operations and written in one short
+    transaction: Activity.carbon_impact values that changed or were scored
+    with another emission factors version, the totals of the users whose
+    activities are all seen (only where they changed) along with their
+    daily rollups, and the shard's checkpoint. Running again
+    with the same run name resumes after the last committed chunk.
+    SQLite has one writer at a time, so there one shard is fastest; more
+    only pay off on servers that write in parallel. Leaderboards are not
+    touched; rebuild them once the run has finished.
+    """
+
+    def __init__(self, engine: Engine, run: str = "default", shards: int = 1,
+                 chunk_size: int = DEFAULT_CHUNK_SIZE):
+        self.engine = engine
+        self.run = run
+        self.shards = shards
+        self.chunk_size = chunk_size
+        self.gamification = GamificationService()
+
+    def score(self, transport_modes: Sequence[str], distances: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """CO2 saved and points per activity, as StravaIngestService.build_activity awards them."""
+        return (emission_factors.savings_many(distances, transport_modes),
+                self.gamification.calculate_points_many(distances, transport_modes))
+
+    def restart(self):
+        """Forget this run's checkpoints so the next run starts over."""
+        with self.engine.begin() as conn:
+            conn.execute(delete(RecomputeCheckpoint).where(RecomputeCheckpoint.run == self.run))
+
+    def _checkpoint(self, shard: int) -> Dict:
+        with self.engine.begin() as conn:
+            row = conn.execute(select(RecomputeCheckpoint.__table__).where(
+                RecomputeCheckpoint.run == self.run, RecomputeCheckpoint.shard == shard
+            )).mappings().first()
+            if row is None:
+                values = {
+                    "run": self.run, "shard": shard, "shards": self.shards,
+                    "last_user_id": 0, "last_activity_id": 0,
+                    "user_distance": 0.0, "user_co2_saved": 0.0, "user_points": 0.0,
+                    "activities": 0, "updated": 0, "finished": False,
+                }
+                conn.execute(RecomputeCheckpoint.__table__.insert(), values)
+                return values
+        if row["shards"] != self.shards:
+            raise ValueError(f"Run {self.run!r} was started with {row['shards']} shards; "
+                             f"resume it with the same count or restart it")
+        return dict(row)
+
+    def _chunk_query(self, shard: int, after_user: int, after_activity: int):
+        return select(
+            Activity.id, Activity.user_id, Activity.activity_type, Activity.distance, Activity.carbon_impact,
+            Activity.emission_factors_version,
+        ).where(
+            Activity.user_id % self.shards == shard,
+            tuple_(Activity.user_id, Activity.id) > tuple_(after_user, after_activity),
+        ).order_by(Activity.user_id, Activity.id).limit(self.chunk_size)
+
+    def run_shard(self, shard: int) -> Dict:
+        """Process one shard to the end; returns its final checkpoint."""
+        checkpoint = self._checkpoint(shard)
+        while not checkpoint["finished"]:
+            with self.engine.connect() as conn:
+                rows = conn.execute(self._chunk_query(
+                    shard, checkpoint["last_user_id"], checkpoint["last_activity_id"]
+                )).all()
+            self._write_chunk(checkpoint, rows)
+        return checkpoint
+
+    def _write_chunk(self, checkpoint: Dict, rows: List):
+        """Score a chunk and commit it together with the advanced checkpoint."""
+        totals: Dict[int, List[float]] = {}  # user id -> [distance, co2 saved, points] of finished users
+        changed: List[Dict] = []
+        # The checkpoint's user may have more activities in this chunk
+        pending = checkpoint["last_user_id"]
+        partial = [checkpoint["user_distance"], checkpoint["user_co2_saved"], checkpoint["user_points"]]
+        # A short chunk is the end of the shard, so its last user is finished too
+        full = len(rows) == self.chunk_size
+        if rows:
+            ids, user_ids, modes, distances, stored, versions = zip(*rows)
+            ids = np.array(ids, dtype=np.int64)
+            user_ids = np.array(user_ids, dtype=np.int64)
+            distances = np.nan_to_num(np.array(distances, dtype=float))
+            stored = np.array(stored, dtype=float)
+            co2_saved, points = self.score(modes, distances)
+
+            retagged = np.array([version != emission_factors.version for version in versions], dtype=bool)
+            moved = np.flatnonzero((stored != co2_saved) | retagged)  # NaN (NULL) compares unequal
+            changed = [
+                {"activity_id": int(i), "co2_saved": float(c), "factors_version": emission_factors.version}
+                for i, c in zip(ids[moved], co2_saved[moved])
+            ]
+
+            starts = np.concatenate(([0], np.flatnonzero(np.diff(user_ids)) + 1))
+            for user_id, *sums in zip(
+                user_ids[starts].tolist(),
+                np.add.reduceat(distances, starts).tolist(),
+                np.add.reduceat(co2_saved, starts).tolist(),
+                np.add.reduceat(points, starts).tolist(),
+            ):
+                if user_id == pending:
+                    sums = [a + b for a, b in zip(sums, partial)]
+                totals[user_id] = sums
+            checkpoint.update(last_user_id=int(user_ids[-1]), last_activity_id=int(ids[-1]))
+        if pending and pending not in totals:
+            # The previous chunk ended with that user's last activity
+            totals[pending] = partial
+        partial = totals.pop(checkpoint["last_user_id"]) if full else [0.0, 0.0, 0.0]
+
+        checkpoint.update(
+            user_distance=partial[0], user_co2_saved=partial[1], user_points=partial[2],
+            activities=checkpoint["activities"] + len(rows),
+            updated=checkpoint["updated"] + len(changed),
+            finished=not full,
+        )
+        for attempt in range(1, WRITE_ATTEMPTS + 1):
+            try:
+                return self._commit(checkpoint, changed, totals)
+            except OperationalError as error:
+                if "locked" not in str(error.orig) or attempt == WRITE_ATTEMPTS:
+                    raise
+                time.sleep(attempt)
+
+    def _commit(self, checkpoint: Dict, changed: List[Dict], totals: Dict[int, List[float]]):
+        with self.engine.begin() as conn:
+            if changed:
+                _executemany(conn, _UPDATE_ACTIVITY, changed)
+            stale = self._stale_users(conn, totals)
+            if stale:
+                _executemany(conn, _UPDATE_USER, [
+                    {"user_id": user_id, "distance": distance, "co2_saved": co2, "user_points": user_points}
+                    for user_id, (distance, co2, user_points) in stale.items()
+                ])
+                clear, fill = rebuild_statements(user_ids=list(stale))
+                conn.execute(clear)
+                conn.execute(fill)
+            conn.execute(
+                update(RecomputeCheckpoint)
+                .where(RecomputeCheckpoint.run == self.run, RecomputeCheckpoint.shard == checkpoint["shard"])
+                .values({key: value for key, value in checkpoint.items() if key not in ("run", "shard", "updated_at")})
+            )
+
+    def _stale_users(self, conn, totals: Dict[int, List[float]]) -> Dict[int, List[float]]:
+        """The users whose stored totals differ from the recomputed ones."""
+        if not totals:
+            return {}
+        stored = conn.execute(
+            select(User.id, User.total_distance, User.total_co2_saved, User.points).where(User.id.in_(list(totals)))
+        ).all()
+        stale = dict(totals)
+        for user_id, distance, co2, user_points in stored:
+            if np.allclose(totals[user_id], [distance or 0.0, co2 or 0.0, user_points or 0.0], rtol=1e-9, atol=1e-6):
+                del stale[user_id]
+        return stale
+
+    def run_all(self, workers: Optional[int] = None) -> List[Dict]:
+        """Run every shard, `workers` at a time in separate processes."""
+        workers = min(workers or self.shards, self.shards)
+        if workers <= 1:
+            return [self.run_shard(shard) for shard in range(self.shards)]
+        with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+            return list(pool.map(
+                _run_shard,
+                [(str(self.engine.url.render_as_string(hide_password=False)), self.run, self.shards,
+                  self.chunk_size, shard) for shard in range(self.shards)]
+            ))
+
+
+def _run_shard(job: Tuple[str, str, int, int, int]) -> Dict:
+    from app.db.session import create_db_engine
+
+    url, run, shards, chunk_size, shard = job
+    engine = create_db_engine(url)
+    try:
+        return ScoreRecompute(engine, run, shards, chunk_size).run_shard(shard)
+    finally:
+        engine.dispose()
@@ -0,0 +1,205 @@
+from typing import Callable, Dict, List, Optional
+from datetime import datetime
+import asyncio
+import time
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.auth.user_cache import user_cache
+from app.core.config import get_settings
+from app.core.metrics import metrics
+from app.db.session import AsyncSessionLocal
+from app.models.activity import Activity
+from app.models.backfill_job import BackfillJob
+from app.models.route import Route
+from app.models.synced_activity import SyncedActivity
+from app.models.user import User
+from app.services.impact_rollups import impact_rollups
+from app.services.leaderboard import leaderboard
+from app.services.strava_ingest import StravaIngestService
+from app.services.strava_rate_limiter import Priority
+from app.services.strava_service import StravaService
+from app.services.strava_token_manager import token_manager
+
+settings = get_settings()
+
+
+class StravaBackfillService:
+    """Imports an athlete's Strava history page by page.
+
+    Pages are fetched `concurrency` at a time. Each window of pages is
+    written as one bulk insert together with a single update of the user's
+    totals and the job cursor, so an interrupted job resumes from the last
+    committed window.
+    """
+
+    def __init__(
+        self,
+        strava: Optional[StravaService] = None,
+        session_factory: Callable[[], AsyncSession] = AsyncSessionLocal,
+        per_page: int = settings.STRAVA_BACKFILL_PER_PAGE,
+        concurrency: int = settings.STRAVA_BACKFILL_CONCURRENCY,
+    ):
+        self.strava = strava or StravaService()
+        self.ingest = StravaIngestService(self.strava)
+        self.session_factory = session_factory
+        self.per_page = per_page
+        self.concurrency = concurrency
+        self._running: Dict[int, asyncio.Task] = {}
+
+    async def get_or_create_job(self, db: AsyncSession, user: User, after: Optional[datetime] = None) -> BackfillJob:
+        """Return the user's unfinished job, or start a new one."""
+        job = await db.scalar(
+            select(BackfillJob).where(
+                BackfillJob.user_id == user.id,
+                BackfillJob.status == BackfillJob.RUNNING
+            ).order_by(BackfillJob.id.desc())
+        )
+        if job is None:
+            job = BackfillJob(user_id=user.id, after=after, per_page=self.per_page)
+            db.add(job)
+            await db.commit()
+        return job
+
+    def start(self, user_id: int, after: Optional[datetime] = None):
+        """Run a backfill for the user in the background unless one is already running here."""
+        task = self._running.get(user_id)
+        if task is not None and not task.done():
+            return
+        self._running[user_id] = asyncio.create_task(self.run_for_user(user_id, after))
+
+    async def run_for_user(self, user_id: int, after: Optional[datetime] = None) -> Optional[BackfillJob]:
+        try:
+            async with self.session_factory() as db:
+                user = await db.get(User, user_id)
+                if user is None or not user.strava_access_token:
+                    return None
+                try:
+                    return await self.run(db, user, after)
+                except Exception as e:
+                    # Nothing awaits the background task, so record the failure on the job;
+                    # it stays RUNNING and the next start() resumes from the cursor
+                    error = str(e) or type(e).__name__
+                    await db.rollback()
+                    job = await db.scalar(
+                        select(BackfillJob).where(
+                            BackfillJob.user_id == user_id,
+                            BackfillJob.status == BackfillJob.RUNNING
+                        ).order_by(BackfillJob.id.desc())
+                    )
+                    if job is not None:
+                        job.last_error = error
+                        await db.commit()
+                    print(f"Backfill for user {user_id} stopped: {error}")
+                    return job
+        finally:
+            self._running.pop(user_id, None)
+
+    async def run(self, db: AsyncSession, user: User, after: Optional[datetime] = None) -> BackfillJob:
+        job = await self.get_or_create_job(db, user, after)
+        started = time.perf_counter()
+
+        while job.status == BackfillJob.RUNNING:
+            first_page = job.next_page
+            # Long imports can outlive a token, so check it every window
+            access_token = await token_manager.get_access_token(db, user)
+            pages = await asyncio.gather(*[
+                self.strava.get_activities_page(
+                    access_token,
+                    page=page,
+                    per_page=job.per_page,
+                    after=job.after,
+                    priority=Priority.BACKFILL
+                )
+                for page in range(first_page, first_page + self.concurrency)
+            ])
+
+            # Keep pages in order up to the first failed or short page
+            window: List[Dict] = []
+            pages_done = 0
+            finished = False
+            error = None
+            for page in pages:
+                if page is None:
+                    error = f"Failed to fetch page {first_page + pages_done}"
+                    break
+                window.extend(page)
+                pages_done += 1
+                if len(page) < job.per_page:
+                    finished = True
+                    break
+
+            awarded = await self._write_window(db, user, job, window)
+            job.next_page = first_page + pages_done
+            if finished:
+                job.status = BackfillJob.DONE
+            job.last_error = error
+            await db.commit()
+            if awarded:
+                user_cache.invalidate(user.id)
+                await leaderboard.record(user.id, awarded)
+
+            if error:
+                # Leave the job RUNNING so the next call resumes from the cursor
+                print(f"Backfill for user {user.id} stopped: {error}")
+                break
+
+        metrics.observe("backfill.run", time.perf_counter() - started)
+        return job
+
+    async def _write_window(self, db: AsyncSession, user: User, job: BackfillJob, activities: List[Dict]) -> List[Dict]:
+        """Bulk insert new activities and apply their totals to the user once.
+
+        Returns the inserted rows with their awarded points.
+        """
+        strava_ids = [int(activity["id"]) for activity in activities]
+        synced = set(await db.scalars(
+            select(SyncedActivity.strava_activity_id).where(
+                SyncedActivity.user_id == user.id,
+                SyncedActivity.strava_activity_id.in_(strava_ids)
+            )
+        ))
+
+        rows = []
+        awarded = []
+        new_ids = []
+        routes = []  # (row index, Route values)
+        for strava_id, activity in zip(strava_ids, activities):
+            if strava_id in synced:
+                continue
+            built = self.ingest.build_activity(user.id, activity)
+            if built is None:
+                continue
+            values, activity_points = built
+            rows.append(values)
+            awarded.append({**values, "points": activity_points})
+            new_ids.append(strava_id)
+            synced.add(strava_id)
+            route = self.ingest.build_route(activity)
+            if route is not None:
+                routes.append((len(rows) - 1, route))
+
+        if not rows:
+            return awarded
+        activity_ids = (await db.scalars(
+            insert(Activity).returning(Activity.id, sort_by_parameter_order=True), rows
+        )).all()
+        await db.execute(insert(SyncedActivity), [
+            {"user_id": user.id, "strava_activity_id": strava_id, "activity_id": activity_id}
+            for strava_id, activity_id in zip(new_ids, activity_ids)
+        ])
+        if routes:
+            await db.execute(insert(Route), [
+                {"activity_id": activity_ids[index], **route} for index, route in routes
+            ])
+        await impact_rollups.record(db, awarded)
+        await self.ingest.add_to_totals(
+            db, user,
+            sum(r["distance"] for r in rows),
+            sum(r["carbon_impact"] for r in rows),
+            sum(r["points"] for r in awarded),
+        )
+        job.imported += len(rows)
+        metrics.incr("backfill.activities", len(rows))
+        return awarded
+
+backfill_service = StravaBackfillService()
@@ -0,0 +1,190 @@
+from typing import Dict, Optional, Tuple
+from datetime import datetime, timedelta
+import time
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy import func, select, update
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.auth.user_cache import user_cache
+from app.core.metrics import metrics
+from app.models.user import User
+from app.models.activity import Activity
+from app.models.route import Route
+from app.models.synced_activity import SyncedActivity
+from app.services.carbon_calculator import emission_factors
+from app.services.gamification import GamificationService
+from app.services.impact_rollups import impact_rollups
+from app.services.leaderboard import leaderboard
+from app.services import polyline
+from app.services.route_simplifier import RouteSimplifier
+from app.services.strava_service import StravaService
+from app.services.strava_token_manager import token_manager
+
+# Strava activity type -> our transport mode
+STRAVA_TRANSPORT_MODES = {
+    "Walk": "WALKING",
+    "Run": "RUNNING",
+    "Ride": "CYCLING",
+}
+
+
+class ActivityFetchError(Exception):
+    """Strava did not return the activity; the event should be retried."""
+
+
+class StravaIngestService:
+    """Turns Strava webhook events into stored activities and user stats."""
+
+    def __init__(self, strava: Optional[StravaService] = None):
+        self.strava = strava or StravaService()
+        self.gamification = GamificationService()
+        self.token_manager = token_manager
+
+    async def process_event(self, db: AsyncSession, event: Dict) -> str:
+        """Process one webhook event and return a short outcome message.
+
+        Raises ActivityFetchError (or TokenRefreshError) when Strava could
+        not be reached so the caller can retry later.
+        """
+        # Get user by Strava athlete ID
+        user = await db.scalar(select(User).where(User.strava_athlete_id == str(event["owner_id"])))
+        if not user:
+            print(f"User not found for Strava athlete ID: {event['owner_id']}")
+            return "User not found"
+
+        # Only process activities that happened after Strava connection
+        if not user.strava_connected_at:
+            print(f"No connection timestamp found for user: {user.email}")
+            return "No connection timestamp found"
+
+        activity_start = datetime.fromtimestamp(event["object_id"])
+        if activity_start < user.strava_connected_at:
+            print(f"Activity {event['object_id']} is before Strava connection time")
+            return "Activity is before Strava connection"
+
+        access_token = await self.token_manager.get_access_token(db, user)
+
+        started = time.perf_counter()
+        activity = await self.strava.get_activity(event["object_id"], access_token)
+        metrics.observe("ingest.fetch", time.perf_counter() - started)
+        if not activity:
+            raise ActivityFetchError(f"Failed to fetch activity {event['object_id']} from Strava")
+
+        print(f"Retrieved activity from Strava: {activity}")
+
+        started = time.perf_counter()
+        try:
+            return await self.ingest_activity(db, user, activity)
+        finally:
+            metrics.observe("ingest.persist", time.perf_counter() - started)
+
+    def build_activity(self, user_id: int, activity: Dict) -> Optional[Tuple[Dict, int]]:
+        """Map a Strava activity to Activity column values and points.
+
+        Returns None for activity types we do not track.
+        """
+        transport_mode = STRAVA_TRANSPORT_MODES.get(activity["type"])
+        if transport_mode is None:
+            return None
+
+        # Per meter rather than per km, as stored since the first ingest
+        co2_saved = emission_factors.savings(activity["distance"], transport_mode)
+        start_time = datetime.strptime(activity["start_date"], "%Y-%m-%dT%H:%M:%SZ")
+        values = {
+            "user_id": user_id,
+            "activity_type": transport_mode,
+            "distance": activity["distance"],
+            "duration": activity["moving_time"],
+            "carbon_impact": co2_saved,
+            "emission_factors_version": emission_factors.version,
+            "start_time": start_time,
+            "end_time": start_time + timedelta(seconds=activity["moving_time"]),
+        }
+        points = self.gamification.calculate_points(
+            distance=activity["distance"],
+            duration=activity["moving_time"],
+            transport_mode=transport_mode
+        )
+        return values, points
+
+    def build_route(self, activity: Dict) -> Optional[Dict]:
+        """Simplify the activity's Strava polyline into Route column values.
+
+        Uses the full-resolution map.polyline when present, else the summary
+        one. Returns None when the activity has no GPS track.
+        """
+        strava_map = activity.get("map") or {}
+        encoded = strava_map.get("polyline") or strava_map.get("summary_polyline")
+        if not encoded:
+            return None
+        lats, lngs = polyline.decode(encoded)
+        simplifier = RouteSimplifier()
+        simplifier.update(lats, lngs)
+        kept = simplifier.indexes(len(lats))
+        return {
+            "polyline": polyline.encode([lats[i] for i in kept], [lngs[i] for i in kept]),
+            "tolerance": simplifier.tolerance,
+            "raw_points": len(lats),
+            "points": len(kept),
+        }
+
+    async def add_to_totals(self, db: AsyncSession, user: User, distance: float, co2_saved: float, points: int):
+        """Add to the user's totals and award the achievements the new totals reach.
+
+        The increments run in the database in one UPDATE, so webhook workers
+        and backfills adding to the same user at once do not overwrite each
+        other. Returns the new (total_distance, total_co2_saved, points).
+        """
+        totals = (await db.execute(
+            update(User).where(User.id == user.id).values(
+                total_distance=func.coalesce(User.total_distance, 0.0) + distance,
+                total_co2_saved=func.coalesce(User.total_co2_saved, 0.0) + co2_saved,
+                points=func.coalesce(User.points, 0) + points,
+            ).returning(User.total_distance, User.total_co2_saved, User.points)
+            .execution_options(synchronize_session=False)
+        )).one()
+        for name, value in totals._mapping.items():
+            set_committed_value(user, name, value)
+        self.gamification.award_achievements(user, totals._mapping)
+        return totals
+
+    async def ingest_activity(self, db: AsyncSession, user: User, activity: Dict) -> str:
+        """Store a Strava activity for the user and update their stats."""
+        # Skip if already synced
+        if await db.get(SyncedActivity, (user.id, int(activity["id"]))) is not None:
+            print(f"Activity {activity['id']} already synced")
+            return "Activity already synced"
+
+        built = self.build_activity(user.id, activity)
+        if built is None:
+            print(f"Unsupported activity type: {activity['type']}")
+            return "Unsupported activity type"
+        values, points = built
+
+        print(f"Processing activity: type={values['activity_type']}, distance={values['distance']}, co2_saved={values['carbon_impact']}")
+
+        db_activity = Activity(**values)
+        db.add(db_activity)
+        await db.flush()
+        db.add(SyncedActivity(user_id=user.id, strava_activity_id=int(activity["id"]), activity_id=db_activity.id))
+        route = self.build_route(activity)
+        if route is not None:
+            db.add(Route(activity_id=db_activity.id, **route))
+        awarded = {**values, "points": points}
+        await impact_rollups.record(db, [awarded])
+
+        # Update user stats
+        totals = await self.add_to_totals(db, user, values["distance"], values["carbon_impact"], points)
+
+        print(f"Updated user stats: distance={totals.total_distance}, co2_saved={totals.total_co2_saved}, points={totals.points}")
+
+        try:
+            await db.commit()
+        except IntegrityError:
+            # Another worker imported the same activity first
+            await db.rollback()
+            print(f"Activity {activity['id']} already synced")
+            return "Activity already synced"
+        user_cache.invalidate(user.id)
+        await leaderboard.record(user.id, [awarded])
+        return "Activity processed successfully"
@@ -0,0 +1,153 @@
+from typing import Dict, List, Mapping, Optional
+from enum import IntEnum
+import asyncio
+import heapq
+import itertools
+import time
+from app.core.config import get_settings
+from app.core.metrics import metrics
+
+settings = get_settings()
+
+SHORT_WINDOW = 15 * 60
+DAY = 24 * 60 * 60
+
+
+class Priority(IntEnum):
+    """Lower values are served first."""
+    INTERACTIVE = 0  # a user is waiting on the response
+    WEBHOOK = 1
+    BACKFILL = 2
+
+
+# Share of each window that a priority may not dip into, keeping headroom
+# for more urgent work.
+RESERVES = {
+    Priority.INTERACTIVE: 0.0,
+    Priority.WEBHOOK: settings.STRAVA_RATE_LIMIT_WEBHOOK_RESERVE,
+    Priority.BACKFILL: settings.STRAVA_RATE_LIMIT_BACKFILL_RESERVE,
+}
+
+
+class StravaRateLimiter:
+    """App-wide token bucket matching Strava's 15-minute and daily quotas.
+
+    Each window's bucket holds the requests left before Strava starts
+    answering 429 and refills when the window rolls over. The counts are
+    corrected from the X-RateLimit-* headers on every response, so usage by
+    other processes sharing the app's quota is picked up too. Callers that
+    find no budget are queued by priority and resume when the window resets.
+    """
+
+    def __init__(
+        self,
+        short_limit: int = settings.STRAVA_RATE_LIMIT_15MIN,
+        daily_limit: int = settings.STRAVA_RATE_LIMIT_DAILY,
+        clock=time.time,
+    ):
+        self.short_limit = short_limit
+        self.daily_limit = daily_limit
+        self.short_usage = 0
+        self.daily_usage = 0
+        self.clock = clock
+        self._short_window = self._window_start(SHORT_WINDOW)
+        self._daily_window = self._window_start(DAY)
+        self._waiters: List[list] = []
+        self._seq = itertools.count()
+        self._cond: Optional[asyncio.Condition] = None
+
+    def _window_start(self, length: int) -> int:
+        now = int(self.clock())
+        return now - now % length
+
+    def _roll_windows(self):
+        short_window = self._window_start(SHORT_WINDOW)
+        if short_window != self._short_window:
+            self._short_window = short_window
+            self.short_usage = 0
+        daily_window = self._window_start(DAY)
+        if daily_window != self._daily_window:
+            self._daily_window = daily_window
+            self.daily_usage = 0
+
+    def _has_budget(self, priority: Priority) -> bool:
+        reserve = RESERVES[priority]
+        return (
+            self.short_usage < self.short_limit * (1 - reserve)
+            and self.daily_usage < self.daily_limit * (1 - reserve)
+        )
+
+    def _seconds_until_reset(self) -> float:
+        # Blocked callers re-check at every 15-minute boundary, including
+        # when the daily quota is the one exhausted
+        return max(self._short_window + SHORT_WINDOW - self.clock(), 0.05)
+
+    async def acquire(self, priority: Priority = Priority.INTERACTIVE):
+        """Wait until a request of this priority fits in the budget, then claim it."""
+        if self._cond is None:
+            self._cond = asyncio.Condition()
+        started = time.perf_counter()
+        entry = [priority, next(self._seq)]
+        async with self._cond:
+            heapq.heappush(self._waiters, entry)
+            try:
+                while True:
+                    self._roll_windows()
+                    if self._waiters[0] is entry and self._has_budget(priority):
+                        break
+                    try:
+                        await asyncio.wait_for(self._cond.wait(), timeout=self._seconds_until_reset())
+                    except asyncio.TimeoutError:
+                        pass
+                heapq.heappop(self._waiters)
+                self.short_usage += 1
+                self.daily_usage += 1
+            except BaseException:
+                self._waiters.remove(entry)
+                heapq.heapify(self._waiters)
+                raise
+            finally:
+                # Let the next waiter re-check; it may be allowed now
+                self._cond.notify_all()
+        waited = time.perf_counter() - started
+        metrics.observe(f"strava.rate_limit_wait.{priority.name.lower()}", waited)
+
+    def update_from_headers(self, headers: Mapping[str, str]):
+        """Adopt the limits and usage Strava reports for the current windows."""
+        limit = _parse_pair(headers.get("X-RateLimit-Limit"))
+        usage = _parse_pair(headers.get("X-RateLimit-Usage"))
+        if limit:
+            self.short_limit, self.daily_limit = limit
+        if usage:
+            self._roll_windows()
+            self.short_usage, self.daily_usage = usage
+
+    def on_throttled(self):
+        """Strava answered 429: treat the current window as exhausted."""
+        metrics.incr("strava.throttled")
+        self.short_usage = max(self.short_usage, self.short_limit)
+
+    def stats(self) -> Dict:
+        self._roll_windows()
+        return {
+            "short_usage": self.short_usage,
+            "short_limit": self.short_limit,
+            "daily_usage": self.daily_usage,
+            "daily_limit": self.daily_limit,
+            "short_window_resets_in": round(self._short_window + SHORT_WINDOW - self.clock(), 1),
+            "waiting": {p.name.lower(): sum(1 for w in self._waiters if w[0] == p) for p in Priority},
+        }
+
+
+def _parse_pair(value: Optional[str]):
+    if not value:
+        return None
+    try:
+        short, daily = (int(part) for part in value.split(","))
+    except ValueError:
+        return None
+    return short, daily
+
+
+rate_limiter = StravaRateLimiter()
+metrics.gauge("strava_rate_limit", rate_limiter.stats)
@@ -1,22 +1,40 @@
-from typing import Dict, Optional, List
-import aiohttp
-import ssl
-import certifi
+from typing import Any, Dict, Optional, List, Tuple
 from datetime import datetime
 from app.core.config import get_settings
+from app.services.http_client import http_client
+from app.services.strava_rate_limiter import Priority, rate_limiter
 
 settings = get_settings()
 
 class StravaService:
-    BASE_URL = "https://www.strava.com/api/v3"
+    BASE_URL = settings.STRAVA_API_BASE_URL
+    OAUTH_URL = settings.STRAVA_OAUTH_BASE_URL
     
     def __init__(self):
         self.client_id = settings.STRAVA_CLIENT_ID
         self.client_secret = settings.STRAVA_CLIENT_SECRET
         self.webhook_verify_token = settings.STRAVA_WEBHOOK_VERIFY_TOKEN
         self.is_configured = all([self.client_id, self.client_secret, self.webhook_verify_token])
-        # Create SSL context using certifi's certificates
-        self.ssl_context = ssl.create_default_context(cafile=certifi.where())
+
+    async def _request(self, method: str, url: str, priority: Priority = Priority.INTERACTIVE, **kwargs) -> Tuple[int, Any]:
+        """Send a request through the shared rate limiter and return (status, body).
+
+        A 429 marks the window as spent and the request waits for the next
+        one instead of failing, up to STRAVA_THROTTLE_RETRIES times.
+        """
+        for attempt in range(settings.STRAVA_THROTTLE_RETRIES + 1):
+            await rate_limiter.acquire(priority)
+            session = await http_client.get_session()
+            async with session.request(method, url, **kwargs) as response:
+                rate_limiter.update_from_headers(response.headers)
+                if response.status == 429 and attempt < settings.STRAVA_THROTTLE_RETRIES:
+                    rate_limiter.on_throttled()
+                    continue
+                try:
+                    body = await response.json(content_type=None)
+                except ValueError:
+                    body = await response.text()
+                return response.status, body
         
     async def get_oauth_url(self, redirect_uri: str, state: str = "") -> str:
         """Get Strava OAuth URL for user authorization."""
@@ -24,7 +42,7 @@ class StravaService:
             return None
             
         return (
-            f"https://www.strava.com/oauth/authorize"
+            f"{self.OAUTH_URL}/authorize"
             f"?client_id={self.client_id}"
             f"&redirect_uri={redirect_uri}"
             f"&response_type=code"
@@ -37,63 +55,80 @@ class StravaService:
         if not self.is_configured:
             return None
             
-        connector = aiohttp.TCPConnector(ssl=self.ssl_context)
-        async with aiohttp.ClientSession(connector=connector) as session:
-            async with session.post(
-                "https://www.strava.com/oauth/token",
-                data={
-                    "client_id": self.client_id,
-                    "client_secret": self.client_secret,
-                    "code": code,
-                    "grant_type": "authorization_code"
-                }
-            ) as response:
-                return await response.json()
+        status, body = await self._request(
+            "POST",
+            f"{self.OAUTH_URL}/token",
+            data={
+                "client_id": self.client_id,
+                "client_secret": self.client_secret,
+                "code": code,
+                "grant_type": "authorization_code"
+            }
+        )
+        return body
                 
     async def refresh_token(self, refresh_token: str) -> Dict:
         """Refresh expired access token."""
-        connector = aiohttp.TCPConnector(ssl=self.ssl_context)
-        async with aiohttp.ClientSession(connector=connector) as session:
-            async with session.post(
-                "https://www.strava.com/oauth/token",
-                data={
-                    "client_id": self.client_id,
-                    "client_secret": self.client_secret,
-                    "refresh_token": refresh_token,
-                    "grant_type": "refresh_token"
-                }
-            ) as response:
-                return await response.json()
+        status, body = await self._request(
+            "POST",
+            f"{self.OAUTH_URL}/token",
+            data={
+                "client_id": self.client_id,
+                "client_secret": self.client_secret,
+                "refresh_token": refresh_token,
+                "grant_type": "refresh_token"
+            }
+        )
+        return body
                 
-    async def get_activity(self, activity_id: int, access_token: str) -> Optional[Dict]:
+    async def get_activity(
+        self,
+        activity_id: int,
+        access_token: str,
+        priority: Priority = Priority.WEBHOOK
+    ) -> Optional[Dict]:
         """Get detailed activity data."""
-        connector = aiohttp.TCPConnector(ssl=self.ssl_context)
-        async with aiohttp.ClientSession(connector=connector) as session:
-            async with session.get(
-                f"{self.BASE_URL}/activities/{activity_id}",
-                headers={"Authorization": f"Bearer {access_token}"}
-            ) as response:
-                if response.status == 200:
-                    return await response.json()
-                return None
+        status, body = await self._request(
+            "GET",
+            f"{self.BASE_URL}/activities/{activity_id}",
+            priority,
+            headers={"Authorization": f"Bearer {access_token}"}
+        )
+        if status == 200:
+            return body
+        return None
                 
     async def get_recent_activities(self, access_token: str, after: datetime = None) -> List[Dict]:
         """Get user's recent activities."""
-        params = {"per_page": 30}
+        return await self.get_activities_page(access_token, after=after) or []
+
+    async def get_activities_page(
+        self,
+        access_token: str,
+        page: int = 1,
+        per_page: int = 30,
+        after: datetime = None,
+        before: datetime = None,
+        priority: Priority = Priority.INTERACTIVE
+    ) -> Optional[List[Dict]]:
+        """Get one page of the athlete's activities, or None if the request failed."""
+        params = {"page": page, "per_page": per_page}
         if after:
             params["after"] = int(after.timestamp())
-            
-        connector = aiohttp.TCPConnector(ssl=self.ssl_context)
-        async with aiohttp.ClientSession(connector=connector) as session:
-            async with session.get(
-                f"{self.BASE_URL}/athlete/activities",
-                headers={"Authorization": f"Bearer {access_token}"},
-                params=params
-            ) as response:
-                if response.status == 200:
-                    return await response.json()
-                return []
-                
+        if before:
+            params["before"] = int(before.timestamp())
+
+        status, body = await self._request(
+            "GET",
+            f"{self.BASE_URL}/athlete/activities",
+            priority,
+            headers={"Authorization": f"Bearer {access_token}"},
+            params=params
+        )
+        if status == 200:
+            return body
+        return None
+
     def verify_webhook(self, mode: str, token: str, challenge: str) -> Optional[Dict]:
         """Verify Strava webhook subscription."""
         if mode == "subscribe" and token == self.webhook_verify_token:
@@ -103,19 +138,18 @@ class StravaService:
     async def create_webhook_subscription(self, callback_url: str) -> Optional[Dict]:
         """Create Strava webhook subscription."""
         print(f"Creating webhook subscription with callback URL: {callback_url}")
-        connector = aiohttp.TCPConnector(ssl=self.ssl_context)
-        async with aiohttp.ClientSession(connector=connector) as session:
-            async with session.post(
-                "https://www.strava.com/api/v3/push_subscriptions",
-                data={
-                    "client_id": self.client_id,
-                    "client_secret": self.client_secret,
-                    "callback_url": callback_url,
-                    "verify_token": self.webhook_verify_token
-                }
-            ) as response:
-                print(f"Webhook subscription response status: {response.status}")
-                if response.status == 200:
-                    return await response.json()
-                print(f"Webhook subscription failed: {await response.text()}")
-                return None 
\ No newline at end of file
+        status, body = await self._request(
+            "POST",
+            f"{self.BASE_URL}/push_subscriptions",
+            data={
+                "client_id": self.client_id,
+                "client_secret": self.client_secret,
+                "callback_url": callback_url,
+                "verify_token": self.webhook_verify_token
+            }
+        )
+        print(f"Webhook subscription response status: {status}")
+        if status == 200:
+            return body
+        print(f"Webhook subscription failed: {body}")
+        return None 
\ No newline at end of file
@@ -0,0 +1,101 @@
+from typing import Dict, Optional, Tuple
+import asyncio
+import time
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import get_settings
+from app.core.metrics import metrics
+from app.models.user import User
+from app.services.strava_service import StravaService
+
+settings = get_settings()
+
+
+class TokenRefreshError(Exception):
+    pass
+
+
+class StravaTokenManager:
+    """Hands out valid Strava access tokens per athlete.
+
+    Tokens are cached in memory until `refresh_margin` seconds before they
+    expire and refreshed ahead of that. Concurrent callers for the same user
+    share one in-flight refresh, and only that refresh writes the new tokens
+    back to the user row.
+    """
+
+    def __init__(
+        self,
+        strava: Optional[StravaService] = None,
+        refresh_margin: int = settings.STRAVA_TOKEN_REFRESH_MARGIN_SECONDS,
+        clock=time.time,
+    ):
+        self.strava = strava
+        self.refresh_margin = refresh_margin
+        self.clock = clock
+        self._cache: Dict[int, Tuple[str, int]] = {}  # user_id -> (access_token, expires_at)
+        self._inflight: Dict[int, asyncio.Future] = {}
+
+    def _is_fresh(self, expires_at: Optional[int]) -> bool:
+        return expires_at is not None and expires_at - self.refresh_margin > self.clock()
+
+    async def get_access_token(self, db: AsyncSession, user: User) -> Optional[str]:
+        cached = self._cache.get(user.id)
+        if cached and self._is_fresh(cached[1]):
+            metrics.incr("strava_token.cache_hits")
+            return cached[0]
+
+        # The row may already hold a fresh token, e.g. refreshed by another worker
+        if user.strava_access_token and self._is_fresh(user.strava_token_expires_at):
+            self._cache[user.id] = (user.strava_access_token, user.strava_token_expires_at)
+            return user.strava_access_token
+
+        if not user.strava_refresh_token:
+            return user.strava_access_token
+
+        inflight = self._inflight.get(user.id)
+        if inflight is not None:
+            metrics.incr("strava_token.coalesced")
+            return await asyncio.shield(inflight)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[user.id] = future
+        try:
+            token = await self._refresh(db, user)
+        except Exception as e:
+            future.set_exception(e)
+            # Mark retrieved so an unawaited failure does not log a warning
+            future.exception()
+            raise
+        else:
+            future.set_result(token)
+            return token
+        finally:
+            self._inflight.pop(user.id, None)
+
+    async def _refresh(self, db: AsyncSession, user: User) -> str:
+        metrics.incr("strava_token.refreshes")
+        strava = self.strava or StravaService()
+        started = time.perf_counter()
+        response = await strava.refresh_token(user.strava_refresh_token)
+        metrics.observe("strava_token.refresh", time.perf_counter() - started)
+        if not isinstance(response, dict) or "access_token" not in response:
+            raise TokenRefreshError(f"Strava token refresh failed for user {user.id}: {response}")
+
+        user.strava_access_token = response["access_token"]
+        user.strava_refresh_token = response.get("refresh_token", user.strava_refresh_token)
+        user.strava_token_expires_at = response["expires_at"]
+        await db.commit()
+
+        self._cache[user.id] = (user.strava_access_token, user.strava_token_expires_at)
+        return user.strava_access_token
+
+    def invalidate(self, user_id: int):
+        """Forget a cached token, e.g. after the user reconnects Strava."""
+        self._cache.pop(user_id, None)
+
+    def stats(self) -> Dict:
+        return {"cached": len(self._cache), "refreshing": len(self._inflight)}
+
+
+token_manager = StravaTokenManager()
+metrics.gauge("strava_tokens", token_manager.stats)
@@ -0,0 +1,384 @@
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple, TypeVar
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+import asyncio
+import pickle
+import time
+import weakref
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import get_settings
+from app.core.metrics import metrics
+from app.db.session import AsyncSessionLocal
+from app.models.tracker_session import TrackerSession
+from app.services.activity_tracker import ActivityTracker
+
+settings = get_settings()
+
+T = TypeVar("T")
+
+# Write-through updates that lose a race with another process are rerun on
+# the newer state this many times
+CONFLICT_RETRIES = 3
+# Share of the cache evicted at once when it overflows, so evicted trackers
+# are saved in batches rather than one write per update
+EVICT_FRACTION = 0.05
+
+
+def dump_state(tracker: ActivityTracker) -> bytes:
+    return pickle.dumps(tracker, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def load_state(state: bytes) -> ActivityTracker:
+    # Only ever reads states this app wrote to its own database or Redis
+    return pickle.loads(state)
+
+
+class MemorySessionStore:
+    """Serialized states of users evicted from the cache, in this process only.
+
+    Holds at most `capacity` states; past that the least recently evicted
+    are dropped, and those users start over with a new tracker. A state is
+    handed back to the cache on load and not kept here meanwhile.
+    """
+
+    durable = False  # nothing survives a restart, so only evictions are written
+    shared = False  # no other writers, so saves never conflict
+
+    def __init__(self, capacity: int = settings.TRACKER_SESSION_MEMORY_STORE_SIZE):
+        self.capacity = capacity
+        self._states: "OrderedDict[int, Tuple[int, bytes]]" = OrderedDict()
+
+    async def load(self, user_id: int) -> Tuple[int, Optional[bytes]]:
+        return self._states.pop(user_id, (0, None))
+
+    async def version(self, user_id: int) -> int:
+        return self._states.get(user_id, (0, None))[0]
+
+    async def save_many(self, items: List[Tuple[int, int, bytes]]) -> List[int]:
+        for user_id, expected, state in items:
+            self._states[user_id] = (expected + 1, state)
+            self._states.move_to_end(user_id)
+        while len(self._states) > self.capacity:
+            self._states.popitem(last=False)
+            metrics.incr("tracker_sessions.dropped")
+        return []
+
+    async def delete(self, user_id: int):
+        self._states.pop(user_id, None)
+
+
+def _insert_new(dialect: str):
+    """INSERT that skips users another process has just created, where supported."""
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    else:
+        return insert(TrackerSession)
+    return dialect_insert(TrackerSession).on_conflict_do_nothing(index_elements=[TrackerSession.user_id])
+
+
+class TrackerSessionConflict(Exception):
+    """Other processes kept saving the user's tracker first; the update was not stored."""
+
+
+class SqlSessionStore:
+    """States in the tracker_sessions table of the app database (SQLite or Postgres).
+
+    Each save is a compare-and-set on the row version; one flush writes all
+    changed users in a single transaction.
+    """
+
+    durable = True
+    shared = True
+
+    def __init__(self, session_factory: Callable[[], AsyncSession] = AsyncSessionLocal):
+        self.session_factory = session_factory
+
+    async def load(self, user_id: int) -> Tuple[int, Optional[bytes]]:
+        async with self.session_factory() as db:
+            row = (await db.execute(
+                select(TrackerSession.version, TrackerSession.state).where(TrackerSession.user_id == user_id)
+            )).first()
+        return (row.version, row.state) if row else (0, None)
+
+    async def version(self, user_id: int) -> int:
+        async with self.session_factory() as db:
+            return await db.scalar(
+                select(TrackerSession.version).where(TrackerSession.user_id == user_id)
+            ) or 0
+
+    async def save_many(self, items: List[Tuple[int, int, bytes]]) -> List[int]:
+        conflicts = []
+        now = datetime.utcnow()
+        async with self.session_factory() as db:
+            insert_new = _insert_new(db.bind.dialect.name)
+            for user_id, expected, state in items:
+                if expected == 0:
+                    statement = insert_new.values(user_id=user_id, version=1, state=state, updated_at=now)
+                else:
+                    statement = update(TrackerSession).where(
+                        TrackerSession.user_id == user_id, TrackerSession.version == expected
+                    ).values(version=expected + 1, state=state, updated_at=now)
+                if (await db.execute(statement)).rowcount == 0:
+                    conflicts.append(user_id)
+            await db.commit()
+        return conflicts
+
+    async def delete(self, user_id: int):
+        async with self.session_factory() as db:
+            await db.execute(delete(TrackerSession).where(TrackerSession.user_id == user_id))
+            await db.commit()
+
+
+# Sets the state only if the stored version is still the one the writer loaded
+CAS_SCRIPT = """
+local version = tonumber(redis.call('HGET', KEYS[1], 'v') or '0')
+if version ~= tonumber(ARGV[1]) then return 0 end
+redis.call('HSET', KEYS[1], 'v', version + 1, 's', ARGV[2])
+return 1
+"""
+
+
+class RedisSessionStore:
+    """States as Redis hashes ({v: version, s: state}), shared by every app process.
+
+    Works with any server speaking the Redis protocol, including a local
+    redis-server for development.
+    """
+
+    durable = True
+    shared = True
+
+    def __init__(self, url: str = settings.TRACKER_SESSION_REDIS_URL, prefix: str = "tracker:"):
+        import redis.asyncio as redis
+
+        self.redis = redis.from_url(url)
+        self.prefix = prefix
+        self._cas = self.redis.register_script(CAS_SCRIPT)
+
+    async def load(self, user_id: int) -> Tuple[int, Optional[bytes]]:
+        version, state = await self.redis.hmget(self.prefix + str(user_id), "v", "s")
+        return (int(version), state) if version is not None else (0, None)
+
+    async def version(self, user_id: int) -> int:
+        version = await self.redis.hget(self.prefix + str(user_id), "v")
+        return int(version) if version is not None else 0
+
+    async def save_many(self, items: List[Tuple[int, int, bytes]]) -> List[int]:
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for user_id, expected, state in items:
+                await self._cas(keys=[self.prefix + str(user_id)], args=[expected, state], client=pipe)
+            results = await pipe.execute()
+        return [user_id for (user_id, _, _), saved in zip(items, results) if not saved]
+
+    async def delete(self, user_id: int):
+        await self.redis.delete(self.prefix + str(user_id))
+
+
+def create_store(backend: str = settings.TRACKER_SESSION_BACKEND):
+    if backend == "sql":
+        return SqlSessionStore()
+    if backend == "redis":
+        return RedisSessionStore()
+    if backend == "memory":
+        return MemorySessionStore()
+    raise ValueError(f"Unknown tracker session backend: {backend}")
+
+
+@dataclass
+class _Session:
+    tracker: ActivityTracker
+    version: int  # store version the tracker was loaded from or last saved as
+    changes: int = 0
+    saved: int = 0  # value of `changes` at the last save
+
+    @property
+    def dirty(self) -> bool:
+        return self.changes != self.saved
+
+
+class TrackerSessionService:
+    """One ActivityTracker per user, cached in an LRU and persisted to a store.
+
+    `run` serializes calls per user. Recently used trackers stay
+    deserialized in memory up to `capacity`; the least recently used idle
+    ones are evicted, and saved if they changed. With a durable store,
+    changed trackers are written in one batch every `flush_interval`
+    seconds, or on every update when it is 0.
+
+    Shared stores are safe across app processes: a cached tracker is reused
+    only while the store still holds the version it was loaded at, and saves
+    are compare-and-set on that version. Write-through updates that lose a
+    race are rerun on the newer state; with batched writes the first writer
+    wins and the other process reloads.
+    """
+
+    def __init__(self, store=None, capacity: int = settings.TRACKER_SESSION_CACHE_SIZE,
+                 flush_interval: float = settings.TRACKER_SESSION_FLUSH_SECONDS):
+        self.store = store or create_store()
+        self.capacity = capacity
+        self.flush_interval = flush_interval
+        self._cache: "OrderedDict[int, _Session]" = OrderedDict()
+        self._dirty: Set[int] = set()
+        self._locks: "weakref.WeakValueDictionary[int, asyncio.Lock]" = weakref.WeakValueDictionary()
+        self._save_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._conflicts = 0
+
+    def _lock(self, user_id: int) -> asyncio.Lock:
+        lock = self._locks.get(user_id)
+        if lock is None:
+            lock = self._locks[user_id] = asyncio.Lock()
+        return lock
+
+    @property
+    def _write_through(self) -> bool:
+        return self.store.durable and self.flush_interval <= 0
+
+    async def run(self, user_id: int, fn: Callable[[ActivityTracker], Awaitable[T]]) -> T:
+        """Run `fn` on the user's tracker and return its result.
+
+        Raises TrackerSessionConflict if a write-through save loses the race
+        to another process CONFLICT_RETRIES times in a row.
+        """
+        async with self._lock(user_id):
+            for _ in range(CONFLICT_RETRIES):
+                session = await self._session(user_id)
+                result = await fn(session.tracker)
+                session.changes += 1
+                if not self._write_through:
+                    if self.store.durable:
+                        self._dirty.add(user_id)
+                    break
+                if not await self._save([(user_id, session)]):
+                    break
+            else:
+                metrics.incr("tracker_sessions.conflict_failures")
+                raise TrackerSessionConflict(
+                    f"Tracker of user {user_id} was saved elsewhere {CONFLICT_RETRIES} times in a row"
+                )
+        if len(self._cache) > self.capacity:
+            await self._evict()
+        return result
+
+    async def _session(self, user_id: int) -> _Session:
+        session = self._cache.get(user_id)
+        if session is not None and self.store.shared and not session.dirty:
+            if await self.store.version(user_id) != session.version:
+                session = None  # another process saved a newer state
+        if session is None:
+            self._misses += 1
+            version, state = await self.store.load(user_id)
+            tracker = load_state(state) if state is not None else ActivityTracker()
+            session = self._cache[user_id] = _Session(tracker, version)
+        else:
+            self._hits += 1
+        self._cache.move_to_end(user_id)
+        return session
+
+    async def _save(self, items: List[Tuple[int, _Session]]) -> List[int]:
+        """Write sessions to the store; returns the users another process saved first."""
+        if not items:
+            return []
+        started = time.perf_counter()
+        # Pickled before any await, so later changes are not half-included
+        payload = [(user_id, session.version, dump_state(session.tracker)) for user_id, session in items]
+        marks = [session.changes for _, session in items]
+        conflicts = set(await self.store.save_many(payload))
+        for (user_id, session), mark in zip(items, marks):
+            if user_id in conflicts:
+                if self._cache.get(user_id) is session:
+                    del self._cache[user_id]
+                self._dirty.discard(user_id)
+                continue
+            session.version += 1
+            session.saved = mark
+            if session.dirty and user_id in self._cache:
+                self._dirty.add(user_id)  # changed again while saving
+        self._conflicts += len(conflicts)
+        metrics.observe("tracker_sessions.save", time.perf_counter() - started)
+        metrics.incr("tracker_sessions.saved", len(items) - len(conflicts))
+        return list(conflicts)
+
+    async def _evict(self):
+        """Drop least recently used idle trackers below capacity, saving changed ones."""
+        excess = len(self._cache) - self.capacity + int(self.capacity * EVICT_FRACTION)
+        evicted = []
+        for user_id, session in self._cache.items():
+            if len(evicted) >= excess:
+                break
+            lock = self._lock(user_id)
+            if not lock.locked():
+                evicted.append((user_id, session, lock))
+        for user_id, session, lock in evicted:
+            await lock.acquire()  # free, so this does not yield
+            del self._cache[user_id]
+            self._dirty.discard(user_id)
+        self._evictions += len(evicted)
+        try:
+            async with self._save_lock:
+                await self._save([(user_id, session) for user_id, session, _ in evicted if session.dirty])
+        finally:
+            for _, _, lock in evicted:
+                lock.release()
+
+    async def flush(self):
+        """Save every changed tracker in one batch."""
+        if not self.store.durable:
+            # Nothing to persist; changed trackers are saved when evicted
+            self._dirty.clear()
+            return
+        async with self._save_lock:
+            users, self._dirty = self._dirty, set()
+            try:
+                await self._save([(user_id, self._cache[user_id]) for user_id in users if user_id in self._cache])
+            except Exception:
+                self._dirty |= users
+                raise
+
+    async def drop(self, user_id: int):
+        """Forget the user's tracker here and in the store."""
+        async with self._lock(user_id):
+            self._cache.pop(user_id, None)
+            self._dirty.discard(user_id)
+            await self.store.delete(user_id)
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"Tracker session flush failed: {e}")
+
+    async def start(self):
+        if self._task is None and self.store.durable and self.flush_interval > 0:
+            self._task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+
+    def stats(self) -> Dict:
+        lookups = self._hits + self._misses
+        return {
+            "backend": type(self.store).__name__,
+            "cached": len(self._cache),
+            "dirty": len(self._dirty),
+            "hit_ratio": self._hits / lookups if lookups else 0.0,
+            "evictions": self._evictions,
+            "conflicts": self._conflicts,
+        }
+
+
+tracker_sessions = TrackerSessionService()
+metrics.gauge("tracker_sessions", tracker_sessions.stats)
@@ -0,0 +1,105 @@
+from typing import Dict, Iterable, List, Optional
+from array import array
+from datetime import datetime, timedelta, timezone, tzinfo
+import numpy as np
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+NAIVE_EPOCH = datetime(1970, 1, 1)
+MICROSECOND = timedelta(microseconds=1)
+
+
+class TripPoints:
+    """Columnar GPS fixes of one trip, behind the list-of-dicts API Trip.locations had.
+
+    lat, lng, speed and altitude are float64 arrays and timestamps epoch
+    microseconds, so a fix costs 40 bytes instead of a dict and a datetime.
+    Columns grow by amortized appends. Indexing and iteration still return
+    {"lat", "lng", "timestamp", "speed", "altitude"} dicts, built on demand;
+    read the columns directly on hot paths and call to_dicts() to serialize.
+    """
+
+    __slots__ = ("lat", "lng", "micros", "speed", "altitude", "tz")
+
+    def __init__(self, locations: Iterable[Dict] = ()):
+        self.lat = array("d")
+        self.lng = array("d")
+        self.micros = array("q")
+        self.speed = array("d")
+        self.altitude = array("d")
+        self.tz: Optional[tzinfo] = None  # of the timestamps; None when naive
+        for location in locations:
+            self.append(location)
+
+    def append(self, location: Dict):
+        timestamp = location["timestamp"]
+        if not self.micros:
+            self.tz = timestamp.tzinfo
+        self.lat.append(location["lat"])
+        self.lng.append(location["lng"])
+        self.micros.append(to_micros(timestamp))
+        self.speed.append(location.get("speed", 0))
+        self.altitude.append(location.get("altitude", 0))
+
+    def extend_columns(self, lat: np.ndarray, lng: np.ndarray, micros: np.ndarray,
+                       speed: np.ndarray, altitude: np.ndarray, tz: Optional[tzinfo] = timezone.utc):
+        """Append many fixes from arrays, timestamps as epoch microseconds."""
+        if not self.micros:
+            self.tz = tz
+        self.lat.frombytes(np.asarray(lat, dtype=np.float64).tobytes())
+        self.lng.frombytes(np.asarray(lng, dtype=np.float64).tobytes())
+        self.micros.frombytes(np.asarray(micros, dtype=np.int64).tobytes())
+        self.speed.frombytes(np.asarray(speed, dtype=np.float64).tobytes())
+        self.altitude.frombytes(np.asarray(altitude, dtype=np.float64).tobytes())
+
+    def timestamp(self, i: int) -> datetime:
+        return from_micros(self.micros[i], self.tz)
+
+    def __len__(self) -> int:
+        return len(self.micros)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        return {
+            "lat": self.lat[i],
+            "lng": self.lng[i],
+            "timestamp": self.timestamp(i),
+            "speed": self.speed[i],
+            "altitude": self.altitude[i],
+        }
+
+    def __iter__(self):
+        return iter(self.to_dicts())
+
+    def to_dicts(self) -> List[Dict]:
+        """All fixes as location dicts, converting timestamps in one pass."""
+        timestamps = np.frombuffer(self.micros, dtype=np.int64).astype("datetime64[us]").tolist()
+        if self.tz is timezone.utc:
+            timestamps = [moment.replace(tzinfo=timezone.utc) for moment in timestamps]
+        elif self.tz is not None:
+            timestamps = [moment.replace(tzinfo=timezone.utc).astimezone(self.tz) for moment in timestamps]
+        return [
+            {"lat": lat, "lng": lng, "timestamp": timestamp, "speed": speed, "altitude": altitude}
+            for lat, lng, timestamp, speed, altitude in zip(
+                self.lat.tolist(), self.lng.tolist(), timestamps,
+                self.speed.tolist(), self.altitude.tolist()
+            )
+        ]
+
+    @property
+    def nbytes(self) -> int:
+        return len(self) * sum(column.itemsize for column in (self.lat, self.lng, self.micros, self.speed, self.altitude))
+
+
+def to_micros(moment: datetime) -> int:
+    """Epoch microseconds; naive datetimes are read as UTC."""
+    if moment.tzinfo is None:
+        return (moment - NAIVE_EPOCH) // MICROSECOND
+    return (moment - EPOCH) // MICROSECOND
+
+
+def from_micros(micros: int, tz: Optional[tzinfo] = timezone.utc) -> datetime:
+    if tz is None:
+        return NAIVE_EPOCH + timedelta(microseconds=int(micros))
+    moment = EPOCH + timedelta(microseconds=int(micros))
+    return moment if tz is timezone.utc else moment.astimezone(tz)
@@ -0,0 +1,206 @@
+from typing import Callable, Dict, List, Optional
+from datetime import datetime, timedelta
+import asyncio
+import random
+import time
+from sqlalchemy import func, or_, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import get_settings
+from app.core.metrics import metrics
+from app.db.session import AsyncSessionLocal
+from app.models.webhook_event import WebhookEvent
+from app.services.strava_ingest import StravaIngestService
+
+settings = get_settings()
+
+REQUIRED_FIELDS = ("object_type", "object_id", "aspect_type", "owner_id")
+
+
+class InvalidWebhookEvent(ValueError):
+    pass
+
+
+def validate_event(event: Dict) -> Dict:
+    """Check the shape of a Strava webhook payload."""
+    if not isinstance(event, dict):
+        raise InvalidWebhookEvent("Event must be a JSON object")
+    missing = [field for field in REQUIRED_FIELDS if field not in event]
+    if missing:
+        raise InvalidWebhookEvent(f"Missing fields: {', '.join(missing)}")
+    try:
+        int(event["object_id"])
+        int(event["owner_id"])
+    except (TypeError, ValueError):
+        raise InvalidWebhookEvent("object_id and owner_id must be integers")
+    return event
+
+
+def event_key(event: Dict) -> str:
+    return f"{event['object_type']}:{event['object_id']}:{event['aspect_type']}:{event.get('event_time', '')}"
+
+
+class WebhookQueue:
+    """Durable, database-backed queue for Strava webhook events.
+
+    Events are written to the `webhook_events` table by the webhook endpoint
+    and drained by a fixed pool of async workers. Failed events are retried
+    with exponential backoff and dead-lettered after `max_attempts`.
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable[[], AsyncSession] = AsyncSessionLocal,
+        ingest: Optional[StravaIngestService] = None,
+        workers: int = settings.WEBHOOK_WORKERS,
+        max_attempts: int = settings.WEBHOOK_MAX_ATTEMPTS,
+        retry_base: float = settings.WEBHOOK_RETRY_BASE_SECONDS,
+        retry_max: float = settings.WEBHOOK_RETRY_MAX_SECONDS,
+        poll_interval: float = settings.WEBHOOK_POLL_INTERVAL_SECONDS,
+        visibility_timeout: float = settings.WEBHOOK_VISIBILITY_TIMEOUT_SECONDS,
+    ):
+        self.session_factory = session_factory
+        self.ingest = ingest
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self.poll_interval = poll_interval
+        self.visibility_timeout = timedelta(seconds=visibility_timeout)
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._running = False
+
+    async def enqueue(self, db: AsyncSession, event: Dict) -> bool:
+        """Persist an event. Returns False if it was already queued."""
+        started = time.perf_counter()
+        db.add(WebhookEvent(event_key=event_key(event), payload=event))
+        try:
+            await db.commit()
+        except IntegrityError:
+            await db.rollback()
+            metrics.incr("webhook.duplicates")
+            return False
+        finally:
+            metrics.observe("webhook.enqueue", time.perf_counter() - started)
+        metrics.incr("webhook.enqueued")
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return True
+
+    async def start(self):
+        if self._running:
+            return
+        if self.ingest is None:
+            self.ingest = StravaIngestService()
+        self._running = True
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+
+    async def stop(self):
+        self._running = False
+        if self._wakeup is not None:
+            self._wakeup.set()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _worker(self, worker_id: int):
+        while self._running:
+            try:
+                event = await self._claim()
+            except Exception as e:
+                print(f"Webhook worker {worker_id} failed to claim an event: {e}")
+                event = None
+            if event is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._process(*event)
+
+    async def _claim(self) -> Optional[tuple]:
+        """Atomically move the oldest due event to PROCESSING."""
+        now = datetime.utcnow()
+        due = or_(
+            (WebhookEvent.status == WebhookEvent.PENDING) & (WebhookEvent.next_attempt_at <= now),
+            # Reclaim events whose worker died mid-flight
+            (WebhookEvent.status == WebhookEvent.PROCESSING) & (WebhookEvent.locked_at < now - self.visibility_timeout),
+        )
+        async with self.session_factory() as db:
+            candidates = (await db.scalars(
+                select(WebhookEvent.id).where(due).order_by(WebhookEvent.next_attempt_at).limit(self.workers)
+            )).all()
+            for event_id in candidates:
+                # The guarded UPDATE only succeeds for one claimant
+                claimed = (await db.execute(
+                    update(WebhookEvent)
+                    .where(WebhookEvent.id == event_id, due)
+                    .values(status=WebhookEvent.PROCESSING, locked_at=now)
+                )).rowcount
+                await db.commit()
+                if claimed:
+                    row = await db.get(WebhookEvent, event_id)
+                    metrics.observe("webhook.queue_wait", (now - row.created_at).total_seconds())
+                    return row.id, row.payload, row.attempts
+            return None
+
+    async def _process(self, event_id: int, payload: Dict, attempts: int):
+        started = time.perf_counter()
+        async with self.session_factory() as db:
+            try:
+                message = await self.ingest.process_event(db, payload)
+            except Exception as e:
+                await db.rollback()
+                await self._fail(db, event_id, attempts + 1, e)
+            else:
+                await db.execute(update(WebhookEvent).where(WebhookEvent.id == event_id).values(
+                    status=WebhookEvent.DONE,
+                    attempts=attempts + 1,
+                    last_error=None,
+                    finished_at=datetime.utcnow(),
+                ))
+                await db.commit()
+                metrics.incr("webhook.processed")
+                print(f"Webhook event {event_id} processed: {message}")
+        metrics.observe("webhook.process", time.perf_counter() - started)
+
+    async def _fail(self, db: AsyncSession, event_id: int, attempts: int, error: Exception):
+        print(f"Webhook event {event_id} failed (attempt {attempts}): {error}")
+        values = {"attempts": attempts, "last_error": str(error)[:500], "locked_at": None}
+        if attempts >= self.max_attempts:
+            values.update(status=WebhookEvent.DEAD, finished_at=datetime.utcnow())
+            metrics.incr("webhook.dead_lettered")
+        else:
+            delay = min(self.retry_base * 2 ** (attempts - 1), self.retry_max)
+            delay *= random.uniform(0.8, 1.2)
+            values.update(status=WebhookEvent.PENDING, next_attempt_at=datetime.utcnow() + timedelta(seconds=delay))
+            metrics.incr("webhook.retried")
+        await db.execute(update(WebhookEvent).where(WebhookEvent.id == event_id).values(**values))
+        await db.commit()
+
+    async def stats(self) -> Dict:
+        """Queue depth per status and the age of the oldest pending event."""
+        async with self.session_factory() as db:
+            counts = dict((await db.execute(
+                select(WebhookEvent.status, func.count(WebhookEvent.id)).group_by(WebhookEvent.status)
+            )).all())
+            oldest = await db.scalar(select(func.min(WebhookEvent.created_at)).where(
+                WebhookEvent.status.in_([WebhookEvent.PENDING, WebhookEvent.PROCESSING])
+            ))
+        return {
+            "depth": counts.get(WebhookEvent.PENDING, 0) + counts.get(WebhookEvent.PROCESSING, 0),
+            "pending": counts.get(WebhookEvent.PENDING, 0),
+            "processing": counts.get(WebhookEvent.PROCESSING, 0),
+            "dead": counts.get(WebhookEvent.DEAD, 0),
+            "done": counts.get(WebhookEvent.DONE, 0),
+            "lag_seconds": (datetime.utcnow() - oldest).total_seconds() if oldest else 0.0,
+            "workers": len(self._tasks),
+        }
+
+
+webhook_queue = WebhookQueue()
+metrics.gauge("webhook_queue", webhook_queue.stats)
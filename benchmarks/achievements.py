@@ -0,0 +1,118 @@
+"""Cost of checking milestones after each trip, with many definitions.
+
+Generates --definitions threshold achievements spread over --metrics
+metrics and feeds --users users --updates growing metric values each. The
+previous check loops over every definition and tests membership in the
+user's list of earned milestone dicts (here with the membership test fixed,
+the old one never matched and re-awarded every milestone on every trip).
+The engine keeps sorted thresholds and a next-threshold pointer per metric.
+Both must award the same achievements; also reports stored bytes per user.
+
+    python -m benchmarks.achievements --definitions 5000 --users 100 --updates 50
+"""
+import argparse
+import json
+import os
+import random
+import time
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--definitions", type=int, default=5000)
+parser.add_argument("--metrics", type=int, default=5)
+parser.add_argument("--users", type=int, default=100)
+parser.add_argument("--updates", type=int, default=50, help="trips per user")
+args = parser.parse_args()
+
+os.environ.setdefault("SECRET_KEY", "benchmark")
+
+from app.services.gamification import Achievement, AchievementEngine  # noqa: E402
+
+MAX_VALUE = 10_000
+
+
+def definitions(rng: random.Random):
+    metrics = [f"metric_{m}" for m in range(args.metrics)]
+    return [
+        Achievement(
+            id=f"achievement_{bit}", name=f"Achievement {bit}", description="", points=0, icon="",
+            metric=rng.choice(metrics), threshold=rng.randint(1, MAX_VALUE), bit=bit,
+        )
+        for bit in range(args.definitions)
+    ]
+
+
+def value_streams(rng: random.Random, metrics):
+    """Per user, the metric values after each trip; users reach up to 5% of the ladder."""
+    streams = []
+    for _ in range(args.users):
+        step = rng.uniform(0, 0.05 * MAX_VALUE / args.updates)
+        streams.append([{metric: step * (i + 1) for metric in metrics} for i in range(args.updates)])
+    return streams
+
+
+def scan(achievements, streams):
+    """The loop update_user_stats used: every definition, list membership on each trip."""
+    by_metric = {}
+    for achievement in achievements:
+        by_metric.setdefault(achievement.metric, []).append(
+            {"amount": achievement.threshold, "title": achievement.name, "message": achievement.description}
+        )
+    earned = []
+    for stream in streams:
+        achieved = []
+        for values in stream:
+            for metric, milestones in by_metric.items():
+                for milestone in milestones:
+                    if milestone["amount"] <= values[metric]:
+                        new = {**milestone, "type": metric}
+                        if new not in achieved:
+                            achieved.append(new)
+        earned.append(achieved)
+    return earned
+
+
+def engine_run(engine: AchievementEngine, streams):
+    earned = []
+    for stream in streams:
+        progress = engine.progress()
+        for values in stream:
+            engine.evaluate(progress, values)
+        earned.append(progress)
+    return earned
+
+
+def main():
+    rng = random.Random(7)
+    achievements = definitions(rng)
+    metrics = sorted({a.metric for a in achievements})
+    streams = value_streams(rng, metrics)
+    updates = args.users * args.updates
+
+    started = time.perf_counter()
+    engine = AchievementEngine(achievements)
+    build = time.perf_counter() - started
+
+    started = time.perf_counter()
+    new = engine_run(engine, streams)
+    fast = time.perf_counter() - started
+    started = time.perf_counter()
+    old = scan(achievements, streams)
+    slow = time.perf_counter() - started
+
+    for progress, achieved in zip(new, old):
+        assert sorted((engine.by_bit[bit].metric, engine.by_bit[bit].threshold) for bit in progress.bits()) == \
+            sorted((m["type"], m["amount"]) for m in achieved)
+    earned = sum(len(progress.bits()) for progress in new) / args.users
+    bits_bytes = sum(len(json.dumps(progress.bits())) for progress in new) / args.users
+    dicts_bytes = sum(len(json.dumps(achieved)) for achieved in old) / args.users
+
+    print(f"{args.definitions:,} definitions over {args.metrics} metrics, {args.users:,} users x "
+          f"{args.updates} trips, {earned:,.0f} earned per user on average")
+    print(f"engine build      {build * 1000:>10,.1f} ms")
+    print(f"scan              {slow / updates * 1e6:>10,.1f} us/update")
+    print(f"sorted thresholds {fast / updates * 1e6:>10,.1f} us/update  ({slow / fast:,.0f}x)")
+    print(f"stored per user   {bits_bytes:>10,.0f} bytes as bits, {dicts_bytes:,.0f} bytes as milestone dicts")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""Peak memory of GET /activities: loading the full list versus streaming.
+
+For each history size, compares Python heap peak (tracemalloc) and wall
+time of the old ORM `.all()` + list response against draining the NDJSON
+stream the endpoint now serves. The streaming peak should stay flat as history grows.
+
+    python -m benchmarks.activities_stream --sizes 1000 10000 100000
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+args = parser.parse_args()
+
+workdir = tempfile.mkdtemp()
+os.environ.setdefault("SECRET_KEY", "benchmark")
+os.environ["DATABASE_URL"] = f"sqlite:///{workdir}/bench.db"
+
+from sqlalchemy import insert, select  # noqa: E402
+from app.api.endpoints import _activities_query, _stream_activities  # noqa: E402
+from app.db.init_db import init_db  # noqa: E402
+from app.db.session import AsyncSessionLocal, async_engine, engine  # noqa: E402
+from app.models.activity import Activity  # noqa: E402
+from app.models.user import User  # noqa: E402
+
+
+def seed(user_id: int, count: int):
+    start = datetime(2020, 1, 1)
+    with engine.begin() as conn:
+        conn.execute(insert(Activity), [{
+            "user_id": user_id,
+            "activity_type": "walking",
+            "distance": 1.5,
+            "duration": 900,
+            "carbon_impact": 0.3,
+            "start_time": start + timedelta(minutes=i),
+            "end_time": start + timedelta(minutes=i + 15),
+        } for i in range(count)])
+
+
+async def full_list(user_id: int) -> int:
+    async with AsyncSessionLocal() as db:
+        activities = (await db.scalars(
+            select(Activity).where(Activity.user_id == user_id).order_by(Activity.start_time.desc())
+        )).all()
+        body = [{
+            "id": a.id,
+            "activity_type": a.activity_type,
+            "distance": a.distance,
+            "duration": a.duration,
+            "carbon_impact": a.carbon_impact,
+            "timestamp": a.start_time.isoformat(),
+        } for a in activities]
+        return len(body)
+
+
+async def streamed(user_id: int) -> int:
+    lines = 0
+    async for chunk in _stream_activities(_activities_query(user_id, None, None), None, ndjson=True):
+        lines += chunk.count("\n")
+    return lines
+
+
+async def measure(func, user_id: int):
+    # tracemalloc slows allocation-heavy code, so time a separate untraced run
+    started = time.perf_counter()
+    count = await func(user_id)
+    elapsed = time.perf_counter() - started
+    tracemalloc.start()
+    await func(user_id)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return count, elapsed, peak
+
+
+async def main():
+    init_db().close()
+    print(f"{'rows':>8} {'mode':<8} {'peak MiB':>9} {'seconds':>8}")
+    for user_id, size in enumerate(args.sizes, start=1):
+        with engine.begin() as conn:
+            conn.execute(insert(User), [{"id": user_id, "email": f"u{user_id}@example.com", "hashed_password": "x"}])
+        seed(user_id, size)
+        for name, func in (("list", full_list), ("stream", streamed)):
+            count, elapsed, peak = await measure(func, user_id)
+            assert count == size, (name, count)
+            print(f"{size:>8} {name:<8} {peak / 2**20:>9.1f} {elapsed:>8.2f}")
+    await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,83 @@
+"""Model calls and latency of AI insights with repeated activity summaries.
+
+Sends --requests analyze_activities calls, drawn with a skew from
+--summaries distinct activity lists, to the stub model answering after
+--latency seconds. Without the analyzer every request is its own model
+call, all at once; with it, equal summaries share one call, at most
+--concurrency at a time. A second analyzer over the same cache file then
+replays the requests, as a restarted process would.
+
+    python -m benchmarks.ai_insights --requests 2000 --summaries 200 --latency 0.2
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--requests", type=int, default=2000)
+parser.add_argument("--summaries", type=int, default=200)
+parser.add_argument("--latency", type=float, default=0.2, help="seconds per model call")
+parser.add_argument("--concurrency", type=int, default=8)
+args = parser.parse_args()
+
+os.environ.setdefault("SECRET_KEY", "benchmark")
+
+from app.services.ai_analyzer import ANALYSIS_SYSTEM, AIAnalyzer, InsightCache, StubBackend  # noqa: E402
+
+MODES = ["car", "bus", "train", "bike", "walk"]
+
+
+def workload(rng: random.Random):
+    summaries = [
+        [{"activity_type": rng.choice(MODES), "description": f"trip {t}", "carbon_impact": round(rng.uniform(0, 5), 2)}
+         for t in range(rng.randint(1, 10))]
+        for _ in range(args.summaries)
+    ]
+    # Some summaries are far more common than others, e.g. a single daily commute
+    weights = [1 / (rank + 1) for rank in range(args.summaries)]
+    requests = []
+    for activities in rng.choices(summaries, weights, k=args.requests):
+        shuffled = activities[:]
+        rng.shuffle(shuffled)  # the same activities, listed in another order
+        requests.append(shuffled)
+    return requests
+
+
+async def timed(name: str, calls, backend: StubBackend):
+    latencies = []
+
+    async def one(call):
+        started = time.perf_counter()
+        await call
+        latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(call) for call in calls))
+    seconds = time.perf_counter() - started
+    latencies.sort()
+    print(f"{name:<22} {backend.calls:>6,} model calls  {seconds:>6.2f}s  "
+          f"p50 {latencies[len(latencies) // 2] * 1000:>6.0f} ms  p99 {latencies[int(len(latencies) * 0.99)] * 1000:>6.0f} ms")
+
+
+async def main():
+    requests = workload(random.Random(7))
+    path = os.path.join(tempfile.mkdtemp(), "ai_cache.db")
+    print(f"{args.requests:,} requests over {args.summaries:,} summaries, {args.latency * 1000:.0f} ms per model call")
+
+    direct = StubBackend(args.latency)
+    await timed("direct", [
+        direct.complete("gpt-4", ANALYSIS_SYSTEM, repr(activities), 0.7, 1000) for activities in requests
+    ], direct)
+
+    for name in ("cold cache", "restarted, disk cache"):
+        backend = StubBackend(args.latency)
+        analyzer = AIAnalyzer(backend=backend, cache=InsightCache(path=path), max_concurrency=args.concurrency)
+        await timed(name, [analyzer.analyze_activities(activities) for activities in requests], backend)
+        analyzer.cache.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
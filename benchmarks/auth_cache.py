@@ -0,0 +1,81 @@
+"""Cost of resolving the authenticated user per request.
+
+Compares the old path (decode the JWT, then SELECT the user by email) with
+get_current_user on cached token subjects and with the cached snapshot that
+read-only endpoints use, over --requests requests spread across --users
+users (a few users make most requests). Temporary SQLite database.
+
+    python -m benchmarks.auth_cache --users 1000 --requests 20000
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--users", type=int, default=1000)
+parser.add_argument("--requests", type=int, default=20000)
+args = parser.parse_args()
+
+workdir = tempfile.mkdtemp()
+os.environ.setdefault("SECRET_KEY", "benchmark")
+os.environ.setdefault("ALGORITHM", "HS256")
+os.environ["DATABASE_URL"] = f"sqlite:///{workdir}/bench.db"
+
+from sqlalchemy import insert  # noqa: E402
+from app.api.endpoints import create_access_token  # noqa: E402
+from app.auth.dependencies import get_current_user, get_current_user_snapshot  # noqa: E402
+from app.auth.user_cache import user_cache  # noqa: E402
+from app.db.init_db import init_db  # noqa: E402
+from app.db.session import AsyncSessionLocal, async_engine, engine  # noqa: E402
+from app.models.user import User  # noqa: E402
+
+
+def seed():
+    with engine.begin() as conn:
+        conn.execute(insert(User), [
+            {"email": f"user{i}@example.com", "full_name": f"User {i}", "points": i}
+            for i in range(args.users)
+        ])
+
+
+async def timed(resolve, tokens) -> float:
+    started = time.perf_counter()
+    for token in tokens:
+        await resolve(token)
+    return (time.perf_counter() - started) / len(tokens)
+
+
+async def with_session(token):
+    async with AsyncSessionLocal() as db:
+        return await get_current_user(token, db)
+
+
+async def main():
+    init_db()
+    seed()
+    tokens = [create_access_token({"sub": f"user{i}@example.com"}) for i in range(args.users)]
+    rng = random.Random(7)
+    weights = [1 / (rank + 1) for rank in range(args.users)]
+    requests = rng.choices(tokens, weights=weights, k=args.requests)
+
+    # Snapshots first, starting from a cold cache
+    snapshot = await timed(get_current_user_snapshot, requests)
+    subjects = await timed(with_session, requests)
+    ttl = user_cache.ttl
+    user_cache.ttl = 0
+    uncached = await timed(with_session, requests)
+    user_cache.ttl = ttl
+
+    print(f"{args.requests:,} requests from {args.users:,} users, TTL {ttl:g}s")
+    print(f"decode + SELECT           {uncached * 1e6:>8,.0f} us/request")
+    print(f"cached subject + SELECT   {subjects * 1e6:>8,.0f} us/request")
+    print(f"cached snapshot           {snapshot * 1e6:>8,.0f} us/request  "
+          f"(hit ratio {user_cache.stats()['hit_ratio']:.1%}, {uncached / snapshot:.0f}x)")
+    await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
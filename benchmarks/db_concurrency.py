@@ -0,0 +1,114 @@
+"""Concurrent request latency with the sync Session versus AsyncSession.
+
+Each simulated request runs the GET /activities query. A slow query is
+emulated with a SQLite function that sleeps, standing in for lock waits or
+a cold page cache. While the requests run, a probe task measures how long
+the event loop is stalled, which is what a webhook ack would wait for.
+
+    python -m benchmarks.db_concurrency --requests 200 --query-ms 5
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--requests", type=int, default=200)
+parser.add_argument("--query-ms", type=float, default=5.0)
+parser.add_argument("--activities", type=int, default=200)
+args = parser.parse_args()
+
+workdir = tempfile.mkdtemp()
+os.environ.setdefault("SECRET_KEY", "benchmark")
+os.environ["DATABASE_URL"] = f"sqlite:///{workdir}/bench.db"
+
+from sqlalchemy import event, func, select  # noqa: E402
+from app.db.init_db import init_db  # noqa: E402
+from app.db.session import AsyncSessionLocal, SessionLocal, async_engine, engine  # noqa: E402
+from app.models.activity import Activity  # noqa: E402
+from app.models.user import User  # noqa: E402
+
+
+def _register_sleep(dbapi_connection, connection_record):
+    dbapi_connection.create_function("bench_sleep", 1, lambda ms: time.sleep(ms / 1000) or 0)
+
+
+event.listen(engine, "connect", _register_sleep)
+event.listen(async_engine.sync_engine, "connect", _register_sleep)
+
+
+def activities_query(user_id):
+    return select(Activity).where(
+        Activity.user_id == user_id,
+        # Uncorrelated scalar subquery: evaluated once per query, not per row
+        select(func.bench_sleep(args.query_ms)).scalar_subquery() == 0
+    ).order_by(Activity.start_time.desc())
+
+
+async def sync_request(user_id):
+    db = SessionLocal()
+    try:
+        return len(db.scalars(activities_query(user_id)).all())
+    finally:
+        db.close()
+
+
+async def async_request(user_id):
+    async with AsyncSessionLocal() as db:
+        return len((await db.scalars(activities_query(user_id))).all())
+
+
+async def probe(stop: asyncio.Event, lags: list):
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(0.001)
+        lags.append(time.perf_counter() - started - 0.001)
+
+
+async def run(request, user_id):
+    stop = asyncio.Event()
+    lags = []
+    probe_task = asyncio.create_task(probe(stop, lags))
+    latencies = []
+
+    # All requests arrive together, so latency counts from the burst start
+    started = time.perf_counter()
+
+    async def timed():
+        await request(user_id)
+        latencies.append(time.perf_counter() - started)
+
+    await asyncio.gather(*[timed() for _ in range(args.requests)])
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await probe_task
+    latencies.sort()
+    return elapsed, latencies, max(lags) if lags else 0.0
+
+
+async def main():
+    init_db()
+    db = SessionLocal()
+    user = User(email="bench@example.com")
+    db.add(user)
+    db.commit()
+    db.add_all([Activity(user_id=user.id, activity_type="WALKING", distance=1000.0, duration=600,
+                         carbon_impact=0.2) for _ in range(args.activities)])
+    db.commit()
+    user_id = user.id
+    db.close()
+
+    print(f"{args.requests} concurrent requests, {args.query_ms:.0f}ms per query")
+    for name, request in (("sync Session", sync_request), ("AsyncSession", async_request)):
+        elapsed, latencies, max_stall = await run(request, user_id)
+        p99 = latencies[int(len(latencies) * 0.99) - 1]
+        print(
+            f"{name:<13} total={elapsed:6.2f}s  p50={statistics.median(latencies) * 1000:7.1f}ms  "
+            f"p99={p99 * 1000:7.1f}ms  max event loop stall={max_stall * 1000:7.1f}ms"
+        )
+    await async_engine.dispose()
+
+
+asyncio.run(main())
@@ -0,0 +1,63 @@
+"""Cost of computing trip emissions one call at a time versus in arrays.
+
+The previous calculate_transport_impact built its factor dict on every
+call. The registry compiles each region's factors into a list and an array
+indexed by EmissionMode once, so the scalar path is a lookup and batches
+go through calculate_many. All three must agree.
+
+    python -m benchmarks.emission_factors --trips 1000000
+"""
+import argparse
+import os
+import random
+import time
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--trips", type=int, default=1_000_000)
+args = parser.parse_args()
+
+os.environ.setdefault("SECRET_KEY", "benchmark")
+
+import numpy as np  # noqa: E402
+from app.services.carbon_calculator import CarbonCalculator  # noqa: E402
+
+MODES = ["car", "bus", "train", "bike", "walk"]
+
+
+def dict_per_call(distance: float, mode: str) -> float:
+    """calculate_transport_impact before the registry."""
+    emissions_factors = {
+        "car": 0.2,  # kg CO2 per km
+        "bus": 0.08,
+        "train": 0.04,
+        "bike": 0,
+        "walk": 0,
+    }
+    return distance * emissions_factors.get(mode, 0.2)
+
+
+def main():
+    rng = random.Random(7)
+    distances = [rng.uniform(0.5, 30) for _ in range(args.trips)]
+    modes = [rng.choice(MODES) for _ in range(args.trips)]
+    calculator = CarbonCalculator()
+
+    started = time.perf_counter()
+    old = [dict_per_call(d, m) for d, m in zip(distances, modes)]
+    slow = time.perf_counter() - started
+    started = time.perf_counter()
+    scalar = [calculator.calculate_transport_impact(d, m) for d, m in zip(distances, modes)]
+    lookup = time.perf_counter() - started
+    started = time.perf_counter()
+    batch = calculator.calculate_many(np.array(distances), modes)
+    vectorized = time.perf_counter() - started
+
+    assert old == scalar and np.array_equal(np.array(old), batch)
+    print(f"{args.trips:,} trips")
+    print(f"dict per call    {slow / args.trips * 1e9:>8,.0f} ns/trip")
+    print(f"registry lookup  {lookup / args.trips * 1e9:>8,.0f} ns/trip  ({slow / lookup:.1f}x)")
+    print(f"calculate_many   {vectorized / args.trips * 1e9:>8,.0f} ns/trip  ({slow / vectorized:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""Leaderboard operations at scale: incremental sorted index versus ORDER BY.
+
+Loads --users random scores into the in-process store, then measures
+incremental updates (what an awarded activity costs), single-user rank
+lookups and top-k pages at random offsets. For comparison it times the
+naive approach on SQLite: ORDER BY points LIMIT k for a page and a
+COUNT(*) of higher scores for one user's rank.
+
+    python -m benchmarks.leaderboard --users 1000000
+"""
+import argparse
+import asyncio
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--users", type=int, default=1_000_000)
+parser.add_argument("--ops", type=int, default=20000)
+parser.add_argument("--page-size", type=int, default=50)
+parser.add_argument("--sql-ops", type=int, default=20)
+args = parser.parse_args()
+
+workdir = tempfile.mkdtemp()
+os.environ.setdefault("SECRET_KEY", "benchmark")
+os.environ["DATABASE_URL"] = f"sqlite:///{workdir}/bench.db"
+
+from app.services.leaderboard import MemoryLeaderboardStore  # noqa: E402
+
+BOARD = "global:points"
+
+
+async def timed(label: str, count: int, op):
+    latencies = []
+    started = time.perf_counter()
+    for _ in range(count):
+        t = time.perf_counter()
+        await op()
+        latencies.append(time.perf_counter() - t)
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    p99 = latencies[int(len(latencies) * 0.99) - 1] if len(latencies) > 1 else latencies[0]
+    print(f"{label:<28} {count / elapsed:>12,.0f} ops/s   p50 {statistics.median(latencies) * 1e6:>9.1f} us   p99 {p99 * 1e6:>9.1f} us")
+
+
+async def bench_store(scores):
+    store = MemoryLeaderboardStore()
+    started = time.perf_counter()
+    await store.load(BOARD, enumerate(scores, start=1))
+    print(f"{'bulk load':<28} {time.perf_counter() - started:>12.2f} s for {len(scores):,} users")
+
+    async def update():
+        await store.incr(BOARD, random.randint(1, args.users), random.randint(10, 5000))
+
+    async def rank():
+        await store.rank(BOARD, random.randint(1, args.users))
+
+    async def page():
+        await store.top(BOARD, random.randint(0, args.users - args.page_size), args.page_size)
+
+    await timed("incremental update", args.ops, update)
+    await timed("rank lookup", args.ops, rank)
+    await timed(f"top-{args.page_size} page", args.ops, page)
+
+
+async def bench_sql(scores):
+    conn = sqlite3.connect(f"{workdir}/naive.db")
+    conn.execute("CREATE TABLE users (id INTEGER PRIMARY KEY, points INTEGER)")
+    conn.executemany("INSERT INTO users VALUES (?, ?)", enumerate(scores, start=1))
+    conn.commit()
+
+    async def page():
+        conn.execute("SELECT id, points FROM users ORDER BY points DESC LIMIT ?", (args.page_size,)).fetchall()
+
+    async def rank():
+        user_id = random.randint(1, args.users)
+        conn.execute(
+            "SELECT COUNT(*) FROM users WHERE points > (SELECT points FROM users WHERE id = ?)", (user_id,)
+        ).fetchone()
+
+    await timed(f"naive SQL top-{args.page_size}", args.sql_ops, page)
+    await timed("naive SQL rank", args.sql_ops, rank)
+    conn.close()
+
+
+async def main():
+    random.seed(42)
+    scores = [random.randint(0, 10_000_000) for _ in range(args.users)]
+    await bench_store(scores)
+    if args.sql_ops:
+        await bench_sql(scores)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
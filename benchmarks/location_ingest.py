@@ -0,0 +1,104 @@
+"""Per-point cost of location ingest: one POST per fix versus WebSocket batches.
+
+Runs the app in-process (Starlette TestClient, temporary SQLite file) and
+sends the same 1 Hz stream of walks and pauses through POST
+/api/user/location and through /api/ws/locations at several batch sizes,
+reporting microseconds per fix and the trip events pushed back.
+
+    python -m benchmarks.location_ingest --points 3000 --batch-sizes 1 10 100 1000
+"""
+import argparse
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--points", type=int, default=3000)
+parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 10, 100, 1000])
+args = parser.parse_args()
+
+workdir = tempfile.mkdtemp()
+os.environ.setdefault("SECRET_KEY", "benchmark")
+os.environ.setdefault("ALGORITHM", "HS256")
+os.environ["DATABASE_URL"] = f"sqlite:///{workdir}/bench.db"
+
+from fastapi.testclient import TestClient  # noqa: E402
+from app.main import app  # noqa: E402
+
+START = datetime(2024, 5, 1, 8, tzinfo=timezone.utc)
+
+
+def stream(count: int, day: int):
+    """Walk 10 minutes, go quiet for 6 (phones stop reporting when still), repeat.
+
+    The STILL fix after each quiet spell ends the trip.
+    """
+    fixes = []
+    lat = 52.37
+    second = 0
+    for i in range(count):
+        still = i % 601 == 600
+        if still:
+            second += 360
+        else:
+            lat += 1.3e-5
+        fixes.append({
+            "latitude": lat,
+            "longitude": 4.89,
+            "speed": 0.0 if still else 1.4,
+            "activity_type": "STILL" if still else "WALKING",
+            "timestamp": (START + timedelta(days=day, seconds=second)).isoformat(),
+        })
+        second += 1
+    return fixes
+
+
+def register(client: TestClient, email: str) -> str:
+    client.post("/api/register", json={"email": email, "password": "benchmark", "full_name": email})
+    response = client.post("/api/token", data={"username": email, "password": "benchmark"})
+    return response.json()["access_token"]
+
+
+def per_request(client: TestClient, token: str, fixes) -> int:
+    headers = {"Authorization": f"Bearer {token}"}
+    trips = 0
+    for fix in fixes:
+        trip = client.post("/api/user/location", json=fix, headers=headers).json()["trip"]
+        trips += bool(trip and "transport_mode" in trip)
+    return trips
+
+
+def websocket(client: TestClient, token: str, fixes, batch_size: int) -> int:
+    trips = 0
+    with client.websocket_connect(f"/api/ws/locations?token={token}") as ws:
+        for seq, i in enumerate(range(0, len(fixes), batch_size)):
+            ws.send_json({"seq": seq, "locations": fixes[i:i + batch_size]})
+            while True:
+                event = ws.receive_json()
+                if event["type"] == "ack":
+                    assert event["seq"] == seq
+                    break
+                trips += event["type"] == "trip_completed"
+    return trips
+
+
+def main():
+    with TestClient(app) as client:
+        runs = [("POST per fix", lambda token, fixes: per_request(client, token, fixes))]
+        runs += [
+            (f"WebSocket x{size}", lambda token, fixes, size=size: websocket(client, token, fixes, size))
+            for size in args.batch_sizes
+        ]
+        print(f"{args.points} fixes per run")
+        for day, (name, run) in enumerate(runs):
+            token = register(client, f"bench{day}@example.com")
+            fixes = stream(args.points, day)
+            started = time.perf_counter()
+            trips = run(token, fixes)
+            seconds = time.perf_counter() - started
+            print(f"{name:<16} {seconds / len(fixes) * 1e6:>10,.0f} us/fix  {trips} trips completed")
+
+
+if __name__ == "__main__":
+    main()
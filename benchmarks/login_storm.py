@@ -0,0 +1,112 @@
+"""Latency of ordinary requests while a login storm is running.
+
+Runs the app in-process (httpx over ASGI, temporary SQLite file). --logins
+clients log in back to back while stats clients send GET /api/user/stats at
+--stats-rate requests per second. Each run swaps in a password hasher: the
+old setup (bcrypt on the shared threadpool, 40 threads, nothing rejected)
+and the bounded pool with --workers threads and --max-queue waiting hashes.
+Reports p50/p99 per request type and the logins turned away with 503.
+
+    python -m benchmarks.login_storm --logins 200 --seconds 10 --rounds 10
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--logins", type=int, default=200, help="concurrent login clients")
+parser.add_argument("--stats-rate", type=float, default=100.0, help="stats requests per second")
+parser.add_argument("--seconds", type=float, default=10.0)
+parser.add_argument("--rounds", type=int, default=10, help="bcrypt cost")
+parser.add_argument("--workers", type=int, default=2)
+parser.add_argument("--max-queue", type=int, default=32)
+args = parser.parse_args()
+
+workdir = tempfile.mkdtemp()
+os.environ.setdefault("SECRET_KEY", "benchmark")
+os.environ.setdefault("ALGORITHM", "HS256")
+os.environ["DATABASE_URL"] = f"sqlite:///{workdir}/bench.db"
+
+import httpx  # noqa: E402
+from app.api import endpoints  # noqa: E402
+from app.auth.passwords import PasswordHasher  # noqa: E402
+from app.db.session import async_engine  # noqa: E402
+from app.main import app  # noqa: E402
+
+PASSWORD = "benchmark"
+
+
+def percentile(values, fraction: float) -> float:
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)] * 1000 if values else 0.0
+
+
+async def login_client(client: httpx.AsyncClient, email: str, deadline: float, latencies, rejected):
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        response = await client.post("/api/token", data={"username": email, "password": PASSWORD})
+        if response.status_code == 503:
+            rejected.append(1)
+            await asyncio.sleep(float(response.headers.get("Retry-After", 1)))
+            continue
+        latencies.append(time.perf_counter() - started)
+
+
+async def stats_request(client: httpx.AsyncClient, headers, latencies):
+    started = time.perf_counter()
+    response = await client.get("/api/user/stats", headers=headers)
+    response.raise_for_status()
+    latencies.append(time.perf_counter() - started)
+
+
+async def run(client: httpx.AsyncClient, name: str, hasher: PasswordHasher, users, headers):
+    endpoints.password_hasher = hasher
+    logins, stats, rejected = [], [], []
+    started = time.perf_counter()
+    deadline = started + args.seconds
+    storm = [
+        asyncio.create_task(login_client(client, users[i % len(users)], deadline, logins, rejected))
+        for i in range(args.logins)
+    ]
+    rng = random.Random(7)
+    requests = []
+    while time.perf_counter() < deadline:
+        requests.append(asyncio.create_task(stats_request(client, headers, stats)))
+        await asyncio.sleep(rng.expovariate(args.stats_rate))
+    await asyncio.gather(*storm, *requests)
+    seconds = time.perf_counter() - started  # includes draining logins still queued at the deadline
+    hasher.shutdown()
+    print(f"{name:<22} stats p50 {percentile(stats, 0.5):>7,.1f} ms  p99 {percentile(stats, 0.99):>7,.1f} ms  | "
+          f"logins {len(logins) / seconds:>5,.1f}/s  p99 {percentile(logins, 0.99):>7,.0f} ms  "
+          f"rejected {len(rejected):,}")
+
+
+async def main():
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        endpoints.password_hasher = PasswordHasher(rounds=args.rounds)
+        users = []
+        for i in range(20):
+            email = f"storm{i}@example.com"
+            await client.post("/api/register", json={"email": email, "password": PASSWORD, "full_name": email})
+            users.append(email)
+        await client.post("/api/register", json={"email": "reader@example.com", "password": PASSWORD,
+                                                 "full_name": "Reader"})
+        token = (await client.post("/api/token", data={"username": "reader@example.com",
+                                                       "password": PASSWORD})).json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+
+        print(f"{args.logins} login clients, {args.stats_rate:g} stats/s, {args.seconds:g}s per run, "
+              f"bcrypt cost {args.rounds}")
+        await run(client, "shared threadpool", PasswordHasher(args.rounds, workers=40, max_queue=10 ** 9),
+                  users, headers)
+        await run(client, f"{args.workers} workers, queue {args.max_queue}",
+                  PasswordHasher(args.rounds, workers=args.workers, max_queue=args.max_queue), users, headers)
+    await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
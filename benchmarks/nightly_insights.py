@@ -0,0 +1,107 @@
+"""Nightly insights batch against the stub model, and the reads it saves.
+
+Seeds --users users with --trips trips each over the last 16 weeks and
+runs the batch three times: from scratch, again with nothing changed, and
+after --changed of the users record one more trip. Each run reports the
+users it analyzed and the model calls it made. Then compares reading the
+stored insights with generating them on request.
+
+    python -m benchmarks.nightly_insights --users 2000 --trips 50 --latency 0.2
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--users", type=int, default=2000)
+parser.add_argument("--trips", type=int, default=50, help="per user")
+parser.add_argument("--changed", type=float, default=0.1, help="share of users with a new trip before the last run")
+parser.add_argument("--latency", type=float, default=0.2, help="seconds per model call")
+parser.add_argument("--concurrency", type=int, default=32)
+args = parser.parse_args()
+
+workdir = tempfile.mkdtemp()
+os.environ.setdefault("SECRET_KEY", "benchmark")
+os.environ["DATABASE_URL"] = f"sqlite:///{workdir}/bench.db"
+
+from sqlalchemy import insert  # noqa: E402
+from app.db.init_db import init_db  # noqa: E402
+from app.db.session import AsyncSessionLocal, async_engine, engine  # noqa: E402
+from app.models.activity import Activity  # noqa: E402
+from app.models.user import User  # noqa: E402
+from app.models.user_insight import UserInsight  # noqa: E402
+from app.services.ai_analyzer import AIAnalyzer, InsightCache, StubBackend  # noqa: E402
+from app.services.nightly_insights import InsightsBatch, trip_features  # noqa: E402
+
+MODES = ["WALKING", "RUNNING", "CYCLING"]
+NOW = datetime(2024, 6, 1)
+
+
+def trip(rng: random.Random, user_id: int, start_time: datetime):
+    distance = rng.uniform(500, 30_000)
+    return {
+        "user_id": user_id, "activity_type": rng.choice(MODES), "distance": distance,
+        "duration": int(distance / 3), "carbon_impact": distance * 0.2, "start_time": start_time,
+    }
+
+
+def seed(rng: random.Random):
+    with engine.begin() as conn:
+        conn.execute(insert(User), [{"email": f"user{i}@example.com"} for i in range(args.users)])
+        conn.execute(insert(Activity), [
+            trip(rng, user_id, NOW - timedelta(minutes=rng.randint(1, 16 * 7 * 24 * 60)))
+            for user_id in range(1, args.users + 1) for _ in range(args.trips)
+        ])
+
+
+async def timed_run(name: str, batch: InsightsBatch, backend: StubBackend):
+    calls = backend.calls
+    started = time.perf_counter()
+    stats = await batch.run()
+    seconds = time.perf_counter() - started
+    print(f"{name:<22} {seconds:>6.2f}s  {stats['candidates']:>6,} candidates  {stats['analyzed']:>6,} analyzed  "
+          f"{backend.calls - calls:>6,} model calls  {stats['failed']} failed")
+    return stats
+
+
+async def main():
+    rng = random.Random(7)
+    init_db().close()
+    seed(rng)
+    backend = StubBackend(args.latency)
+    analyzer = AIAnalyzer(backend=backend, cache=InsightCache(path=None), max_concurrency=args.concurrency)
+    batch = InsightsBatch(analyzer, concurrency=args.concurrency, clock=lambda: NOW)
+    print(f"{args.users:,} users x {args.trips} trips, {args.latency * 1000:.0f} ms per model call")
+
+    first = await timed_run("first run", batch, backend)
+    assert first["analyzed"] == args.users
+    unchanged = await timed_run("nothing changed", batch, backend)
+    assert unchanged["candidates"] == 0
+    changed = rng.sample(range(1, args.users + 1), int(args.users * args.changed))
+    with engine.begin() as conn:
+        conn.execute(insert(Activity), [trip(rng, user_id, NOW - timedelta(hours=1)) for user_id in changed])
+    again = await timed_run(f"{len(changed):,} users changed", batch, backend)
+    assert again["analyzed"] == len(changed)
+
+    reads = min(args.users, 1000)
+    started = time.perf_counter()
+    async with AsyncSessionLocal() as db:
+        for user_id in range(1, reads + 1):
+            assert (await db.get(UserInsight, user_id)).insights is not None
+            db.expunge_all()
+    stored = (time.perf_counter() - started) / reads
+    features = trip_features([], NOW, batch.weeks)
+    started = time.perf_counter()
+    await StubBackend(args.latency).complete(analyzer.model, "", repr(features), 0.7, 1000)
+    on_request = time.perf_counter() - started
+    print(f"read stored insights {stored * 1000:>8.2f} ms per request")
+    print(f"generate on request  {on_request * 1000:>8.2f} ms per request, model latency alone")
+    await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,126 @@
+"""Route storage size and simplification speed.
+
+Generates noisy 1 Hz GPS tracks and reports the bytes per route as raw
+doubles, as an encoded polyline and simplified then encoded, the encode,
+decode and simplifier throughput, and the largest distance of any raw fix
+from its simplified route, which must stay within --tolerance.
+
+    python -m benchmarks.polyline --routes 200 --points 3600 --tolerance 5
+"""
+import argparse
+import math
+import os
+import random
+import time
+
+import numpy as np
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--routes", type=int, default=200)
+parser.add_argument("--points", type=int, default=3600, help="fixes per route")
+parser.add_argument("--tolerance", type=float, default=5.0, help="meters")
+args = parser.parse_args()
+
+os.environ.setdefault("SECRET_KEY", "benchmark")
+
+from app.services import polyline  # noqa: E402
+from app.services.route_simplifier import METERS_PER_DEGREE, RouteSimplifier  # noqa: E402
+from app.services.activity_tracker import ROUTE_UPDATE_EVERY  # noqa: E402
+
+
+def synthetic_route(rng: random.Random):
+    """A walk or ride with gentle turns, corners and drifting GPS error of a few meters."""
+    lat, lng = 52.37 + rng.uniform(-0.1, 0.1), 4.89 + rng.uniform(-0.1, 0.1)
+    heading = rng.uniform(0, 2 * math.pi)
+    speed = rng.choice([1.4, 5.5])
+    lats, lngs = [], []
+    error_x = error_y = 0.0
+    for _ in range(args.points):
+        heading += rng.gauss(0, 0.02)
+        if rng.random() < 0.005:
+            heading += rng.choice([-1, 1]) * math.pi / 2
+        lat += speed * math.cos(heading) / METERS_PER_DEGREE
+        lng += speed * math.sin(heading) / (METERS_PER_DEGREE * math.cos(math.radians(lat)))
+        # Phone GPS error wanders slowly rather than jumping every second
+        error_x = 0.9 * error_x + rng.gauss(0, 1)
+        error_y = 0.9 * error_y + rng.gauss(0, 1)
+        lats.append(lat + error_y / METERS_PER_DEGREE)
+        lngs.append(lng + error_x / (METERS_PER_DEGREE * math.cos(math.radians(lat))))
+    return lats, lngs
+
+
+def max_deviation(lats, lngs, kept) -> float:
+    """Largest distance in meters from a raw fix to its simplified segment."""
+    lats, lngs = np.asarray(lats), np.asarray(lngs)
+    kx = METERS_PER_DEGREE * math.cos(math.radians(lats[0]))
+    x, y = lngs * kx, lats * METERS_PER_DEGREE
+    worst = 0.0
+    for a, b in zip(kept, kept[1:]):
+        px, py = x[a:b + 1] - x[a], y[a:b + 1] - y[a]
+        dx, dy = x[b] - x[a], y[b] - y[a]
+        length = dx * dx + dy * dy
+        t = np.clip((px * dx + py * dy) / length, 0, 1) if length else np.zeros_like(px)
+        worst = max(worst, float(np.hypot(px - t * dx, py - t * dy).max()))
+    return worst
+
+
+def timed(fn, routes) -> float:
+    started = time.perf_counter()
+    for route in routes:
+        fn(*route)
+    return time.perf_counter() - started
+
+
+def simplify_streaming(lats, lngs):
+    """Feed fixes as the tracker does, ROUTE_UPDATE_EVERY at a time."""
+    simplifier = RouteSimplifier(args.tolerance)
+    for end in range(ROUTE_UPDATE_EVERY, len(lats) + ROUTE_UPDATE_EVERY, ROUTE_UPDATE_EVERY):
+        simplifier.update(lats[:end], lngs[:end])
+    return simplifier.indexes(len(lats))
+
+
+def simplify_whole(lats, lngs):
+    simplifier = RouteSimplifier(args.tolerance)
+    simplifier.update(lats, lngs)
+    return simplifier.indexes(len(lats))
+
+
+def main():
+    rng = random.Random(7)
+    routes = [synthetic_route(rng) for _ in range(args.routes)]
+    arrays = [(np.asarray(lats), np.asarray(lngs)) for lats, lngs in routes]
+    points = args.routes * args.points
+
+    raw_bytes = points * 16
+    encoded = [polyline.encode(lats, lngs) for lats, lngs in routes]
+    kept = [simplify_whole(lats, lngs) for lats, lngs in arrays]
+    simplified = [
+        polyline.encode([lats[i] for i in indexes], [lngs[i] for i in indexes])
+        for (lats, lngs), indexes in zip(routes, kept)
+    ]
+    kept_points = sum(len(indexes) for indexes in kept)
+    print(f"{args.routes} routes x {args.points} fixes, tolerance {args.tolerance} m")
+    print(f"raw doubles          {raw_bytes / args.routes:>10,.0f} bytes/route")
+    for name, strings in (("encoded", encoded), ("simplified+encoded", simplified)):
+        size = sum(len(s) for s in strings)
+        print(f"{name:<20} {size / args.routes:>10,.0f} bytes/route  {raw_bytes / size:>6.1f}x smaller")
+    print(f"kept fixes           {kept_points / points:>10.1%}")
+
+    streamed = [simplify_streaming(lats, lngs) for lats, lngs in arrays]
+    assert streamed == kept, "streaming and whole-route simplification differ"
+    worst = max(max_deviation(lats, lngs, indexes) for (lats, lngs), indexes in zip(arrays, kept))
+    print(f"max deviation        {worst:>10.2f} m")
+    assert worst <= args.tolerance + 1e-6, worst
+
+    for name, fn, inputs in (
+        ("encode", polyline.encode, routes),
+        ("decode", lambda s: polyline.decode(s), [(s,) for s in encoded]),
+        ("simplify whole", simplify_whole, arrays),
+        ("simplify streaming", simplify_streaming, arrays),
+    ):
+        seconds = timed(fn, inputs)
+        print(f"{name:<20} {points / seconds:>12,.0f} fixes/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""Similar-trip lookups: string-keyed route scan versus the grid RouteIndex.
+
+Records --routes trips between random points of a city-sized area, then
+times start-point lookups with the old scan (parse every "lat,lng|lat,lng"
+key, Haversine each) and with RouteIndex, and checks both find the same
+start points. Also reports how many trips snap into existing clusters when
+starts and ends jitter by a few meters.
+
+    python -m benchmarks.route_index --routes 100000 --lookups 2000
+"""
+import argparse
+import math
+import os
+import random
+import time
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--routes", type=int, default=100000)
+parser.add_argument("--lookups", type=int, default=2000)
+parser.add_argument("--area-km", type=float, default=30.0, help="side of the square the routes lie in")
+args = parser.parse_args()
+
+os.environ.setdefault("SECRET_KEY", "benchmark")
+
+from app.services.activity_tracker import ActivityTracker  # noqa: E402
+from app.services.route_index import METERS_PER_DEGREE, MATCH_RADIUS_M, RouteIndex  # noqa: E402
+
+CENTER = (52.37, 4.89)
+
+
+def random_point(rng: random.Random):
+    half = args.area_km * 500
+    lat = CENTER[0] + rng.uniform(-half, half) / METERS_PER_DEGREE
+    lng = CENTER[1] + rng.uniform(-half, half) / (METERS_PER_DEGREE * math.cos(math.radians(CENTER[0])))
+    return lat, lng
+
+
+def jitter(rng: random.Random, point, meters: float):
+    lat, lng = point
+    return (lat + rng.gauss(0, meters) / METERS_PER_DEGREE,
+            lng + rng.gauss(0, meters) / (METERS_PER_DEGREE * math.cos(math.radians(lat))))
+
+
+def string_routes(routes):
+    """The old common_routes: exact-coordinate keys."""
+    return {f"{s[0]},{s[1]}|{e[0]},{e[1]}": None for s, e in routes}
+
+
+def scan(tracker, keys, lat, lng):
+    found = []
+    for route in keys:
+        start_lat, start_lng = map(float, route.split('|')[0].split(','))
+        if tracker._is_nearby(start_lat, start_lng, lat, lng):
+            found.append((start_lat, start_lng))
+    return found
+
+
+def main():
+    rng = random.Random(7)
+    routes = [(random_point(rng), random_point(rng)) for _ in range(args.routes)]
+    queries = [random_point(rng) for _ in range(args.lookups)]
+    # Half the lookups start near a known route
+    queries[::2] = [jitter(rng, routes[rng.randrange(len(routes))][0], 30) for _ in queries[::2]]
+
+    started = time.perf_counter()
+    index = RouteIndex()
+    for (start, end) in routes:
+        index.add_trip(*start, *end, {"lat": end[0], "lng": end[1]}, 1000.0, "WALKING", 8)
+    build = time.perf_counter() - started
+    print(f"{args.routes:,} routes in a {args.area_km:g} km square, {MATCH_RADIUS_M} m radius")
+    print(f"index build        {args.routes / build:>12,.0f} trips/s")
+
+    tracker = ActivityTracker()
+    keys = string_routes(routes)
+    scan_queries = queries[:max(1, args.lookups // 100)]
+    started = time.perf_counter()
+    expected = [sorted(scan(tracker, keys, *q)) for q in scan_queries]
+    scan_seconds = (time.perf_counter() - started) / len(scan_queries)
+
+    started = time.perf_counter()
+    results = [index.nearby(*q) for q in queries]
+    index_seconds = (time.perf_counter() - started) / len(queries)
+    got = [sorted((c.start_lat, c.start_lng) for c in found) for found in results[:len(scan_queries)]]
+    assert got == expected, "index and scan disagree"
+    matches = sum(len(found) for found in results) / len(results)
+
+    print(f"string-key scan    {scan_seconds * 1e6:>12,.0f} us/lookup")
+    print(f"RouteIndex         {index_seconds * 1e6:>12,.1f} us/lookup  ({scan_seconds / index_seconds:,.0f}x, "
+          f"{matches:.2f} routes found on average)")
+
+    # Repeated commutes with GPS jitter: exact keys never repeat, clusters do
+    commutes = routes[:1000]
+    repeats = RouteIndex()
+    for _ in range(10):
+        for start, end in commutes:
+            repeats.add_trip(*jitter(rng, start, 10), *jitter(rng, end, 10), {}, 1000.0, "WALKING", 8)
+    print(f"10 jittered repeats of {len(commutes)} commutes -> {len(repeats)} clusters "
+          f"(exact keys: {len(commutes) * 10})")
+
+
+if __name__ == "__main__":
+    main()
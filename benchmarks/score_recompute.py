@@ -0,0 +1,93 @@
+"""Throughput of the offline points and CO2 recompute on SQLite.
+
+Seeds --activities activities over --users users in a temporary database,
+makes every stored carbon_impact and user total stale, and runs
+ScoreRecompute for each --shards value, restoring the stale values
+between runs. A last run with nothing stale measures the read-only pass.
+
+    python -m benchmarks.score_recompute --activities 1000000 --users 10000 --shards 1 4
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--activities", type=int, default=1_000_000)
+parser.add_argument("--users", type=int, default=10_000)
+parser.add_argument("--shards", type=int, nargs="+", default=[1, 4])
+parser.add_argument("--chunk-size", type=int, default=20_000)
+args = parser.parse_args()
+
+workdir = tempfile.mkdtemp()
+os.environ.setdefault("SECRET_KEY", "benchmark")
+os.environ["DATABASE_URL"] = f"sqlite:///{workdir}/bench.db"
+
+from sqlalchemy import func, insert, select, update  # noqa: E402
+from app.db.init_db import init_db  # noqa: E402
+from app.db.session import engine  # noqa: E402
+from app.models.activity import Activity  # noqa: E402
+from app.models.user import User  # noqa: E402
+from app.services.score_recompute import ScoreRecompute  # noqa: E402
+
+MODES = ["WALKING", "RUNNING", "CYCLING"]
+START = datetime(2023, 1, 1)
+
+
+def seed():
+    rng = random.Random(7)
+    with engine.begin() as conn:
+        conn.execute(insert(User), [{"email": f"user{i}@example.com"} for i in range(args.users)])
+        for offset in range(0, args.activities, 100_000):
+            rows = []
+            for _ in range(min(100_000, args.activities - offset)):
+                distance = rng.uniform(500, 30_000)
+                rows.append({
+                    "user_id": rng.randint(1, args.users),
+                    "activity_type": rng.choice(MODES),
+                    "distance": distance,
+                    "duration": int(distance / 3),
+                    "carbon_impact": distance * 0.2,
+                    "start_time": START + timedelta(minutes=rng.randint(0, 500_000)),
+                })
+            conn.execute(insert(Activity), rows)
+
+
+def make_stale():
+    """As if the CO2 factor and the points rules had changed since ingest."""
+    with engine.begin() as conn:
+        conn.execute(update(Activity).values(carbon_impact=Activity.distance * 0.25))
+        conn.execute(update(User).values(total_distance=0.0, total_co2_saved=0.0, points=0))
+
+
+def timed_run(name: str, shards: int):
+    recompute = ScoreRecompute(engine, name, shards, args.chunk_size)
+    recompute.restart()
+    started = time.perf_counter()
+    checkpoints = recompute.run_all()
+    seconds = time.perf_counter() - started
+    changed = sum(checkpoint["updated"] for checkpoint in checkpoints)
+    print(f"{name:<16} {shards:>2} shard(s) {seconds:>7.1f}s  {args.activities / seconds * 60:>12,.0f} rows/min  "
+          f"{changed:,} activities rewritten")
+
+
+def main():
+    init_db().close()
+    started = time.perf_counter()
+    seed()
+    print(f"seeded {args.activities:,} activities for {args.users:,} users in {time.perf_counter() - started:.1f}s")
+    for shards in args.shards:
+        make_stale()
+        timed_run(f"stale x{shards}", shards)
+    timed_run("nothing stale", args.shards[-1])
+
+    with engine.connect() as conn:
+        expected = conn.scalar(select(func.sum(Activity.carbon_impact)))
+        stored = conn.scalar(select(func.sum(User.total_co2_saved)))
+    assert abs(expected - stored) <= 1e-6 * expected, (expected, stored)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Backfill throughput against a local mock Strava server.
+
+    python -m benchmarks.strava_backfill --activities 20000 --latency-ms 50
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--activities", type=int, default=20000)
+parser.add_argument("--per-page", type=int, default=200)
+parser.add_argument("--latency-ms", type=float, default=50.0, help="simulated Strava response time")
+parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 8])
+args = parser.parse_args()
+
+PORT = 8799
+workdir = tempfile.mkdtemp()
+os.environ.setdefault("SECRET_KEY", "benchmark")
+os.environ["DATABASE_URL"] = f"sqlite:///{workdir}/bench.db"
+os.environ["STRAVA_API_BASE_URL"] = f"http://127.0.0.1:{PORT}"
+# The mock server has no quota; keep the rate limiter out of the measurement
+os.environ["STRAVA_RATE_LIMIT_15MIN"] = "1000000"
+os.environ["STRAVA_RATE_LIMIT_DAILY"] = "1000000"
+
+from aiohttp import web  # noqa: E402
+from app.db.init_db import init_db  # noqa: E402
+from app.db.session import AsyncSessionLocal  # noqa: E402
+from app.models.user import User  # noqa: E402
+from app.services.http_client import http_client  # noqa: E402
+from app.services.strava_backfill import StravaBackfillService  # noqa: E402
+
+TYPES = ["Walk", "Run", "Ride", "Swim"]
+ACTIVITIES = [
+    {
+        "id": 10_000_000 + i,
+        "type": TYPES[i % len(TYPES)],
+        "distance": 1000.0 + i % 5000,
+        "moving_time": 600 + i % 3600,
+        "start_date": "2024-01-01T08:00:00Z",
+    }
+    for i in range(args.activities)
+]
+
+
+async def athlete_activities(request):
+    page = int(request.query.get("page", 1))
+    per_page = int(request.query.get("per_page", 30))
+    await asyncio.sleep(args.latency_ms / 1000)
+    return web.json_response(ACTIVITIES[(page - 1) * per_page:page * per_page])
+
+
+async def main():
+    app = web.Application()
+    app.router.add_get("/athlete/activities", athlete_activities)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", PORT).start()
+    init_db()
+
+    print(f"{args.activities} activities, {args.per_page}/page, {args.latency_ms:.0f}ms simulated latency")
+    for concurrency in args.concurrency:
+        async with AsyncSessionLocal() as db:
+            user = User(email=f"bench{concurrency}@example.com", strava_access_token="token")
+            db.add(user)
+            await db.commit()
+
+            service = StravaBackfillService(per_page=args.per_page, concurrency=concurrency)
+            started = time.perf_counter()
+            job = await service.run(db, user)
+            elapsed = time.perf_counter() - started
+        print(
+            f"concurrency={concurrency:<3} imported={job.imported:<7} "
+            f"{elapsed:6.2f}s  {args.activities / elapsed:9.0f} activities/s"
+        )
+
+    await http_client.shutdown()
+    await runner.cleanup()
+
+
+asyncio.run(main())
@@ -0,0 +1,125 @@
+"""Load test for per-user tracker sessions: many users walking at once.
+
+Each simulated user sends --updates 1 Hz fixes of one continuous walk
+through TrackerSessionService.run, all users concurrently with at most
+--concurrency requests in flight. --workers > 1 runs several services over
+one SQL store, like app processes behind a load balancer, with every
+request going to a random one. At the end every user's saved trip must
+hold all their fixes; lost updates are reported.
+
+    python -m benchmarks.tracker_sessions --users 10000 --backend sql --cache-size 2000
+    python -m benchmarks.tracker_sessions --users 2000 --backend sql --workers 4 --flush-seconds 0
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--users", type=int, default=10000)
+parser.add_argument("--updates", type=int, default=20, help="fixes per user")
+parser.add_argument("--backend", choices=["memory", "sql"], default="sql")
+parser.add_argument("--cache-size", type=int, default=10000)
+parser.add_argument("--flush-seconds", type=float, default=1.0, help="0 writes through on every update")
+parser.add_argument("--workers", type=int, default=1, help="services sharing the store (sql only)")
+parser.add_argument("--concurrency", type=int, default=200, help="requests in flight")
+args = parser.parse_args()
+if args.workers > 1 and args.backend != "sql":
+    parser.error("--workers needs a shared store (--backend sql)")
+
+workdir = tempfile.mkdtemp()
+os.environ.setdefault("SECRET_KEY", "benchmark")
+os.environ["DATABASE_URL"] = f"sqlite:///{workdir}/bench.db"
+
+from sqlalchemy import func, select  # noqa: E402
+from app.db.init_db import init_db  # noqa: E402
+from app.db.session import AsyncSessionLocal, async_engine  # noqa: E402
+from app.models.tracker_session import TrackerSession  # noqa: E402
+from app.services.tracker_sessions import (  # noqa: E402
+    MemorySessionStore, SqlSessionStore, TrackerSessionService
+)
+
+START = 1_700_000_000
+
+
+def fix(user_id: int, i: int):
+    return {
+        "latitude": 52.0 + user_id * 1e-3 + i * 1.3e-5,
+        "longitude": 4.9,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S+00:00", time.gmtime(START + i)),
+        "speed": 1.4,
+        "activity_type": "WALKING",
+    }
+
+
+async def user(user_id: int, services, gate: asyncio.Semaphore, latencies, rng: random.Random):
+    for i in range(args.updates):
+        location = fix(user_id, i)
+        service = rng.choice(services)
+        async with gate:
+            started = time.perf_counter()
+            await service.run(user_id, lambda tracker: tracker.process_location_update(location))
+            latencies.append(time.perf_counter() - started)
+        await asyncio.sleep(0)
+
+
+async def main():
+    init_db()
+    store = SqlSessionStore() if args.backend == "sql" else MemorySessionStore()
+    services = [
+        TrackerSessionService(
+            SqlSessionStore() if args.backend == "sql" else store,
+            capacity=args.cache_size,
+            flush_interval=args.flush_seconds,
+        )
+        for _ in range(args.workers)
+    ]
+    for service in services:
+        await service.start()
+
+    rng = random.Random(7)
+    gate = asyncio.Semaphore(args.concurrency)
+    latencies = []
+    started = time.perf_counter()
+    await asyncio.gather(*(user(u, services, gate, latencies, rng) for u in range(1, args.users + 1)))
+    for service in services:
+        await service.stop()
+    seconds = time.perf_counter() - started
+
+    latencies.sort()
+    total = len(latencies)
+    print(f"{args.users:,} users x {args.updates} fixes, backend {args.backend}, "
+          f"cache {args.cache_size:,}, flush {args.flush_seconds:g}s, {args.workers} worker(s)")
+    print(f"throughput  {total / seconds:>10,.0f} updates/s")
+    print(f"latency     p50 {latencies[total // 2] * 1000:.2f} ms  p99 {latencies[int(total * 0.99)] * 1000:.2f} ms")
+    for i, service in enumerate(services):
+        stats = service.stats()
+        print(f"worker {i}    hit ratio {stats['hit_ratio']:.1%}  evictions {stats['evictions']:,}  "
+              f"conflicts {stats['conflicts']:,}")
+    if args.backend == "sql":
+        async with AsyncSessionLocal() as db:
+            rows, size = (await db.execute(
+                select(func.count(), func.sum(func.length(TrackerSession.state)))
+            )).one()
+        print(f"stored      {rows:,} sessions, {size / rows:,.0f} bytes each")
+
+    # Every fix of the walk should be in the user's saved trip
+    reader = TrackerSessionService(store if args.backend == "memory" else SqlSessionStore(), capacity=args.users)
+    if args.backend == "memory":
+        reader._cache = services[0]._cache
+    lost = 0
+    for user_id in range(1, args.users + 1):
+        points = await reader.run(user_id, lambda tracker: _trip_length(tracker))
+        lost += args.updates - points
+    print(f"lost        {lost:,} of {total:,} updates")
+    await async_engine.dispose()
+
+
+async def _trip_length(tracker) -> int:
+    return len(tracker.current_trip.locations) if tracker.current_trip else 0
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,110 @@
+"""GPS fixes per second: scalar process_location_update versus the NumPy batch API.
+
+Generates a synthetic 1 Hz stream with walking, cycling and driving legs
+separated by short and long stops, checks that both paths produce the same
+trips, then times each path.
+
+    python -m benchmarks.trip_batch --points 200000 --batch-size 500
+"""
+import argparse
+import asyncio
+import math
+import os
+import random
+import time
+from datetime import datetime, timezone
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--points", type=int, default=200000)
+parser.add_argument("--batch-size", type=int, default=500, help="fixes per uploaded batch")
+args = parser.parse_args()
+
+os.environ.setdefault("SECRET_KEY", "benchmark")
+
+from app.services.activity_tracker import ActivityTracker  # noqa: E402
+
+LEGS = [("WALKING", 1.4), ("ON_BICYCLE", 5.5), ("IN_VEHICLE", 14.0), ("RUNNING", 3.2)]
+
+
+def synthetic_stream(count: int, seed: int = 7):
+    rng = random.Random(seed)
+    lat, lng, t = 52.37, 4.89, 1_700_000_000.0
+    fixes = []
+    while len(fixes) < count:
+        activity, speed = rng.choice(LEGS)
+        heading = rng.uniform(0, 2 * math.pi)
+        for _ in range(rng.randint(30, 900)):
+            step = max(speed + rng.gauss(0, speed * 0.1), 0.0)
+            lat += step * math.cos(heading) / 111_320
+            lng += step * math.sin(heading) / (111_320 * math.cos(math.radians(lat)))
+            t += 1
+            fixes.append((lat, lng, t, step, activity))
+        # Stop: short pauses keep the trip open, long ones end it
+        for _ in range(rng.choice([3, 20, 400])):
+            t += 1
+            fixes.append((lat, lng, t, 0.0, "STILL"))
+    return fixes[:count]
+
+
+async def run_scalar(fixes):
+    tracker = ActivityTracker()
+    results = []
+    for lat, lng, t, speed, activity in fixes:
+        result = await tracker.process_location_update({
+            "latitude": lat,
+            "longitude": lng,
+            "timestamp": datetime.fromtimestamp(t, timezone.utc).isoformat(),
+            "speed": speed,
+            "activity_type": activity,
+        })
+        if result is not None:
+            results.append(result)
+    return tracker, results
+
+
+async def run_batch(fixes, batch_size):
+    tracker = ActivityTracker()
+    results = []
+    for i in range(0, len(fixes), batch_size):
+        lat, lng, t, speed, activity = zip(*fixes[i:i + batch_size])
+        results.extend(await tracker.process_location_batch(lat, lng, t, speed, activity))
+    return tracker, results
+
+
+def check_same(scalar, batch):
+    (tracker_a, results_a), (tracker_b, results_b) = scalar, batch
+    assert len(results_a) == len(results_b), (len(results_a), len(results_b))
+    for a, b in zip(results_a, results_b):
+        assert a.keys() == b.keys()
+        for key in ("transport_mode", "start_time", "end_time"):
+            assert a[key] == b[key], (key, a[key], b[key])
+        assert a["waypoints"] == b["waypoints"]
+        assert math.isclose(a["distance"], b["distance"], rel_tol=1e-9), (a["distance"], b["distance"])
+        assert math.isclose(a["carbon_impact"], b["carbon_impact"], rel_tol=1e-9)
+    assert tracker_a.last_update == tracker_b.last_update
+    assert (tracker_a.current_trip is None) == (tracker_b.current_trip is None)
+    if tracker_a.current_trip is not None:
+        assert len(tracker_a.current_trip.locations) == len(tracker_b.current_trip.locations)
+    return len(results_a)
+
+
+async def main():
+    fixes = synthetic_stream(args.points)
+
+    started = time.perf_counter()
+    scalar = await run_scalar(fixes)
+    scalar_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    batch = await run_batch(fixes, args.batch_size)
+    batch_seconds = time.perf_counter() - started
+
+    trips = check_same(scalar, batch)
+    print(f"{len(fixes)} fixes, {trips} completed trips, identical results")
+    print(f"scalar  {len(fixes) / scalar_seconds:>12,.0f} fixes/s")
+    print(f"batch   {len(fixes) / batch_seconds:>12,.0f} fixes/s  ({args.batch_size} per batch, "
+          f"{scalar_seconds / batch_seconds:.1f}x)")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
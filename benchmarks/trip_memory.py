@@ -0,0 +1,71 @@
+"""Bytes per GPS fix held by a trip: per-point dicts versus TripPoints.
+
+Builds --trips one-hour trips at 1 Hz both ways and reports the heap each
+representation holds (tracemalloc), per fix.
+
+    python -m benchmarks.trip_memory --trips 100 --seconds 3600
+"""
+import argparse
+import gc
+import os
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--trips", type=int, default=100)
+parser.add_argument("--seconds", type=int, default=3600, help="fixes per trip at 1 Hz")
+args = parser.parse_args()
+
+os.environ.setdefault("SECRET_KEY", "benchmark")
+
+from app.services.trip_points import TripPoints  # noqa: E402
+
+START = datetime(2024, 5, 1, 8, tzinfo=timezone.utc)
+
+
+def fixes():
+    for i in range(args.seconds):
+        yield {
+            "lat": 52.37 + i * 1e-5,
+            "lng": 4.89 + i * 1e-5,
+            "timestamp": START + timedelta(seconds=i),
+            "speed": 1.4 + (i % 7) * 0.01,
+            "altitude": 2.0 + (i % 5),
+        }
+
+
+def as_dicts():
+    return [list(fixes()) for _ in range(args.trips)]
+
+
+def as_columns():
+    trips = []
+    for _ in range(args.trips):
+        points = TripPoints()
+        for fix in fixes():
+            points.append(fix)
+        trips.append(points)
+    return trips
+
+
+def held_bytes(build) -> int:
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    trips = build()
+    held = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del trips
+    return held
+
+
+def main():
+    points = args.trips * args.seconds
+    print(f"{args.trips} trips x {args.seconds} fixes")
+    for name, build in (("list of dicts", as_dicts), ("TripPoints", as_columns)):
+        held = held_bytes(build)
+        print(f"{name:<14} {held / 2**20:>8.1f} MiB  {held / points:>6.1f} bytes/fix")
+
+
+if __name__ == "__main__":
+    main()